@@ -0,0 +1,483 @@
+"""
+Streaming aggregation of Euler solutions
+
+A Python module with aggregators that summarize the Euler solutions without keeping them: a depth histogram with fixed
+bins, a grid of the number of solutions per cell (solution density) and grids of depth statistics per cell (count,
+mean, standard deviation, minimum and maximum). The solutions are added in chunks, as the moving data windows or the
+tiles of a survey are solved, so the memory used does not depend on the number of solutions, and the aggregators of
+parallel workers are combined with "merge".
+
+The histograms can be drawn like those of "plot_figure3" and "plot_figure4" with
+
+    ax.hist(histogram.edges[:-1], bins=histogram.edges, weights=histogram.counts, density=True)
+
+Usage:
+
+    aggregator = SolutionAggregator(DepthHistogram.linear(0, 1000, 80), DensityGrid(area, (100, 100)),
+                                    CellStatistics(area, (100, 100)))
+    aggregate_solutions(tfa, x, y, z, shape, area, SI, winsize, aggregator, alpha=10**alpha_euler083,
+                        min_stdz=1e-3)
+    depth_std = aggregator.cells.std
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import numpy as np
+from euler import active_windows, deriv, fill_gaps, regularized_deriv, solve_windows
+from profiling import stage
+
+
+
+
+class DepthHistogram(object):
+
+    """
+    Histogram of the depths with fixed bins.
+
+    Parameters:
+
+    * edges: 1D-array
+        bin edges (m) - increasing, the last bin includes its upper edge as in "numpy.histogram"
+    """
+
+    def __init__(self, edges):
+
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.below = 0
+        self.above = 0
+
+    @classmethod
+    def linear(cls, low, high, bins):
+
+        """
+        Builds a histogram of "bins" bins of equal width between the depths "low" and "high".
+        """
+
+        return cls(np.linspace(low, high, bins + 1))
+
+    def add(self, depth):
+
+        """
+        Adds depths to the histogram - the depths outside the edges are only counted in "below" and "above".
+        """
+
+        depth = np.asarray(depth, dtype=float)
+        depth = depth[np.isfinite(depth)]
+        self.counts += np.histogram(depth, self.edges)[0]
+        self.below += int(np.count_nonzero(depth < self.edges[0]))
+        self.above += int(np.count_nonzero(depth > self.edges[-1]))
+
+    def merge(self, other):
+
+        """
+        Adds the counts of another histogram with the same edges.
+        """
+
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError('the histograms have different bin edges')
+        self.counts += other.counts
+        self.below += other.below
+        self.above += other.above
+
+        return self
+
+    @property
+    def total(self):
+
+        """
+        Number of depths inside the edges.
+        """
+
+        return int(self.counts.sum())
+
+    def density(self):
+
+        """
+        Probability density of each bin (the counts normalized by the total and the bin widths).
+        """
+
+        return self.counts / (max(self.total, 1) * np.diff(self.edges))
+
+
+
+
+class _CellGrid(object):
+
+    """
+    Regular grid of cells over the survey area, with the x-coordinate along the rows as in the input data.
+    """
+
+    def __init__(self, area, shape):
+
+        self.area = tuple(float(limit) for limit in area)
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.outside = 0
+
+    def cells(self, x, y):
+
+        """
+        Returns the flat index of the cell of each point and the mask of the points inside the area.
+        """
+
+        x1, x2, y1, y2 = self.area
+        nx, ny = self.shape
+        ix = np.floor((np.asarray(x, dtype=float) - x1) * (nx / (x2 - x1))).astype(np.int64)
+        iy = np.floor((np.asarray(y, dtype=float) - y1) * (ny / (y2 - y1))).astype(np.int64)
+        # points on the upper limits belong to the last cells
+        ix[ix == nx] = nx - 1
+        iy[iy == ny] = ny - 1
+        inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+        self.outside += int(len(inside) - np.count_nonzero(inside))
+
+        return ix[inside] * ny + iy[inside], inside
+
+    def _check(self, other):
+
+        if self.area != other.area or self.shape != other.shape:
+            raise ValueError('the grids have different areas or shapes')
+
+    @property
+    def centers(self):
+
+        """
+        Coordinates of the cell centers (xc, yc) - 1D-arrays along each axis.
+        """
+
+        x1, x2, y1, y2 = self.area
+        nx, ny = self.shape
+        dx = (x2 - x1) / nx
+        dy = (y2 - y1) / ny
+
+        return x1 + dx * (np.arange(nx) + 0.5), y1 + dy * (np.arange(ny) + 0.5)
+
+
+
+
+class DensityGrid(_CellGrid):
+
+    """
+    Number of solutions in each cell of a regular grid.
+
+    Parameters:
+
+    * area: tuple = (x1, x2, y1, y2)
+        limits of the grid
+    * shape: tuple = (nx, ny)
+        number of cells in each direction
+    """
+
+    def __init__(self, area, shape):
+
+        _CellGrid.__init__(self, area, shape)
+        self.counts = np.zeros(self.shape, dtype=np.int64)
+
+    def add(self, x, y):
+
+        """
+        Adds solutions at the horizontal positions (x, y).
+        """
+
+        index, _ = self.cells(x, y)
+        self.counts += np.bincount(index, minlength=self.counts.size).reshape(self.shape)
+
+    def merge(self, other):
+
+        """
+        Adds the counts of another grid with the same area and shape.
+        """
+
+        self._check(other)
+        self.counts += other.counts
+        self.outside += other.outside
+
+        return self
+
+
+
+
+class CellStatistics(_CellGrid):
+
+    """
+    Depth statistics of the solutions in each cell of a regular grid.
+
+    Parameters:
+
+    * area: tuple = (x1, x2, y1, y2)
+        limits of the grid
+    * shape: tuple = (nx, ny)
+        number of cells in each direction
+    """
+
+    def __init__(self, area, shape):
+
+        _CellGrid.__init__(self, area, shape)
+        size = self.shape[0] * self.shape[1]
+        self._count = np.zeros(size, dtype=np.int64)
+        self._mean = np.zeros(size)
+        self._m2 = np.zeros(size)
+        self._min = np.full(size, np.inf)
+        self._max = np.full(size, -np.inf)
+
+    def add(self, x, y, depth):
+
+        """
+        Adds the depths of solutions at the horizontal positions (x, y).
+        """
+
+        index, inside = self.cells(x, y)
+        depth = np.asarray(depth, dtype=float)[inside]
+        if len(depth) == 0:
+            return
+        size = len(self._count)
+
+        count = np.bincount(index, minlength=size)
+        occupied = count > 0
+        mean = np.bincount(index, depth, size)
+        mean[occupied] /= count[occupied]
+        m2 = np.bincount(index, (depth - mean[index]) ** 2, size)
+        low = np.full(size, np.inf)
+        high = np.full(size, -np.inf)
+        np.minimum.at(low, index, depth)
+        np.maximum.at(high, index, depth)
+
+        self._combine(count, mean, m2, low, high)
+
+    def _combine(self, count, mean, m2, low, high):
+
+        """
+        Pairwise update of the count, mean and sum of squared deviations of each cell.
+        """
+
+        total = self._count + count
+        weight = np.divide(count, total, out=np.zeros(len(total)), where=total > 0)
+        delta = mean - self._mean
+        self._mean += delta * weight
+        self._m2 += m2 + delta ** 2 * self._count * weight
+        self._count = total
+        np.minimum(self._min, low, out=self._min)
+        np.maximum(self._max, high, out=self._max)
+
+    def merge(self, other):
+
+        """
+        Adds the statistics of another grid with the same area and shape.
+        """
+
+        self._check(other)
+        self._combine(other._count, other._mean, other._m2, other._min, other._max)
+        self.outside += other.outside
+
+        return self
+
+    def _grid(self, values, where):
+
+        result = np.full(len(values), np.nan)
+        result[where] = values[where]
+
+        return result.reshape(self.shape)
+
+    @property
+    def count(self):
+
+        """
+        Number of solutions of each cell (2D-array).
+        """
+
+        return self._count.reshape(self.shape)
+
+    @property
+    def mean(self):
+
+        """
+        Mean depth of each cell (2D-array, NaN for the empty cells).
+        """
+
+        return self._grid(self._mean, self._count > 0)
+
+    @property
+    def std(self):
+
+        """
+        Standard deviation of the depths of each cell (2D-array, NaN for the cells with less than two solutions).
+        """
+
+        variance = self._m2 / np.maximum(self._count - 1, 1)
+
+        return self._grid(np.sqrt(variance), self._count > 1)
+
+    @property
+    def min(self):
+
+        """
+        Shallowest depth of each cell (2D-array, NaN for the empty cells).
+        """
+
+        return self._grid(self._min, self._count > 0)
+
+    @property
+    def max(self):
+
+        """
+        Deepest depth of each cell (2D-array, NaN for the empty cells).
+        """
+
+        return self._grid(self._max, self._count > 0)
+
+
+
+
+class SolutionAggregator(object):
+
+    """
+    Group of aggregators fed with the same solutions.
+
+    Parameters:
+
+    * histogram: DepthHistogram
+        depth histogram - None to skip it
+    * density: DensityGrid
+        solution density - None to skip it
+    * cells: CellStatistics
+        depth statistics per cell - None to skip them
+    """
+
+    def __init__(self, histogram=None, density=None, cells=None):
+
+        self.histogram = histogram
+        self.density = density
+        self.cells = cells
+        self.solutions = 0
+
+    def add(self, solutions):
+
+        """
+        Adds solutions.
+
+        Parameters:
+
+        * solutions: 2D-array
+            x, y, depth and base level of each solution (at least the first three columns)
+        """
+
+        solutions = np.asarray(solutions)
+        self.solutions += len(solutions)
+        if self.histogram is not None:
+            self.histogram.add(solutions[:, 2])
+        if self.density is not None:
+            self.density.add(solutions[:, 0], solutions[:, 1])
+        if self.cells is not None:
+            self.cells.add(solutions[:, 0], solutions[:, 1], solutions[:, 2])
+
+    def merge(self, other):
+
+        """
+        Adds the aggregators of another group with the same components (e.g. from a parallel worker).
+        """
+
+        for name in ('histogram', 'density', 'cells'):
+            mine = getattr(self, name)
+            theirs = getattr(other, name)
+            if (mine is None) != (theirs is None):
+                raise ValueError("the aggregators differ in the '%s' component" % name)
+            if mine is not None:
+                mine.merge(theirs)
+        self.solutions += other.solutions
+
+        return self
+
+
+
+
+def aggregate_solutions(data, xi, yi, zi, shape, area, SI, windowSize, aggregator, alpha=None, min_stdz=None,
+                        backend='numpy', chunk=65536, monitor=None):
+
+    """
+    Euler deconvolution that adds the solutions of each chunk of moving data windows to an aggregator and discards
+    them. The windows are those of "euler_deconv" (without the centers discarded by "select_solutions"). The
+    percentage "filt" of "euler_deconv" needs all the solutions, so the solutions are selected here by a lower limit
+    of the standard deviation of the z derivative.
+
+    Parameters:
+
+    * data: 1D-array
+        input data set - gaps as NaN
+    * xi, yi, zi: 1D-array
+        coordinates mesh in x-, y- and z-directions
+    * shape: tuple = (nx, ny)
+        data points number in each direction
+    * area: tuple = (x1, x2, y1, y2)
+        mesh boundaries
+    * SI: integer
+        structural index - 0, 1, 2 or 3
+    * windowSize: integer
+        size of the moving data window
+    * aggregator: SolutionAggregator
+        aggregators that receive the solutions
+    * alpha: float
+        regularization parameter - None for the non-regularized derivatives
+    * min_stdz: float
+        smallest standard deviation of the z derivative of the kept solutions - None keeps all the solutions
+    * backend: string
+        window solver - 'numpy', 'jit' or 'auto' (see "solve_windows" in "euler.py")
+    * chunk: integer
+        number of windows solved at a time
+    * monitor: WindowMonitor
+        progress report and cancellation (see "progress.py") - its chunk size replaces "chunk"
+
+    Returns:
+
+    * aggregator: SolutionAggregator
+        the aggregator with the solutions added
+    """
+
+    data = np.reshape(data, shape)
+    xi = np.reshape(xi, shape)
+    yi = np.reshape(yi, shape)
+    zi = np.reshape(zi, shape)
+
+    mask = None
+    if np.isnan(data).any():
+        with stage('euler.fill_gaps', data):
+            data, mask = fill_gaps(data)
+    with stage('euler.derivatives', data):
+        if alpha is None:
+            dx, dy, dz = deriv(data, shape, area)
+        else:
+            dx, dy, dz = regularized_deriv(data, shape, area, alpha)
+
+    # windows whose centers are kept by "select_solutions" (centers within half a window of the border discarded)
+    delta = windowSize // 2
+    nrows = max(shape[0] - 2 * delta, 0)
+    ncols = max(shape[1] - 2 * delta, 0)
+    if mask is not None:
+        rows, cols = active_windows(mask, windowSize)
+        inside = (rows < nrows) & (cols < ncols)
+        rows, cols = rows[inside], cols[inside]
+        total = len(rows)
+    else:
+        total = nrows * ncols
+
+    if monitor is not None:
+        chunk = monitor.chunk
+        monitor.start(total)
+    for start in range(0, total, chunk):
+        if monitor is not None and monitor.cancelled:
+            break
+        stop = min(start + chunk, total)
+        if mask is None:
+            # the corners of the chunk are generated, so no index array of all the windows is stored
+            chunk_rows, chunk_cols = np.divmod(np.arange(start, stop), ncols)
+        else:
+            chunk_rows, chunk_cols = rows[start:stop], cols[start:stop]
+        p, stdz = solve_windows(data, dx, dy, dz, xi, yi, zi, SI, windowSize, chunk_rows, chunk_cols, backend)
+        if min_stdz is not None:
+            p = p[stdz >= min_stdz]
+        aggregator.add(p)
+        if monitor is not None:
+            monitor.update(stop)
+    if monitor is not None:
+        monitor.finish()
+
+    return aggregator
@@ -0,0 +1,704 @@
+"""
+Benchmarks
+
+Python script to measure the run time and memory use of the functions in "euler.py" and "filtering.py" on grids larger
+than the synthetic example. Each benchmark is a function that returns a list of result rows and prints a table.
+
+The suite ("suite") times the derivatives, S-function, regularization parameters and Euler deconvolution over grid
+sizes, window sizes and percentages of kept solutions, and checks every output against golden results: the solutions
+in "results/euler_solutions_synthetic.txt" and "results/reg_euler_solutions_synthetic.txt" for the synthetic data
+(200 x 200 points, window of 6 points, 3.5% of the solutions), and fingerprints (sums and samples) of the outputs
+stored in "input/benchmark_golden.json" for the other cases, so a change that alters the results fails. The golden
+fingerprints are computed ("baseline") with "euler.py" and "filtering.py" of the commit before the optimizations, not
+with the code under test. The incremental Euler deconvolution of a re-levelled block inside the grid and on its edge
+is checked against a full run on the changed grid, and a writer of a solution store ("solution_store.py") is killed
+in the middle of an append to check that the next append takes the lock and removes its rows. Each run is appended
+to the history file "results/benchmark_history.jsonl".
+
+Usage:
+
+    python benchmark.py suite --sizes 200 1024 4096 --windows 6 10 --filts 0.035 0.1
+    python benchmark.py suite --sizes 8192 --update-golden
+    python benchmark.py baseline --commit ff23182 --sizes 200 512 1024 2048 4096
+    python benchmark.py memory --sizes 1024 2048 4096
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from euler import *
+from cache import clear_cache
+from filtering import (low_memory_derivative, regularization_parameter, regularized_derivative,
+                       s_function_derivative)
+from solution_store import create_store, SolutionStore
+
+
+GOLDEN = os.path.join('input', 'benchmark_golden.json')
+HISTORY = os.path.join('results', 'benchmark_history.jsonl')
+
+# Golden solutions of the synthetic data (see "synthetic_data.py")
+BUNDLED = {'euler_deconv': os.path.join('results', 'euler_solutions_synthetic.txt'),
+           'euler_deconv_regularized': os.path.join('results', 'reg_euler_solutions_synthetic.txt')}
+
+
+
+
+def synthetic_grid(n, seed=0):
+
+    """
+    Builds a smooth random n x n grid with its coordinates and first-order derivatives, used as benchmark input.
+
+    Parameters:
+
+    * n: integer
+        data points number in each direction
+    * seed: integer
+        seed of the random generator
+
+    Returns:
+
+    * data, dx, dy, dz, xi, yi, zi: 2D-array
+        grid, derivatives and coordinates
+    """
+
+    rng = np.random.RandomState(seed)
+    shape = (n, n)
+    area = (0, 100. * (n - 1), 0, 100. * (n - 1))
+
+    # Low-pass filtered white noise
+    data = rng.standard_normal(shape)
+    spectrum = np.fft.fft2(data)
+    k = np.hypot(*np.meshgrid(np.fft.fftfreq(n), np.fft.fftfreq(n), indexing='ij'))
+    data = np.real(np.fft.ifft2(spectrum * np.exp(-(k / 0.05) ** 2)))
+
+    dx, dy, dz = deriv(data, shape, area)
+    xi, yi = np.meshgrid(np.linspace(area[0], area[1], n), np.linspace(area[2], area[3], n), indexing='ij')
+    zi = np.full(shape, -100.)
+
+    return data, dx, dy, dz, xi, yi, zi
+
+
+
+
+def measure(function, *args, **kwargs):
+
+    """
+    Runs a function and measures its wall time and the peak memory allocated while it runs.
+
+    Returns:
+
+    * result: the value returned by the function
+    * seconds: float
+        wall time
+    * peak: integer
+        peak of the traced memory (bytes)
+    """
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return result, seconds, peak
+
+
+
+
+def window_memory(sizes=(1024, 2048, 4096), windowSize=6, batch=4096):
+
+    """
+    Compares the array-based ('numpy') and compiled ('jit') Euler window solvers in time and peak memory. The memory
+    reported excludes the input grids, which both backends share, so the difference is the cost of the temporaries.
+
+    Parameters:
+
+    * sizes: tuple
+        grid sizes (n x n points)
+    * windowSize: integer
+        moving data window size
+    * batch: integer
+        windows per batch of the 'numpy' backend
+
+    Returns:
+
+    * rows: list
+        (n, backend, seconds, peak memory in MB)
+    """
+
+    backends = ['numpy'] if numba is None else ['numpy', 'jit']
+    rows = []
+
+    for n in sizes:
+        data, dx, dy, dz, xi, yi, zi = synthetic_grid(n)
+        corners = window_corners(data.shape, windowSize)
+
+        for backend in backends:
+            if backend == 'jit':
+                # Compiles the kernel outside of the measurement
+                solve_windows(data, dx, dy, dz, xi, yi, zi, 1, windowSize, corners[0][:1], corners[1][:1], backend)
+            result, seconds, peak = measure(solve_windows, data, dx, dy, dz, xi, yi, zi, 1, windowSize,
+                                            corners[0], corners[1], backend, batch)
+            output = sum(a.nbytes for a in result)
+            rows.append((n, backend, seconds, peak / 2.0 ** 20, (peak - output) / 2.0 ** 20))
+
+        del data, dx, dy, dz, xi, yi, zi
+
+    print('window solver: window %d, batch %d' % (windowSize, batch))
+    print('%8s %8s %10s %12s %16s' % ('n', 'backend', 'time (s)', 'peak (MB)', 'temporaries (MB)'))
+    for row in rows:
+        print('%8d %8s %10.2f %12.1f %16.1f' % row)
+
+    return rows
+
+
+
+
+def derivative_memory(sizes=(1024, 2048, 4096), alpha=1e3):
+
+    """
+    Compares the peak memory and time of the regularized derivatives computed by "regularized_derivative" and by
+    "low_memory_derivative" (output arrays allocated by the caller). The shared cache is emptied before each
+    measurement, so the spectrum is computed in both cases.
+
+    Parameters:
+
+    * sizes: tuple
+        grid sizes (n x n points)
+    * alpha: float
+        regularization parameter
+
+    Returns:
+
+    * rows: list
+        (n, function, seconds, peak memory in MB, peak memory over the grid size)
+    """
+
+    rows = []
+
+    for n in sizes:
+        data = np.ravel(synthetic_grid(n)[0])
+        axis = 100. * np.arange(n)
+        shape = (n, n)
+        out = [np.empty(n * n) for i in range(3)]
+
+        clear_cache()
+        result, seconds, peak = measure(regularized_derivative, axis, axis, data, shape, alpha)
+        rows.append((n, 'regularized_derivative', seconds, peak / 2.0 ** 20, peak / float(data.nbytes)))
+        del result
+        clear_cache()
+
+        result, seconds, peak = measure(low_memory_derivative, axis, axis, data, shape, alpha, out=out)
+        rows.append((n, 'low_memory_derivative', seconds, peak / 2.0 ** 20, peak / float(data.nbytes)))
+        del result, out, data
+
+    print('regularized derivatives: alpha %g' % alpha)
+    print('%8s %24s %10s %12s %12s' % ('n', 'function', 'time (s)', 'peak (MB)', 'peak / grid'))
+    for row in rows:
+        print('%8d %24s %10.2f %12.1f %12.1f' % row)
+
+    return rows
+
+
+
+def benchmark_input(n):
+
+    """
+    Input of the suite: the synthetic data corrupted with 1% of noise for n = 200, otherwise a smooth random grid
+    (see "synthetic_grid") observed at 100 m above the ground. The S-function of the smooth grid has no noise plateau
+    and few trial parameters fall in the limits of "synthetic_data.py", so wider limits are used.
+
+    Returns:
+
+    * grid: dictionary
+        x, y, z (1D-array), data (1D-array), shape, area and the limits (upper, inferior, value) of the S-function
+        for the grid ('limits_grid') and Euler deconvolution ('limits_euler') regularization parameters
+    """
+
+    if n == 200:
+        x, y, z, data = np.loadtxt(os.path.join('input', 'noise1_synthetic_data.dat')).T
+        return {'x': x, 'y': y, 'z': z, 'data': data, 'shape': (200, 200), 'area': (0, 20000, 0, 20000),
+                'limits_grid': (0.60, 0.40, 0.50), 'limits_euler': (0.90, 0.70, 0.83)}
+
+    data = synthetic_grid(n)[0]
+    axis = 100. * np.arange(n)
+    xi, yi = np.meshgrid(axis, axis, indexing='ij')
+
+    return {'x': xi.ravel(), 'y': yi.ravel(), 'z': np.full(n * n, -100.), 'data': data.ravel(), 'shape': (n, n),
+            'area': (0, axis[-1], 0, axis[-1]), 'limits_grid': (0.80, 0.20, 0.50),
+            'limits_euler': (0.95, 0.60, 0.83)}
+
+
+
+
+def fingerprint(value, samples=16):
+
+    """
+    Summarizes an output (array, number or tuple of them) by its shape, sum, sum of absolute values and a few samples.
+    """
+
+    if isinstance(value, tuple):
+        return [fingerprint(item, samples) for item in value]
+
+    array = np.asarray(value, dtype=float)
+    flat = array.ravel()
+    index = np.linspace(0, max(flat.size - 1, 0), min(samples, flat.size)).astype(int)
+
+    return {'shape': list(array.shape), 'sum': float(np.sum(flat)), 'abs_sum': float(np.sum(np.abs(flat))),
+            'samples': [float(v) for v in flat[index]]}
+
+
+
+
+def compare(value, golden, rtol=1e-6):
+
+    """
+    Compares an output with its golden fingerprint (or golden array). Returns the largest relative error, or infinity
+    when the shapes differ.
+    """
+
+    if isinstance(golden, np.ndarray):
+        value = np.asarray(value)
+        if value.shape != golden.shape:
+            return float('inf')
+        return float(np.max(np.abs(value - golden)) / max(np.max(np.abs(golden)), 1e-300)) if golden.size else 0.0
+
+    if isinstance(golden, list):
+        return max(compare(item, reference, rtol) for item, reference in zip(value, golden))
+
+    current = fingerprint(value, len(golden['samples']))
+    if current['shape'] != golden['shape']:
+        return float('inf')
+    scale = max(golden['abs_sum'], 1e-300)
+    errors = [abs(current['sum'] - golden['sum']) / scale, abs(current['abs_sum'] - golden['abs_sum']) / scale]
+    peak = max([abs(v) for v in golden['samples']] + [1e-300])
+    errors.extend(abs(a - b) / peak for a, b in zip(current['samples'], golden['samples']))
+
+    return max(errors)
+
+
+
+
+def incremental_error(grid, window, filt, bbox, tol=1e-3, backend='numpy'):
+
+    """
+    Re-levels a block of a grid (see "benchmark_input") and compares the Euler deconvolution updated by
+    "euler_deconv_incremental" with a full run on the changed grid.
+
+    Parameters:
+
+    * grid: dictionary
+        input of the suite
+    * window: integer
+        moving data window size
+    * filt: float
+        percentage of the Euler solutions kept
+    * bbox: tuple = (row0, row1, col0, col1)
+        grid indexes of the re-levelled block
+    * tol: float
+        tolerance of the incremental update (see "euler_deconv_incremental")
+    * backend: string
+        Euler window solver (see "solve_windows" in "euler.py")
+
+    Returns:
+
+    * seconds: float
+        time of the incremental update (s)
+    * error: float
+        largest difference of the x, y and z estimates of the windows kept by the full run, relative to the largest
+        estimate
+    """
+
+    x, y, z, data, shape, area = (grid[k] for k in ('x', 'y', 'z', 'data', 'shape', 'area'))
+    row0, row1, col0, col1 = bbox
+    changed = data.reshape(shape).copy()
+    changed[row0:row1, col0:col1] += 0.05 * np.std(data)
+    changed = changed.ravel()
+
+    clear_cache()
+    derivatives = deriv(data.reshape(shape), shape, area)
+    estimates = euler_estimates(data, x, y, z, shape, area, 1, window, backend=backend)
+    state = IncrementalState(derivatives, estimates, window, filt)
+    start = time.perf_counter()
+    euler_deconv_incremental(changed, data, x, y, z, shape, area, 1, state, bbox, tol=tol, backend=backend)
+    seconds = time.perf_counter() - start
+    estimates = state.estimates
+
+    clear_cache()
+    full = euler_estimates(changed, x, y, z, shape, area, 1, window, backend=backend)
+    stdz = full[4][~np.isnan(full[4])]
+    kept = full[4] >= np.sort(stdz)[::-1][max(int(len(stdz) * filt) - 1, 0)]
+    error = compare(np.stack([estimate[kept] for estimate in estimates[:3]]),
+                    np.stack([estimate[kept] for estimate in full[:3]]))
+
+    return seconds, error
+
+
+
+
+def golden_key(name, n, window, filt):
+
+    """
+    Key of a case in the golden file.
+    """
+
+    return '%s|n=%d|window=%s|filt=%s' % (name, n, window, filt)
+
+
+
+
+def _sorted_rows(rows, key, reverse=False):
+
+    """
+    Sorts the rows of an array like "sorted" (stable, also in reverse order) without one Python object per row.
+    """
+
+    keys = np.array([key(row) for row in rows])
+    order = np.argsort(-keys if reverse else keys, kind='stable')
+
+    return rows[order]
+
+
+
+
+def baseline_golden(commit, sizes=(200, 512, 1024), windows=(6, 10), filts=(0.035, 0.1), golden=GOLDEN):
+
+    """
+    Stores in the golden file the fingerprints of the cases of "suite" computed with "euler.py" and "filtering.py" of
+    an earlier commit, so the suite compares the current code with the code before the optimizations. The baseline
+    sorts all the Euler solutions before keeping a percentage of them, so the solutions kept for each "filt" are the
+    first rows of the solutions kept for the largest one, and the Euler deconvolution runs once per window size. The
+    baseline sorts the solutions with "sorted", which keeps one Python object per row and runs out of memory on the
+    largest grids, so it is replaced by the same stable sort done by numpy ("_sorted_rows").
+
+    Parameters:
+
+    * commit: string
+        git commit of the baseline
+    * sizes: tuple
+        grid sizes (n x n points)
+    * windows: tuple
+        moving data window sizes
+    * filts: tuple
+        percentages of the Euler solutions kept
+    * golden: string
+        JSON file of golden fingerprints
+    """
+
+    folder = os.path.dirname(os.path.abspath(__file__))
+    temporary = tempfile.mkdtemp()
+    modules = {}
+    try:
+        for name in ('euler', 'filtering'):
+            path = os.path.join(temporary, name + '.py')
+            with open(path, 'wb') as source:
+                source.write(subprocess.check_output(['git', 'show', '%s:./%s.py' % (commit, name)], cwd=folder))
+            spec = importlib.util.spec_from_file_location('baseline_' + name, path)
+            modules[name] = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(modules[name])
+    finally:
+        shutil.rmtree(temporary, ignore_errors=True)
+    base_euler, base_filtering = modules['euler'], modules['filtering']
+    base_euler.sorted = _sorted_rows
+
+    goldens = {}
+    if os.path.isfile(golden):
+        with open(golden) as golden_file:
+            goldens = json.load(golden_file)
+
+    alpha_test = 10 ** np.arange(-6, 14.5, 0.5)
+
+    for n in sizes:
+        grid = benchmark_input(n)
+        x, y, z, data, shape, area = (grid[k] for k in ('x', 'y', 'z', 'data', 'shape', 'area'))
+
+        goldens[golden_key('deriv', n, None, None)] = fingerprint(base_euler.deriv(data.reshape(shape), shape, area))
+
+        norms = base_filtering.s_function_derivative(x, y, data, shape, alpha_test)
+        goldens[golden_key('s_function_derivative', n, None, None)] = fingerprint(norms)
+
+        alpha_grid = []
+        for direction, norm in zip('xyz', norms):
+            alpha_grid.append(base_filtering.regularization_parameter(norm, alpha_test, *grid['limits_grid']))
+            goldens[golden_key('regularization_parameter_%s' % direction, n, None, None)] = fingerprint(alpha_grid[-1])
+        alpha_euler = np.mean([base_filtering.regularization_parameter(norm, alpha_test, *grid['limits_euler'])
+                               for norm in norms])
+
+        goldens[golden_key('regularized_derivative', n, None, None)] = fingerprint(
+            base_filtering.regularized_derivative(x, y, data, shape, 10 ** np.mean(alpha_grid)))
+
+        for window in windows:
+            for name, function, args in (('euler_deconv', base_euler.euler_deconv, ()),
+                                         ('euler_deconv_regularized', base_euler.euler_deconv_regularized,
+                                          (10 ** alpha_euler,))):
+                solutions = function(data, x, y, z, shape, area, 1, window, max(filts), *args)
+                # Solutions of the baseline before a percentage is kept (the grid without a border of half a window)
+                windows_count = (n - 2 * (window // 2)) ** 2
+                for filt in filts:
+                    if n == 200 and window == 6 and filt == 0.035 and name in BUNDLED:
+                        continue
+                    goldens[golden_key(name, n, window, filt)] = fingerprint(
+                        solutions[:int(windows_count * filt)])
+                print('%s n=%d window=%d' % (name, n, window))
+                sys.stdout.flush()
+
+        del grid, x, y, z, data
+
+        # Written after each size, so the sizes finished are kept if a larger one is stopped
+        with open(golden, 'w') as golden_file:
+            json.dump(goldens, golden_file, indent=1, sort_keys=True)
+
+
+
+
+# Writer killed by "append_recovery" once its columns are written, before the rows are counted
+KILLED_WRITER = '''
+import sys, time
+import numpy as np
+import solution_store
+def stall(path, metadata):
+    sys.stdout.write('written\\n')
+    sys.stdout.flush()
+    time.sleep(600)
+solution_store._write_metadata = stall
+solution_store.SolutionStore(sys.argv[1]).append(np.full((%d, %d), -1.0), tile='killed')
+'''
+
+
+
+
+def append_recovery(rows=1000, timeout=10.0):
+
+    """
+    Kills a process in the middle of an append to a solution store (see "solution_store.py"), while it holds the lock,
+    and appends a second chunk.
+
+    Parameters:
+
+    * rows: integer
+        rows of each chunk
+    * timeout: float
+        longest wait for the lock after the writer is killed (s)
+
+    Returns:
+
+    * seconds: float
+        time of the append after the kill (s)
+    * error: float
+        largest difference between the solutions read back and the two chunks appended by this process, relative to
+        the largest value - infinity if the rows of the killed writer were kept or the append timed out
+    """
+
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, 'recovery.sol')
+    chunks = [np.random.RandomState(seed).normal(size=(rows, 5)) for seed in (0, 1)]
+
+    try:
+        store = create_store(path)
+        store.append(chunks[0], tile='first')
+
+        writer = subprocess.Popen([sys.executable, '-c', KILLED_WRITER % (rows, 5), path], stdout=subprocess.PIPE,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)))
+        writer.stdout.readline()
+        writer.kill()
+        writer.wait()
+
+        start = time.perf_counter()
+        try:
+            store.append(chunks[1], tile='second', timeout=timeout)
+        except IOError:
+            return time.perf_counter() - start, float('inf')
+        seconds = time.perf_counter() - start
+
+        store = SolutionStore(path)
+        if [chunk['tile'] for chunk in store.metadata['chunks']] != ['first', 'second']:
+            return seconds, float('inf')
+        error = compare(store.read(), np.concatenate(chunks))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    return seconds, error
+
+
+
+
+def suite(sizes=(200, 512, 1024), windows=(6, 10), filts=(0.035, 0.1), repeat=1, rtol=1e-6, golden=GOLDEN,
+          history=HISTORY, update=False, backend='numpy'):
+
+    """
+    Times the functions of "filtering.py" and "euler.py" and checks their outputs against the golden results.
+
+    Parameters:
+
+    * sizes: tuple
+        grid sizes (n x n points)
+    * windows: tuple
+        moving data window sizes
+    * filts: tuple
+        percentages of the Euler solutions kept
+    * repeat: integer
+        runs of each case - the shortest time is kept
+    * rtol: float
+        largest relative error accepted
+    * golden: string
+        JSON file of golden fingerprints
+    * history: string
+        file where the results of the run are appended (one JSON record per line) - None does not write it
+    * update: boolean
+        True stores the fingerprints of the cases without golden results in the golden file
+    * backend: string
+        Euler window solver (see "solve_windows" in "euler.py")
+
+    Returns:
+
+    * rows: list
+        for each case: name, n, window, filt, time (s), check ('pass', 'fail' or 'new') and relative error
+    """
+
+    goldens = {}
+    if os.path.isfile(golden):
+        with open(golden) as golden_file:
+            goldens = json.load(golden_file)
+
+    alpha_test = 10 ** np.arange(-6, 14.5, 0.5)
+    rows = []
+
+    def run(name, n, window, filt, function, *args):
+
+        seconds = float('inf')
+        for i in range(repeat):
+            # The shared cache would return the output of the previous run
+            clear_cache()
+            start = time.perf_counter()
+            output = function(*args)
+            seconds = min(seconds, time.perf_counter() - start)
+
+        key = golden_key(name, n, window, filt)
+        if n == 200 and window == 6 and filt == 0.035 and name in BUNDLED:
+            error = compare(output, np.loadtxt(BUNDLED[name]))
+        elif key in goldens:
+            error = compare(output, goldens[key])
+        else:
+            error = None
+            if update:
+                goldens[key] = fingerprint(output)
+
+        check = 'new' if error is None else ('pass' if error <= rtol else 'fail')
+        rows.append({'case': name, 'n': n, 'window': window, 'filt': filt, 'seconds': seconds, 'check': check,
+                     'error': error})
+
+        return output
+
+    for n in sizes:
+        grid = benchmark_input(n)
+        x, y, z, data, shape, area = (grid[k] for k in ('x', 'y', 'z', 'data', 'shape', 'area'))
+
+        run('deriv', n, None, None, deriv, data.reshape(shape), shape, area)
+
+        norms = run('s_function_derivative', n, None, None, s_function_derivative, x, y, data, shape, alpha_test)
+
+        # Regularization parameters of the grid (S = 0.50) and of the Euler deconvolution (S = 0.83)
+        alpha_grid = np.mean([run('regularization_parameter_%s' % direction, n, None, None,
+                                  regularization_parameter, norm, alpha_test, *grid['limits_grid'])
+                              for direction, norm in zip('xyz', norms)])
+        alpha_euler = np.mean([regularization_parameter(norm, alpha_test, *grid['limits_euler']) for norm in norms])
+
+        run('regularized_derivative', n, None, None, regularized_derivative, x, y, data, shape, 10 ** alpha_grid)
+
+        for window in windows:
+            for filt in filts:
+                run('euler_deconv', n, window, filt, euler_deconv, data, x, y, z, shape, area, 1, window, filt,
+                    backend)
+                run('euler_deconv_regularized', n, window, filt, euler_deconv_regularized, data, x, y, z, shape,
+                    area, 1, window, filt, 10 ** alpha_euler, backend)
+
+                # The incremental update of a block inside the grid and of a block on its edge (computed again on
+                # the whole grid) against a full run
+                for case, bbox in (('incremental_interior', (n // 2 - 10, n // 2 + 10, n // 2 - 10, n // 2 + 10)),
+                                   ('incremental_edge', (0, 20, n // 2 - 10, n // 2 + 10))):
+                    seconds, error = incremental_error(grid, window, filt, bbox, backend=backend)
+                    rows.append({'case': case, 'n': n, 'window': window, 'filt': filt, 'seconds': seconds,
+                                 'check': 'pass' if error <= 1e-3 else 'fail', 'error': error})
+
+        del grid, x, y, z, data
+
+    seconds, error = append_recovery()
+    rows.append({'case': 'store_append_recovery', 'n': 1000, 'window': None, 'filt': None, 'seconds': seconds,
+                 'check': 'pass' if error == 0 else 'fail', 'error': error})
+
+    if update:
+        with open(golden, 'w') as golden_file:
+            json.dump(goldens, golden_file, indent=1, sort_keys=True)
+
+    if history is not None:
+        try:
+            commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        record = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit, 'python': platform.python_version(),
+                  'numpy': np.__version__, 'numba': None if numba is None else numba.__version__,
+                  'machine': platform.machine(), 'processors': os.cpu_count(), 'results': rows}
+        with open(history, 'a') as history_file:
+            history_file.write(json.dumps(record) + '\n')
+
+    print('%-28s %6s %7s %7s %10s %6s %10s' % ('case', 'n', 'window', 'filt', 'time (s)', 'check', 'error'))
+    for row in rows:
+        print('%-28s %6d %7s %7s %10.3f %6s %10s' % (row['case'], row['n'], row['window'] or '-', row['filt'] or '-',
+                                                     row['seconds'], row['check'],
+                                                     '-' if row['error'] is None else '%.1e' % row['error']))
+
+    return rows
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmarks of "filtering.py" and "euler.py".')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    suite_parser = commands.add_parser('suite', help='timings with checks against the golden results')
+    suite_parser.add_argument('--sizes', type=int, nargs='+', default=[200, 512, 1024], help='grid sizes')
+    suite_parser.add_argument('--windows', type=int, nargs='+', default=[6, 10], help='window sizes')
+    suite_parser.add_argument('--filts', type=float, nargs='+', default=[0.035, 0.1], help='solutions kept')
+    suite_parser.add_argument('--repeat', type=int, default=1, help='runs of each case')
+    suite_parser.add_argument('--backend', default='numpy', help="Euler window solver - 'numpy', 'jit' or 'auto'")
+    suite_parser.add_argument('--history', default=HISTORY, help='history file of the runs')
+    suite_parser.add_argument('--update-golden', action='store_true', help='stores the fingerprints of new cases')
+
+    baseline_parser = commands.add_parser('baseline', help='golden fingerprints computed with an earlier commit')
+    baseline_parser.add_argument('--commit', required=True, help='git commit of the baseline')
+    baseline_parser.add_argument('--sizes', type=int, nargs='+', default=[200, 512, 1024], help='grid sizes')
+    baseline_parser.add_argument('--windows', type=int, nargs='+', default=[6, 10], help='window sizes')
+    baseline_parser.add_argument('--filts', type=float, nargs='+', default=[0.035, 0.1], help='solutions kept')
+
+    memory_parser = commands.add_parser('memory', help='time and peak memory of the solvers and derivatives')
+    memory_parser.add_argument('--sizes', type=int, nargs='+', default=[1024, 2048, 4096], help='grid sizes')
+
+    arguments = parser.parse_args()
+
+    if arguments.command == 'suite':
+        results = suite(arguments.sizes, arguments.windows, arguments.filts, arguments.repeat,
+                        history=arguments.history, update=arguments.update_golden, backend=arguments.backend)
+        sys.exit(1 if any(row['check'] == 'fail' for row in results) else 0)
+
+    if arguments.command == 'baseline':
+        baseline_golden(arguments.commit, arguments.sizes, arguments.windows, arguments.filts)
+        sys.exit(0)
+
+    window_memory(arguments.sizes)
+    derivative_memory(arguments.sizes)
@@ -0,0 +1,226 @@
+"""
+In-process cache of grids
+
+A Python module that keeps the Fourier spectra and derivative grids computed by "filtering.py" and "euler.py" in memory,
+so the same transform of the same data is computed only once per session. The entries are addressed by a hash of the
+data contents plus the grid geometry and the operator parameters, and the least recently used entries are evicted when
+the cache exceeds its byte budget. The arrays held by the cache are read-only: the derivative grids and solution
+stores are stored and returned as copies, so the callers receive writable arrays, while the spectra and operators used
+only inside "filtering.py", "euler.py" and "operators.py" are shared without a copy.
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+
+
+def content_key(*items):
+
+    """
+    Computes the key of a cache entry from arrays (hashed by dtype, shape and contents) and parameters. The items of
+    tuples and lists are hashed one by one, so the arrays they hold are hashed by their contents too.
+
+    Parameters:
+
+    * items: arrays, numbers, strings, or tuples and lists of them
+        operation name, input data, grid geometry and operator parameters
+
+    Returns:
+
+    * key: string
+        hexadecimal digest
+    """
+
+    digest = hashlib.blake2b(digest_size=20)
+    _update_key(digest, items)
+
+    return digest.hexdigest()
+
+
+
+
+def _update_key(digest, items):
+
+    """
+    Adds items to the digest of "content_key", going down into tuples and lists.
+    """
+
+    for item in items:
+        if isinstance(item, np.ndarray):
+            array = np.ascontiguousarray(item)
+            digest.update(repr((array.dtype.str, array.shape)).encode())
+            digest.update(array.view(np.uint8).ravel())
+        elif isinstance(item, (tuple, list)):
+            digest.update(('%s(%d' % (type(item).__name__, len(item))).encode())
+            _update_key(digest, item)
+            digest.update(b')')
+        else:
+            if isinstance(item, np.generic):
+                item = item.item()
+            digest.update(repr(item).encode())
+        digest.update(b'|')
+
+
+
+
+class GridCache(object):
+
+    """
+    Least recently used cache of arrays (or tuples of arrays) bounded by the total number of bytes.
+
+    Parameters:
+
+    * max_bytes: integer
+        byte budget - 0 disables the cache
+    """
+
+    def __init__(self, max_bytes=2 ** 30):
+
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, shared=False):
+
+        """
+        Returns the entry stored with the key, or None when it is not in the cache.
+
+        Parameters:
+
+        * key: string
+            key of the entry (see "content_key")
+        * shared: boolean
+            True returns the read-only arrays held by the cache, False writable copies
+
+        Returns:
+
+        * value: array or tuple of arrays
+            the entry, or None
+        """
+
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = value[0]
+
+        return value if shared else _copy(value)
+
+    def put(self, key, value, shared=False):
+
+        """
+        Stores an array or a tuple of arrays and returns it. Arrays larger than the byte budget are not stored and are
+        returned unchanged.
+
+        Parameters:
+
+        * key: string
+            key of the entry (see "content_key")
+        * value: array or tuple of arrays
+            the entry
+        * shared: boolean
+            True stores the arrays themselves, made read-only, and returns them - False stores read-only copies and
+            returns the arrays writable
+
+        Returns:
+
+        * value: array or tuple of arrays
+            the entry
+        """
+
+        arrays = value if isinstance(value, tuple) else (value,)
+        nbytes = sum(array.nbytes for array in arrays)
+        if nbytes > self.max_bytes:
+            return value
+
+        stored = value if shared else _copy(value)
+        for array in (stored if isinstance(stored, tuple) else (stored,)):
+            array.setflags(write=False)
+
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (stored, nbytes)
+            self.nbytes += nbytes
+            # Evicts the least recently used entries
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= self._entries.popitem(last=False)[1][1]
+
+        return value
+
+    def clear(self):
+
+        """
+        Removes all entries and resets the counters.
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+
+        """
+        Returns the hit and miss counters, the number of entries and the bytes in use.
+        """
+
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries),
+                    'nbytes': self.nbytes, 'max_bytes': self.max_bytes}
+
+
+
+
+def _copy(value):
+
+    """
+    Copies an array or the arrays of a tuple.
+    """
+
+    if isinstance(value, tuple):
+        return tuple(np.array(array) for array in value)
+
+    return np.array(value)
+
+
+
+
+# Cache shared by "filtering.py" and "euler.py"
+default_cache = GridCache()
+
+
+
+
+def cache_info():
+
+    """
+    Returns the hit and miss counters, the number of entries and the bytes in use of the shared cache.
+    """
+
+    return default_cache.info()
+
+
+
+
+def clear_cache():
+
+    """
+    Removes all entries of the shared cache and resets its counters.
+    """
+
+    default_cache.clear()
@@ -19,6 +19,14 @@ email: felipe146@hotmail.com, valcris@on.br
 """
 
 import numpy as np
+from cache import content_key, default_cache
+from operators import default_bank
+from profiling import stage
+
+try:
+    import numba
+except ImportError:
+    numba = None
 
 
 def fft_pad_data(data, mode='edge'):
@@ -26,6 +34,7 @@ def fft_pad_data(data, mode='edge'):
     Pad data and compute the coeficients in Fourier domain
     The data is padded until reach the length of the next higher power 
     of two and the values of the pad are the values of the edge
+    The coefficients are kept in the shared cache (see "cache.py")
     
     Parameters:
         
@@ -46,11 +55,17 @@ def fft_pad_data(data, mode='edge'):
     
     padx = (n_points - nx)//2 
     pady = (n_points - ny)//2
-    padded_data = np.pad(data, ((padx, padx), (pady, pady)),mode)    
+    with stage('euler.pad', data):
+        padded_data = np.pad(data, ((padx, padx), (pady, pady)),mode)
     
     mask = np.zeros_like(padded_data, dtype=bool)
     mask[padx:padx+nx, pady:pady+ny] = True 
-    fpdat = np.fft.fft2(padded_data)
+    key = content_key('spectrum', data, mode)
+    fpdat = default_cache.get(key, shared=True)
+    if fpdat is None:
+        with stage('euler.fft', padded_data):
+            fpdat = default_cache.put(key, np.fft.fft2(padded_data),
+                                      shared=True)
     return fpdat,mask
 
 
@@ -76,7 +91,8 @@ def ifft_unpad_data(data_p, mask, shape_dat):
     * data: 2d-array
         The unpadded data in space-domain.
     """
-    ifft_data = np.real(np.fft.ifft2(data_p))
+    with stage('euler.ifft', data_p):
+        ifft_data = np.real(np.fft.ifft2(data_p))
     data = ifft_data[mask]
     return np.reshape(data, shape_dat)
 
@@ -130,24 +146,27 @@ def deriv(data,shape,area):
         derivatives in x-, y- and z-directions
     """    
 
+    key=content_key('deriv',data,shape,tuple(area))
+    cached=default_cache.get(key)
+    if cached is not None:
+        return cached
+
     anom_FFT, mask = fft_pad_data(data)
     
     nx,ny=shape
     xa,xb,ya,yb=area
-    xs=np.linspace(xa,xb,nx)
-    ys=np.linspace(ya,yb,ny)
-    Y,X=np.meshgrid(ys,xs)
-
-    u, v = fft_wavenumbers(X, Y, data.shape, anom_FFT.shape)
+    # operators of the grid geometry (see "operators.py")
+    dx=(xb - xa)/(nx - 1)
+    dy=(yb - ya)/(ny - 1)
     
-    derivx_ft = anom_FFT*(u*1j)
-    derivy_ft = anom_FFT*(v*1j)
-    derivz_ft = anom_FFT*np.sqrt(u**2 + v**2)
+    derivx_ft = anom_FFT*default_bank.derivative(anom_FFT.shape,dx,dy,'x')
+    derivy_ft = anom_FFT*default_bank.derivative(anom_FFT.shape,dx,dy,'y')
+    derivz_ft = anom_FFT*default_bank.derivative(anom_FFT.shape,dx,dy,'z')
     derivx = ifft_unpad_data(derivx_ft,  mask, data.shape)
     derivy = ifft_unpad_data(derivy_ft,  mask, data.shape)
     derivz = ifft_unpad_data(derivz_ft,  mask, data.shape)
     
-    return derivx,derivy,derivz
+    return default_cache.put(key,(derivx,derivy,derivz))
 
 
 
@@ -175,22 +194,22 @@ def regularized_deriv(data, shape, area, alpha):
         derivatives in x-, y- and z-directions
     """
 
+    key = content_key('regularized_deriv', data, shape, tuple(area), alpha)
+    cached = default_cache.get(key)
+    if cached is not None:
+        return cached
+
     anom_FFT, mask = fft_pad_data(data)
 
     nx, ny = shape
     xa, xb, ya, yb = area
-    xs = np.linspace(xa, xb, nx)
-    ys = np.linspace(ya, yb, ny)
-    Y, X = np.meshgrid(ys, xs)
+    dx = (xb - xa) / (nx - 1)
+    dy = (yb - ya) / (ny - 1)
 
-    # Wavenumbers in x-, y- and z-directions
-    u, v = fft_wavenumbers(X, Y, data.shape, anom_FFT.shape)
-    mod_k = np.sqrt(u ** 2 + v ** 2)
-
-    # Derivative operator
-    gamma_x = ((1j) * u) / (1 + alpha * (u ** 2))
-    gamma_y = ((1j) * v) / (1 + alpha * (v ** 2))
-    gamma_z = mod_k / (1 + alpha * (mod_k ** 2))
+    # Derivative operator of the grid geometry (see "operators.py")
+    gamma_x = default_bank.derivative(anom_FFT.shape, dx, dy, 'x', 1, alpha)
+    gamma_y = default_bank.derivative(anom_FFT.shape, dx, dy, 'y', 1, alpha)
+    gamma_z = default_bank.derivative(anom_FFT.shape, dx, dy, 'z', 1, alpha)
 
     # Calculates the derivatives in the Fourier domain
     derivx_ft = anom_FFT * gamma_x
@@ -202,7 +221,7 @@ def regularized_deriv(data, shape, area, alpha):
     derivy = ifft_unpad_data(derivy_ft, mask, data.shape)
     derivz = ifft_unpad_data(derivz_ft, mask, data.shape)
 
-    return derivx, derivy, derivz
+    return default_cache.put(key, (derivx, derivy, derivz))
 
 
 
@@ -246,7 +265,549 @@ def moving_window(data,dx,dy,dz,xi,yi,zi,windowSize):
 
 
 
-def euler_deconv(data,xi,yi,zi,shape,area,SI,windowSize,filt):
+def fill_gaps(data):
+    """
+    Fills the gaps (NaN values) of a grid before the Fourier transform
+    by linear interpolation along the rows and then along the columns,
+    and records where the data points are valid
+
+    Parameters:
+
+    * data : 2d-array
+        the input data set - gridded, gaps as NaN
+
+    Returns:
+
+    * filled : 2d-array
+        the data set with the gaps filled
+    * mask : 2d-array
+        Location of gaps -
+             {True: data points.
+              False: gaps.}
+    """
+    mask = np.isfinite(data)
+    if not mask.any():
+        raise ValueError("the grid has no valid data points")
+    filled = np.array(data, dtype=float)
+    index = np.arange(data.shape[1])
+    for i in np.nonzero(mask.any(axis=1) & ~mask.all(axis=1))[0]:
+        valid = mask[i]
+        filled[i, ~valid] = np.interp(index[~valid], index[valid],
+                                      filled[i, valid])
+    # rows without any data point are filled along the columns
+    empty = ~mask.any(axis=1)
+    if empty.any():
+        index = np.arange(data.shape[0])
+        filled[empty] = np.transpose([np.interp(index[empty], index[~empty],
+                                                column)
+                                      for column in filled[~empty].T])
+    return filled, mask
+
+
+
+def active_windows(mask, windowSize):
+    """
+    Index of the moving data windows without gaps, in the same order
+    as "window_corners". The windows are found with a summed-area table
+    of the gaps, so the cost does not depend on the window size.
+
+    Parameters:
+
+    * mask : 2d-array
+        Location of gaps - {True: data points. False: gaps.}
+    * windowSize : int
+        size of the window - equal in both directions
+
+    Returns:
+
+    * rows, cols : 1d-array
+        row and column indexes of the upper-left corner of each window
+    """
+    gaps = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.intp)
+    np.cumsum(np.cumsum(~mask, axis=0), axis=1, out=gaps[1:, 1:])
+    w = windowSize
+    count = gaps[w:, w:] - gaps[:-w, w:] - gaps[w:, :-w] + gaps[:-w, :-w]
+    return np.nonzero(count == 0)
+
+
+
+def window_corners(shape, windowSize):
+    """
+    Upper-left corners of all the moving data windows that fit
+    entirely inside the grid, in the same order as "moving_window"
+    (left to right and up to down).
+
+    Parameters:
+
+    * shape : tuple = (nx, ny)
+        the shape of the grid
+    * windowSize : int
+        size of the window - equal in both directions
+
+    Returns:
+
+    * rows, cols : 1d-array
+        row and column indexes of the upper-left corner of each window
+    """
+    nrows = shape[0] - windowSize + 1
+    ncols = shape[1] - windowSize + 1
+    rows, cols = np.divmod(np.arange(max(nrows, 0)*max(ncols, 0)),
+                           max(ncols, 1))
+    return rows, cols
+
+
+
+def _solve_windows_numpy(data, dx, dy, dz, xi, yi, zi, SI, windowSize,
+                         rows, cols, batch):
+    """
+    Array-based solver: gathers a batch of windows at once and solves
+    the normal equations of all of them with stacked matrix products.
+    """
+    n = len(rows)
+    npts = windowSize*windowSize
+    p = np.empty((n, 4))
+    stdz = np.empty(n)
+    offset = np.arange(windowSize)
+    for start in range(0, n, batch):
+        stop = min(start + batch, n)
+        ii = rows[start:stop, None, None] + offset[None, :, None]
+        jj = cols[start:stop, None, None] + offset[None, None, :]
+        windx = dx[ii, jj].reshape(-1, npts)
+        windy = dy[ii, jj].reshape(-1, npts)
+        windz = dz[ii, jj].reshape(-1, npts)
+        # system of equations on Euler deconvolution
+        A = np.empty((stop - start, npts, 4))
+        A[:, :, 0] = windx
+        A[:, :, 1] = windy
+        A[:, :, 2] = windz
+        A[:, :, 3] = SI
+        vety = windx*xi[ii, jj].reshape(-1, npts) + \
+               windy*yi[ii, jj].reshape(-1, npts) + \
+               windz*zi[ii, jj].reshape(-1, npts) + \
+               SI*data[ii, jj].reshape(-1, npts)
+        # compute the estimates
+        AT = np.swapaxes(A, 1, 2)
+        ATA = np.linalg.inv(np.matmul(AT, A))
+        ATy = np.matmul(AT, vety[:, :, None])
+        p[start:stop] = np.matmul(ATA, ATy)[:, :, 0]
+        # standard deviation of z derivative (for populations population)
+        stdz[start:stop] = windz.std(axis=1, ddof=1)
+    return p, stdz
+
+
+
+if numba is not None:
+
+    @numba.njit(parallel=True, cache=True)
+    def _solve_windows_jit(data, dx, dy, dz, xi, yi, zi, SI, windowSize,
+                           rows, cols, p, stdz, ok):
+        """
+        Compiled solver: one parallel loop over the windows that reads the
+        grids in place, accumulates the normal equations in scalars and
+        solves the 4x4 system by Cholesky factorization, so no temporary
+        arrays are allocated. "ok" is False for the windows whose system
+        is not positive definite (their estimates are not computed).
+        """
+        npts = windowSize*windowSize
+        for k in numba.prange(len(rows)):
+            r0 = rows[k]
+            c0 = cols[k]
+            # normal equations A.T A and A.T y of the window
+            s00 = s01 = s02 = s03 = 0.
+            s11 = s12 = s13 = s22 = s23 = 0.
+            b0 = b1 = b2 = b3 = 0.
+            for i in range(r0, r0 + windowSize):
+                for j in range(c0, c0 + windowSize):
+                    gx = dx[i, j]
+                    gy = dy[i, j]
+                    gz = dz[i, j]
+                    vety = gx*xi[i, j] + gy*yi[i, j] + gz*zi[i, j] + \
+                           SI*data[i, j]
+                    s00 += gx*gx
+                    s01 += gx*gy
+                    s02 += gx*gz
+                    s03 += gx*SI
+                    s11 += gy*gy
+                    s12 += gy*gz
+                    s13 += gy*SI
+                    s22 += gz*gz
+                    s23 += gz*SI
+                    b0 += gx*vety
+                    b1 += gy*vety
+                    b2 += gz*vety
+                    b3 += SI*vety
+            s33 = npts*SI*SI
+            # Cholesky factorization of the symmetric 4x4 system - a pivot
+            # that is not positive (or NaN) stops the factorization
+            ok[k] = False
+            d = s00
+            if not d > 0.:
+                continue
+            l00 = np.sqrt(d)
+            l10 = s01/l00
+            l20 = s02/l00
+            l30 = s03/l00
+            d = s11 - l10*l10
+            if not d > 0.:
+                continue
+            l11 = np.sqrt(d)
+            l21 = (s12 - l20*l10)/l11
+            l31 = (s13 - l30*l10)/l11
+            d = s22 - l20*l20 - l21*l21
+            if not d > 0.:
+                continue
+            l22 = np.sqrt(d)
+            l32 = (s23 - l30*l20 - l31*l21)/l22
+            d = s33 - l30*l30 - l31*l31 - l32*l32
+            if not d > 0.:
+                continue
+            l33 = np.sqrt(d)
+            ok[k] = True
+            y0 = b0/l00
+            y1 = (b1 - l10*y0)/l11
+            y2 = (b2 - l20*y0 - l21*y1)/l22
+            y3 = (b3 - l30*y0 - l31*y1 - l32*y2)/l33
+            p[k, 3] = y3/l33
+            p[k, 2] = (y2 - l32*p[k, 3])/l22
+            p[k, 1] = (y1 - l21*p[k, 2] - l31*p[k, 3])/l11
+            p[k, 0] = (y0 - l10*p[k, 1] - l20*p[k, 2] - l30*p[k, 3])/l00
+            # standard deviation of z derivative (for populations population)
+            mean = 0.
+            for i in range(r0, r0 + windowSize):
+                for j in range(c0, c0 + windowSize):
+                    mean += dz[i, j]
+            mean /= npts
+            var = 0.
+            for i in range(r0, r0 + windowSize):
+                for j in range(c0, c0 + windowSize):
+                    var += (dz[i, j] - mean)**2
+            stdz[k] = np.sqrt(var/(npts - 1.))
+
+
+
+def solve_windows(data, dx, dy, dz, xi, yi, zi, SI, windowSize, rows, cols,
+                  backend='numpy', batch=4096, monitor=None):
+    """
+    Solves the system of equations of Euler deconvolution for a set of
+    moving data windows.
+
+    Parameters:
+
+    * data : 2d-array
+        the input data set - gridded
+    * dx, dy, dz : 2d-array
+        derivatives in x-, y- and z-directions
+    * xi, yi, zi : 2d-array
+        grid of coordinates in x-, y- and z-directions
+    * SI : int
+        structural index - 0, 1, 2 or 3
+    * windowSize : int
+        size of the window - equal in both directions
+    * rows, cols : 1d-array
+        upper-left corners of the windows (see "window_corners")
+    * backend : string
+        'numpy' - array-based batches of windows,
+        'jit' - compiled loop (requires numba),
+        'auto' - 'jit' if numba is installed, otherwise 'numpy'
+        The compiled loop sums the normal equations in another order, so
+        its estimates differ from the 'numpy' ones by rounding errors
+        (about 1e-10 m)
+    * batch : int
+        number of windows solved together by the 'numpy' backend
+    * monitor : WindowMonitor
+        progress report and cancellation (see "progress.py"). The windows
+        are solved in chunks and the monitor is checked between chunks.
+        None: all the windows are solved at once
+
+    Returns:
+
+    * p : 2d-array
+        x, y, z and base-level estimates of each window - only the first
+        windows when the run is cancelled
+    * stdz : 1d-array
+        standard deviation of the z derivative in each window
+    """
+    if backend == 'auto':
+        backend = 'numpy' if numba is None else 'jit'
+    if backend not in ('numpy', 'jit'):
+        raise ValueError("unknown backend '%s'" % backend)
+    if backend == 'jit' and numba is None:
+        raise ImportError("the 'jit' backend requires numba")
+    rows = np.asarray(rows, dtype=np.intp)
+    cols = np.asarray(cols, dtype=np.intp)
+    if monitor is None:
+        return _solve_chunk(data, dx, dy, dz, xi, yi, zi, SI, windowSize,
+                            rows, cols, backend, batch)
+    monitor.start(len(rows))
+    p = np.empty((len(rows), 4))
+    stdz = np.empty(len(rows))
+    done = 0
+    for start in range(0, len(rows), monitor.chunk):
+        if monitor.cancelled:
+            break
+        stop = min(start + monitor.chunk, len(rows))
+        p[start:stop], stdz[start:stop] = _solve_chunk(data, dx, dy, dz, xi,
+                                                       yi, zi, SI, windowSize,
+                                                       rows[start:stop],
+                                                       cols[start:stop],
+                                                       backend, batch)
+        done = stop
+        monitor.update(done)
+    monitor.finish()
+    return p[:done], stdz[:done]
+
+
+
+def _solve_chunk(data, dx, dy, dz, xi, yi, zi, SI, windowSize, rows, cols,
+                 backend, batch):
+    """
+    Solves a chunk of windows with the chosen backend.
+    """
+    if backend == 'numpy':
+        with stage('euler.window_solver.numpy', rows):
+            return _solve_windows_numpy(data, dx, dy, dz, xi, yi, zi, SI,
+                                        windowSize, rows, cols, batch)
+    p = np.empty((len(rows), 4))
+    stdz = np.empty(len(rows))
+    ok = np.empty(len(rows), dtype=np.bool_)
+    arrays = [np.asarray(a, dtype=np.float64)
+              for a in (data, dx, dy, dz, xi, yi, zi)]
+    with stage('euler.window_solver.jit', rows):
+        _solve_windows_jit(*(arrays + [float(SI), windowSize, rows,
+                                       cols, p, stdz, ok]))
+    failed = np.flatnonzero(~ok)
+    if len(failed):
+        # systems that are not positive definite (e.g. SI=0 and flat
+        # windows) are solved by the 'numpy' backend, which raises
+        # numpy.linalg.LinAlgError when they are singular
+        p[failed], stdz[failed] = _solve_windows_numpy(
+            data, dx, dy, dz, xi, yi, zi, SI, windowSize, rows[failed],
+            cols[failed], batch)
+    return p, stdz
+
+
+
+def euler_windows(data, dx, dy, dz, xi, yi, zi, SI, windowSize,
+                  backend='numpy', mask=None, monitor=None):
+    """
+    Euler deconvolution - solves the system of equations
+    for each moving data window and places the estimates
+    at the window centers
+
+    Parameters:
+
+    * data : 2d-array
+        the input data set - gridded
+    * dx, dy, dz : 2d-array
+        derivatives in x-, y- and z-directions
+    * xi, yi, zi : 2d-array
+        grid of coordinates in x-, y- and z-directions
+    * SI : int
+        structural index - 0, 1, 2 or 3
+    * windowSize : int
+        size of the window - equal in both directions
+    * backend : string
+        window solver - 'numpy', 'jit' or 'auto' (see "solve_windows")
+    * mask : 2d-array
+        Location of gaps - {True: data points. False: gaps.}
+        Only the windows without gaps are solved. None: no gaps.
+    * monitor : WindowMonitor
+        progress report and cancellation (see "solve_windows")
+
+    Returns:
+
+    * estx, esty, estz, estb, stdzmat : 2d-array
+        x, y, z, base-level and standard deviation of the z derivative
+        estimated at each window center (NaN where no window is solved)
+    """
+    if mask is None:
+        rows, cols = window_corners(data.shape, windowSize)
+    else:
+        rows, cols = active_windows(mask, windowSize)
+    p, stdz = solve_windows(data, dx, dy, dz, xi, yi, zi, SI, windowSize,
+                            rows, cols, backend, monitor=monitor)
+    # a cancelled run solves only the first windows
+    rows = rows[:len(p)]
+    cols = cols[:len(p)]
+
+    estx = np.full(data.shape, np.nan)
+    esty = np.full(data.shape, np.nan)
+    estz = np.full(data.shape, np.nan)
+    estb = np.full(data.shape, np.nan)
+    stdzmat = np.full(data.shape, np.nan)
+    centers = (rows + windowSize//2, cols + windowSize//2)
+    estx[centers] = p[:, 0]
+    esty[centers] = p[:, 1]
+    estz[centers] = p[:, 2]
+    estb[centers] = p[:, 3]
+    stdzmat[centers] = stdz
+    return estx, esty, estz, estb, stdzmat
+
+
+
+def select_solutions(estx, esty, estz, estb, stdzmat, windowSize, filt,
+                     with_stdz=False):
+    """
+    Keeps a percentage of the Euler solutions with the higher standard
+    deviation of the z derivative
+
+    Parameters:
+
+    * estx, esty, estz, estb, stdzmat : 2d-array
+        estimates at the window centers, NaN where no window is solved
+        (see "euler_windows")
+    * windowSize : int
+        size of the window - equal in both directions
+    * filt : float
+        percentage of the solutions that will be keep
+    * with_stdz : bool
+        True also returns the standard deviation of the z derivative
+        of each solution as a fifth column
+
+    Returns:
+
+    * classic_est : 2d-array
+        x, y, z and base-level best estimates kept after select a percentage
+    """
+    delta = windowSize//2
+    # get rid of zeros in the border
+    estx = estx[delta:-delta, delta:-delta]
+    esty = esty[delta:-delta, delta:-delta]
+    estz = estz[delta:-delta, delta:-delta]
+    estb = estb[delta:-delta, delta:-delta]
+    stdzmat = stdzmat[delta:-delta, delta:-delta]
+    # group the solutions for the classic plot
+    classic = np.stack((estx.ravel(), esty.ravel(), estz.ravel(),
+                        estb.ravel(), stdzmat.ravel()), axis=-1)
+    # windows with gaps have no solution
+    classic = classic[~np.isnan(classic[:, -1])]
+    # sort the solutions according to the std of df/dz and filter a percentage
+    with stage('euler.sort', classic):
+        order = np.argsort(-classic[:, -1], kind='stable')
+    classic_est = classic[order][:int(len(classic)*filt)]
+    if not with_stdz:
+        classic_est = classic_est[:, :-1]
+    return classic_est
+
+
+
+def euler_estimates(data, xi, yi, zi, shape, area, SI, windowSize,
+                    alpha=None, backend='numpy', monitor=None):
+    """
+    Euler deconvolution - computes the derivatives and solves the
+    system of equations for each moving data window, keeping all the
+    estimates (solution store) before a percentage is selected.
+    The estimates are kept in the shared cache (see "cache.py").
+
+    Parameters:
+
+    * data : 1d-array
+        the input data set - gaps as NaN
+    * xi, yi, zi : 1d-array
+        grid of coordinates in x-, y- and z-directions
+    * shape : tuple = (nx, ny)
+        the shape of the grid
+    * area : list
+        the area of the input data - [south, north, west, east]
+    * SI : int
+        structural index - 0, 1, 2 or 3
+    * windowSize : int
+        size of the window - equal in both directions
+    * alpha : float
+        regularization parameter - None for non-regularized derivatives
+    * backend : string
+        window solver - 'numpy', 'jit' or 'auto' (see "solve_windows")
+    * monitor : WindowMonitor
+        progress report and cancellation (see "solve_windows") - the
+        estimates of a cancelled run are not kept in the cache
+
+    Returns:
+
+    * estx, esty, estz, estb, stdzmat : 2d-array
+        x, y, z, base-level and standard deviation of the z derivative
+        estimated at each window center (NaN where no window is solved)
+    """
+    xi = xi.reshape(shape)
+    yi = yi.reshape(shape)
+    zi = zi.reshape(shape)
+    return _euler_estimates(data.reshape(shape), xi, yi, zi, area, (xi, yi, zi),
+                            SI, windowSize, alpha, backend, monitor)
+
+
+
+def euler_estimates_geometry(data, geometry, SI, windowSize, alpha=None,
+                             backend='numpy', monitor=None):
+    """
+    Euler deconvolution of a regular grid described by its geometry
+    instead of coordinate arrays (see "geometry.py"). The coordinates
+    of each window are read from broadcast views of the grid axes, so
+    no coordinate mesh is stored in memory.
+
+    Parameters:
+
+    * data : 1d-array
+        the input data set - gaps as NaN
+    * geometry : GridGeometry
+        origin, spacing, shape and height of the grid
+    * SI : int
+        structural index - 0, 1, 2 or 3
+    * windowSize : int
+        size of the window - equal in both directions
+    * alpha : float
+        regularization parameter - None for non-regularized derivatives
+    * backend : string
+        window solver - 'numpy', 'jit' or 'auto' (see "solve_windows")
+    * monitor : WindowMonitor
+        progress report and cancellation (see "euler_estimates")
+
+    Returns:
+
+    * estx, esty, estz, estb, stdzmat : 2d-array
+        x, y, z, base-level and standard deviation of the z derivative
+        estimated at each window center (NaN where no window is solved)
+    """
+    xi, yi, zi = geometry.coordinates()
+    return _euler_estimates(data.reshape(geometry.shape), xi, yi, zi,
+                            geometry.area, geometry.key(), SI, windowSize,
+                            alpha, backend, monitor)
+
+
+
+def _euler_estimates(data, xi, yi, zi, area, coordinates, SI, windowSize,
+                     alpha, backend, monitor=None):
+    """
+    Derivatives and solution store of a 2d grid; "coordinates" are the
+    items that identify the coordinates in the cache key.
+    """
+    shape = data.shape
+    # the key holds the data with their gaps, so a grid with gaps and a
+    # grid without gaps equal to the filled one have different windows
+    key = content_key(*(('euler_windows', data) + tuple(coordinates) +
+                        (tuple(area), alpha, SI, windowSize, backend)))
+    # fill the gaps before the Fourier transform
+    mask = None
+    if np.isnan(data).any():
+        with stage('euler.fill_gaps', data):
+            data, mask = fill_gaps(data)
+    with stage('euler.derivatives', data):
+        if alpha is None:
+            dx, dy, dz = deriv(data, shape, area)
+        else:
+            dx, dy, dz = regularized_deriv(data, shape, area, alpha)
+
+    estimates = default_cache.get(key)
+    if estimates is None:
+        estimates = euler_windows(data, dx, dy, dz, xi, yi, zi, SI,
+                                  windowSize, backend, mask, monitor)
+        # the partial estimates of a cancelled run are not kept
+        if monitor is None or not monitor.cancelled:
+            estimates = default_cache.put(key, estimates)
+    return estimates
+
+
+
+def euler_deconv(data,xi,yi,zi,shape,area,SI,windowSize,filt,backend='numpy',
+                 monitor=None):
     """
     Euler deconvolution - solves the system of equations
     for each moving data window
@@ -254,7 +815,7 @@ def euler_deconv(data,xi,yi,zi,shape,area,SI,windowSize,filt):
     Parameters:
 
     * data : 1d-array
-        the input data set
+        the input data set - gaps as NaN
     * xi, yi, zi : 1d-array
         grid of coordinates in x-, y- and z-directions
     * shape : tuple = (nx, ny)
@@ -267,6 +828,10 @@ def euler_deconv(data,xi,yi,zi,shape,area,SI,windowSize,filt):
         size of the window - equal in both directions
     * filt : float
         percentage of the solutions that will be keep
+    * backend : string
+        window solver - 'numpy', 'jit' or 'auto' (see "solve_windows")
+    * monitor : WindowMonitor
+        progress report and cancellation (see "euler_estimates")
 
     Returns:
 
@@ -276,69 +841,16 @@ def euler_deconv(data,xi,yi,zi,shape,area,SI,windowSize,filt):
     * classic : 2d-array
         x, y, z, base-level and standard deviation of all estimates
     """   
-    data=data.reshape(shape)
-    dx,dy,dz=deriv(data,shape,area)
-    
-    xi=xi.reshape(shape)
-    yi=yi.reshape(shape)
-    zi=zi.reshape(shape)
-    
-    delta=windowSize//2
-    estx=np.zeros_like(data)
-    esty=np.zeros_like(data)
-    estz=np.zeros_like(data)
-    estb=np.zeros_like(data)
-    stdzmat=np.zeros_like(data)
-    
     # run the moving data window and perform the computations
-    for (east, south, windata,windx,windy,windz,winx,winy,winz) in \
-    moving_window(data,dx,dy,dz,xi,yi,zi,(windowSize,windowSize)):
-        # to keep the same size of the window throughout the grid
-        if windata.shape[0] != windowSize or windata.shape[1] != windowSize:
-            continue
-        # system of equations on Euler deconvolution            
-        A=np.zeros((windowSize*windowSize,4))        
-        A[:,0]=windx.ravel()
-        A[:,1]=windy.ravel()
-        A[:,2]=windz.ravel()
-        A[:,3]=SI*np.ones_like(winx.ravel())
-        
-        vety=np.zeros((windowSize*windowSize,1))
-        vety=windx.ravel()*winx.ravel() + windy.ravel()*winy.ravel() + \
-             windz.ravel()*winz.ravel() + SI*windata.ravel()
-        # compute the estimates     
-        ATA=np.linalg.inv(np.dot(A.T,A))        
-        ATy=np.dot(A.T,vety)
-        p=np.dot(ATA,ATy)
-        
-        #standard deviation of z derivative (for populations population)
-        stdz=np.sqrt(np.sum(abs(A[:,2] - A[:,2].mean())**2)/(len(A[:,2])-1.))
-        
-        estx[south+windowSize//2][east+windowSize//2]=p[0]
-        esty[south+windowSize//2][east+windowSize//2]=p[1]
-        estz[south+windowSize//2][east+windowSize//2]=p[2]
-        estb[south+windowSize//2][east+windowSize//2]=p[3]
-        stdzmat[south+windowSize//2][east+windowSize//2]=stdz
-     
-    # get rid of zeros in the border
-    estx=estx[delta:-delta,delta:-delta]
-    esty=esty[delta:-delta,delta:-delta]
-    estz=estz[delta:-delta,delta:-delta]
-    estb=estb[delta:-delta,delta:-delta]
-    stdzmat=stdzmat[delta:-delta,delta:-delta]
-    xi=xi[delta:-delta,delta:-delta]
-    yi=yi[delta:-delta,delta:-delta]
-    #group the solutions for the classic plot
-    classic=np.stack((estx.ravel(),esty.ravel(),estz.ravel(),estb.ravel(),
-					  stdzmat.ravel()),axis=-1)
-    #sort the solutions according to the std of df/dz and filter a percentage
-    classic_est=np.array(sorted(classic, key=lambda l:l[-1],reverse=True)) \
-                     [:int(len(classic)*filt),:-1]    
+    estimates=euler_estimates(data,xi,yi,zi,shape,area,SI,windowSize,None,
+                              backend,monitor)
+    classic_est=select_solutions(*(estimates+(windowSize,filt)))
     return classic_est
 
 
 
-def euler_deconv_regularized(data, xi, yi, zi, shape, area, SI, windowSize, filt, alpha):
+def euler_deconv_regularized(data, xi, yi, zi, shape, area, SI, windowSize, filt, alpha,
+                             backend='numpy', monitor=None):
     """
     Euler deconvolution - solves the system of equations
     for each moving data window
@@ -346,7 +858,7 @@ def euler_deconv_regularized(data, xi, yi, zi, shape, area, SI, windowSize, filt
     Parameters:
 
     * data : 1d-array
-        the input data set
+        the input data set - gaps as NaN
     * xi, yi, zi : 1d-array
         grid of coordinates in x-, y- and z-directions
     * shape : tuple = (nx, ny)
@@ -359,6 +871,12 @@ def euler_deconv_regularized(data, xi, yi, zi, shape, area, SI, windowSize, filt
         size of the window - equal in both directions
     * filt : float
         percentage of the solutions that will be keep
+    * alpha: float
+        regularization parameter
+    * backend : string
+        window solver - 'numpy', 'jit' or 'auto' (see "solve_windows")
+    * monitor : WindowMonitor
+        progress report and cancellation (see "euler_estimates")
 
     Returns:
 
@@ -368,62 +886,330 @@ def euler_deconv_regularized(data, xi, yi, zi, shape, area, SI, windowSize, filt
     * classic : 2d-array
         x, y, z, base-level and standard deviation of all estimates
     """
-    data = data.reshape(shape)
-    dx, dy, dz = regularized_deriv(data, shape, area, alpha)
+    # run the moving data window and perform the computations
+    estimates = euler_estimates(data, xi, yi, zi, shape, area, SI, windowSize, alpha,
+                                backend, monitor)
+    classic_est = select_solutions(*(estimates + (windowSize, filt)))
+    return classic_est
 
-    xi = xi.reshape(shape)
-    yi = yi.reshape(shape)
-    zi = zi.reshape(shape)
 
-    delta = windowSize // 2
-    estx = np.zeros_like(data)
-    esty = np.zeros_like(data)
-    estz = np.zeros_like(data)
-    estb = np.zeros_like(data)
-    stdzmat = np.zeros_like(data)
 
-    # run the moving data window and perform the computations
-    for (east, south, windata, windx, windy, windz, winx, winy, winz) in \
-            moving_window(data, dx, dy, dz, xi, yi, zi, (windowSize, windowSize)):
-        # to keep the same size of the window throughout the grid
-        if windata.shape[0] != windowSize or windata.shape[1] != windowSize:
-            continue
-        # system of equations on Euler deconvolution
-        A = np.zeros((windowSize * windowSize, 4))
-        A[:, 0] = windx.ravel()
-        A[:, 1] = windy.ravel()
-        A[:, 2] = windz.ravel()
-        A[:, 3] = SI * np.ones_like(winx.ravel())
-
-        vety = np.zeros((windowSize * windowSize, 1))
-        vety = windx.ravel() * winx.ravel() + windy.ravel() * winy.ravel() + \
-               windz.ravel() * winz.ravel() + SI * windata.ravel()
-        # compute the estimates
-        ATA = np.linalg.inv(np.dot(A.T, A))
-        ATy = np.dot(A.T, vety)
-        p = np.dot(ATA, ATy)
+def euler_deconv_geometry(data, geometry, SI, windowSize, filt, alpha=None,
+                          backend='numpy', monitor=None):
+    """
+    Euler deconvolution of a regular grid described by its geometry
+    (see "euler_estimates_geometry")
 
-        # standard deviation of z derivative (for populations population)
-        stdz = np.sqrt(np.sum(abs(A[:, 2] - A[:, 2].mean()) ** 2) / (len(A[:, 2]) - 1.))
+    Parameters:
 
-        estx[south + windowSize // 2][east + windowSize // 2] = p[0]
-        esty[south + windowSize // 2][east + windowSize // 2] = p[1]
-        estz[south + windowSize // 2][east + windowSize // 2] = p[2]
-        estb[south + windowSize // 2][east + windowSize // 2] = p[3]
-        stdzmat[south + windowSize // 2][east + windowSize // 2] = stdz
+    * data : 1d-array
+        the input data set - gaps as NaN
+    * geometry : GridGeometry
+        origin, spacing, shape and height of the grid
+    * SI : int
+        structural index - 0, 1, 2 or 3
+    * windowSize : int
+        size of the window - equal in both directions
+    * filt : float
+        percentage of the solutions that will be keep
+    * alpha : float
+        regularization parameter - None for non-regularized derivatives
+    * backend : string
+        window solver - 'numpy', 'jit' or 'auto' (see "solve_windows")
+    * monitor : WindowMonitor
+        progress report and cancellation (see "euler_estimates")
 
-    # get rid of zeros in the border
-    estx = estx[delta:-delta, delta:-delta]
-    esty = esty[delta:-delta, delta:-delta]
-    estz = estz[delta:-delta, delta:-delta]
-    estb = estb[delta:-delta, delta:-delta]
-    stdzmat = stdzmat[delta:-delta, delta:-delta]
-    xi = xi[delta:-delta, delta:-delta]
-    yi = yi[delta:-delta, delta:-delta]
-    # group the solutions for the classic plot
-    classic = np.stack((estx.ravel(), esty.ravel(), estz.ravel(), estb.ravel(),
-                        stdzmat.ravel()), axis=-1)
-    # sort the solutions according to the std of df/dz and filter a percentage
-    classic_est = np.array(sorted(classic, key=lambda l: l[-1], reverse=True)) \
-        [:int(len(classic) * filt), :-1]
-    return classic_est
\ No newline at end of file
+    Returns:
+
+    * classic_est : 2d-array
+        x, y, z and base-level best estimates kept after select a percentage
+    """
+    estimates = euler_estimates_geometry(data, geometry, SI, windowSize, alpha,
+                                         backend, monitor)
+    return select_solutions(*(estimates + (windowSize, filt)))
+
+
+
+def _change_derivatives(change, halo, area, shape, alpha):
+    """
+    Derivatives of a grid that is zero except for the changed block,
+    computed in a frame extended by "halo" points on each side. The frame
+    is zero-padded to twice its size so the transform has no wrap-around.
+    """
+    frame = (change.shape[0] + 2*halo, change.shape[1] + 2*halo)
+    n_points = int(2**(np.ceil(np.log(2*np.max(frame))/np.log(2))))
+    padded = np.zeros((n_points, n_points))
+    padded[halo:halo + change.shape[0], halo:halo + change.shape[1]] = change
+    anom_FFT = np.fft.fft2(padded)
+
+    xa, xb, ya, yb = area
+    dx = (xb - xa)/(shape[0] - 1)
+    dy = (yb - ya)/(shape[1] - 1)
+    return [np.real(np.fft.ifft2(anom_FFT*default_bank.derivative(
+                padded.shape, dx, dy, direction, 1, alpha)))[:frame[0], :frame[1]]
+            for direction in 'xyz']
+
+
+
+def _frame_border(local):
+    """
+    Largest absolute derivative on the border of the frames of
+    "_change_derivatives".
+    """
+    return max(max(np.abs(d[[0, -1], :]).max(), np.abs(d[:, [0, -1]]).max())
+               for d in local)
+
+
+
+def _halo_too_large(bbox, halo, shape):
+    """
+    True when the block of "bbox" extended by "halo" points reaches the
+    edges of the grid or covers more than half of it.
+    """
+    r0, r1, c0, c1 = bbox
+    return (r0 - halo <= 0 or c0 - halo <= 0 or r1 + halo >= shape[0] or
+            c1 + halo >= shape[1] or
+            2*(r1 - r0 + 2*halo)*(c1 - c0 + 2*halo) > shape[0]*shape[1])
+
+
+
+class IncrementalState(object):
+    """
+    Derivatives, window estimates and ranking of the solutions of an
+    Euler deconvolution, kept between the updates of
+    "euler_deconv_incremental". The grids are copied once, so the grids
+    of the previous run (e.g. read-only cached grids) are not changed.
+
+    The ranking holds the best solutions (highest standard deviation of
+    the z derivative) in their order, beyond the kept percentage by a
+    reserve: an update ranks again only the windows it solved and merges
+    them with the unchanged solutions of the ranking.
+
+    Parameters:
+
+    * derivatives : tuple = (dx, dy, dz)
+        derivatives of the previous run ("deriv" or "regularized_deriv")
+    * estimates : tuple = (estx, esty, estz, estb, stdzmat)
+        window estimates of the previous run ("euler_estimates")
+    * windowSize : int
+        size of the window - equal in both directions
+    * filt : float
+        percentage of the solutions that will be keep
+    * reserve : float
+        solutions ranked beyond the kept ones, as a fraction of them
+    """
+
+    __slots__ = ('derivatives', 'estimates', 'windowSize', 'filt',
+                 'reserve', 'scale', 'count', 'ranking', 'values')
+
+    def __init__(self, derivatives, estimates, windowSize, filt,
+                 reserve=1.):
+        self.derivatives = tuple(np.array(d, dtype=float)
+                                 for d in derivatives)
+        self.estimates = tuple(np.array(e, dtype=float) for e in estimates)
+        self.windowSize = windowSize
+        self.filt = filt
+        self.reserve = reserve
+        self.rank()
+
+    @property
+    def kept(self):
+        """
+        Number of solutions kept after select a percentage.
+        """
+        return int(self.count*self.filt)
+
+    def rank(self):
+        """
+        Ranks all the solutions, as "select_solutions", and computes the
+        largest absolute derivative.
+        """
+        self.scale = max(np.abs(d).max() for d in self.derivatives)
+        delta = self.windowSize//2
+        stdz = self.estimates[4][delta:-delta, delta:-delta].ravel()
+        valid = np.flatnonzero(~np.isnan(stdz))
+        order = valid[np.argsort(-stdz[valid], kind='stable')]
+        self.count = len(valid)
+        size = int(np.ceil(self.kept*(1 + self.reserve))) + 1
+        self.ranking = order[:size]
+        self.values = stdz[self.ranking]
+
+    def update(self, rows, cols):
+        """
+        Ranks again the solutions of the windows with corners in the
+        rows "rows[0]" to "rows[1] - 1" and the columns "cols[0]" to
+        "cols[1] - 1", solved again after a change.
+        """
+        delta = self.windowSize//2
+        stdzmat = self.estimates[4]
+        nrows = stdzmat.shape[0] - 2*delta
+        ncols = stdzmat.shape[1] - 2*delta
+        # corners and centers inside "select_solutions" have the same
+        # indexes in the grid of the centers without its border
+        a0, a1 = rows[0], min(rows[1], nrows)
+        b0, b1 = cols[0], min(cols[1], ncols)
+        ranked_rows, ranked_cols = np.divmod(self.ranking, ncols)
+        changed = ((ranked_rows >= a0) & (ranked_rows < a1) &
+                   (ranked_cols >= b0) & (ranked_cols < b1))
+        unchanged = self.ranking[~changed]
+        if len(unchanged) < self.kept:
+            # too few unchanged solutions are ranked to keep a percentage
+            self.rank()
+            return
+
+        # the unchanged solutions keep their order: the solved windows
+        # are inserted among them in the order of "select_solutions"
+        # (decreasing value, then increasing index)
+        values = self.values[~changed]
+        new_rows, new_cols = np.mgrid[a0:a1, b0:b1]
+        new = (new_rows*ncols + new_cols).ravel()
+        new_values = stdzmat[new_rows + delta, new_cols + delta].ravel()
+        keep = ~np.isnan(new_values)
+        new, new_values = new[keep], new_values[keep]
+        order = np.lexsort((new, -new_values))
+        new, new_values = new[order], new_values[order]
+        left = np.searchsorted(-values, -new_values, 'left')
+        right = np.searchsorted(-values, -new_values, 'right')
+        positions = left.copy()
+        for k in np.flatnonzero(right > left):
+            positions[k] += np.searchsorted(unchanged[left[k]:right[k]],
+                                            new[k])
+        ranking = np.insert(unchanged, positions, new)
+        ranked_values = np.insert(values, positions, new_values)
+        # the solved windows placed after the last unchanged solution may
+        # be preceded by solutions outside the ranking
+        before = np.count_nonzero(positions < len(unchanged))
+        size = min(len(unchanged) + before,
+                   int(np.ceil(self.kept*(1 + self.reserve))) + 1)
+        self.ranking = ranking[:size]
+        self.values = ranked_values[:size]
+
+    def solutions(self):
+        """
+        Returns the x, y, z and base-level best estimates kept after
+        select a percentage, in the order of "select_solutions".
+        """
+        delta = self.windowSize//2
+        ncols = self.estimates[4].shape[1] - 2*delta
+        rows, cols = np.divmod(self.ranking[:self.kept], ncols)
+        return np.stack([est[rows + delta, cols + delta]
+                         for est in self.estimates[:4]], axis=-1)
+
+
+
+def euler_deconv_incremental(data, previous_data, xi, yi, zi, shape, area,
+                             SI, state, bbox, alpha=None, tol=1e-3,
+                             backend='numpy'):
+    """
+    Euler deconvolution - updates a previous run after a block of the
+    grid has changed (re-levelled or merged lines). The derivatives are
+    linear in the data, so only the derivatives of the change are added,
+    over the region where they are larger than "tol" times the largest
+    derivative of the grid, only the windows that overlap this region
+    are solved again and only their solutions are ranked again (see
+    "IncrementalState"), so the work grows with the size of the change.
+    When this region reaches the edges of the grid (where the full run
+    pads the data with its edge values) or covers more than half of it,
+    the derivatives and windows of the whole grid are computed again, as
+    in a full run. The grids must not have gaps.
+
+    Parameters:
+
+    * data : 1d-array
+        the input data set after the change
+    * previous_data : 1d-array
+        the input data set of the previous run
+    * xi, yi, zi : 1d-array
+        grid of coordinates in x-, y- and z-directions
+    * shape : tuple = (nx, ny)
+        the shape of the grid
+    * area : list
+        the area of the input data - [south, north, west, east]
+    * SI : int
+        structural index - 0, 1, 2 or 3
+    * state : IncrementalState
+        derivatives, window estimates, window size, percentage of the
+        solutions and ranking of the previous run - updated in place
+    * bbox : tuple = (row0, row1, col0, col1)
+        grid indexes of the changed block - rows row0 to row1 - 1 and
+        columns col0 to col1 - 1
+    * alpha : float
+        regularization parameter - None for non-regularized derivatives
+    * tol : float
+        tolerance of the derivatives of the change neglected outside the
+        updated region, relative to the largest derivative of the grid
+        (the largest one of the previous runs is used)
+    * backend : string
+        window solver - 'numpy', 'jit' or 'auto' (see "solve_windows")
+
+    Returns:
+
+    * classic_est : 2d-array
+        x, y, z and base-level best estimates kept after select a percentage
+    """
+    data = data.reshape(shape)
+    previous_data = previous_data.reshape(shape)
+    xi = xi.reshape(shape)
+    yi = yi.reshape(shape)
+    zi = zi.reshape(shape)
+    derivatives = state.derivatives
+    estimates = state.estimates
+    windowSize = state.windowSize
+    r0, r1, c0, c1 = bbox
+    change = data[r0:r1, c0:c1] - previous_data[r0:r1, c0:c1]
+
+    # the derivatives of the change decay as 1/r away from its edges, so
+    # the halo where they fall below "tol" times the largest derivative of
+    # the grid is predicted from their values at a halo of one window
+    scale = tol*state.scale
+    halo = max(windowSize, 1)
+    local = _change_derivatives(change, halo, area, shape, alpha)
+    border = _frame_border(local)
+    if border > scale:
+        halo = int(np.ceil(halo*border/scale)) if scale > 0 else max(shape)
+        if not _halo_too_large(bbox, halo, shape):
+            local = _change_derivatives(change, halo, area, shape, alpha)
+            border = _frame_border(local)
+
+    # the full run pads the grid with its edge values, so a change whose
+    # updated region reaches the edges (or covers most of the grid) is
+    # computed again on the whole grid
+    if _halo_too_large(bbox, halo, shape) or border > scale:
+        if alpha is None:
+            full = deriv(data, shape, area)
+        else:
+            full = regularized_deriv(data, shape, area, alpha)
+        for d, d_full in zip(derivatives, full):
+            d[...] = d_full
+        dx, dy, dz = derivatives
+        for est, est_full in zip(estimates, euler_windows(
+                data, dx, dy, dz, xi, yi, zi, SI, windowSize, backend)):
+            est[...] = est_full
+        state.rank()
+        return state.solutions()
+
+    # add the derivatives of the change inside the grid
+    g0, g1 = r0 - halo, r1 + halo
+    h0, h1 = c0 - halo, c1 + halo
+    for d, d_change in zip(derivatives, local):
+        d[g0:g1, h0:h1] += d_change
+        state.scale = max(state.scale, np.abs(d[g0:g1, h0:h1]).max())
+
+    # solve again the windows that overlap the updated region
+    dx, dy, dz = derivatives
+    window_rows = (max(g0 - windowSize + 1, 0),
+                   min(g1, shape[0] - windowSize + 1))
+    window_cols = (max(h0 - windowSize + 1, 0),
+                   min(h1, shape[1] - windowSize + 1))
+    rows, cols = np.mgrid[window_rows[0]:window_rows[1],
+                          window_cols[0]:window_cols[1]]
+    rows, cols = rows.ravel(), cols.ravel()
+    p, stdz = solve_windows(data, dx, dy, dz, xi, yi, zi, SI, windowSize,
+                            rows, cols, backend)
+    centers = (rows + windowSize//2, cols + windowSize//2)
+    for k, est in enumerate(estimates[:4]):
+        est[centers] = p[:, k]
+    estimates[4][centers] = stdz
+
+    state.update(window_rows, window_cols)
+    return state.solutions()
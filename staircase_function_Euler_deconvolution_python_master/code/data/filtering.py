@@ -15,6 +15,9 @@ email: janaina.melo@usp.br (J.A. Melo); carlos.mendonca@iag.usp.br (C.A. Mendon
 
 import numpy as np
 from sklearn.linear_model import LinearRegression
+from cache import content_key, default_cache
+from operators import default_bank, derivative_operator
+from profiling import stage
 
 
 
@@ -56,6 +59,49 @@ def pad_data(data, shape):
 
 
 
+def data_spectrum(data, shape):
+
+    """
+    Computes the two-dimensional discrete Fourier transform of the padded data. The spectrum is kept in the shared cache 
+    (see "cache.py"), so it is computed once for each data set.
+
+    Parameters:
+        
+    * data: 1D-array
+        input data set 
+    * shape: tuple = (nx, ny)
+        data points number in each direction 
+        
+    Returns:
+        
+    * spectrum: 2D-array
+        Fourier transform of the padded data
+    * padx: float
+        x-direction padded
+    * pady: float
+        y-direction padded
+    """
+
+    nx, ny = shape
+    n_points=int(2**(np.ceil(np.log(np.max(shape))/np.log(2))))
+
+    padx = (n_points - nx) // 2
+    pady = (n_points - ny) // 2
+
+    key = content_key('spectrum', np.reshape(data, shape), 'edge')
+    spectrum = default_cache.get(key, shared=True)
+
+    if spectrum is None:
+        with stage('filtering.pad', data):
+            padded, padx, pady = pad_data(data, shape)
+        with stage('filtering.fft', padded):
+            spectrum = default_cache.put(key, np.fft.fft2(padded), shared=True)
+
+    return spectrum, padx, pady
+
+
+
+
 def fft_wavenumbers(x, y, shape, padshape):
 
     """
@@ -93,6 +139,36 @@ def fft_wavenumbers(x, y, shape, padshape):
 
 
 
+def grid_spacing(x, y, shape):
+
+    """
+    Computes the grid spacing from the coordinates, as "fft_wavenumbers" does. Only the coordinate limits are used, so
+    the functions of this module also accept the coordinate axes of a grid (see "GridGeometry" in "geometry.py") in
+    place of the coordinates mesh.
+
+    Parameters:
+
+    * x, y: 1D- or 2D-array
+        coordinates mesh or coordinate axes in x- and y-directions
+    * shape: tuple = (nx, ny)
+        data points number in each direction
+
+    Returns:
+
+    * dx, dy: float
+        discretization range in x- and y-directions
+    """
+
+    nx, ny = shape
+
+    dx = (x.max() - x.min()) / (nx - 1)
+    dy = (y.max() - y.min()) / (ny - 1)
+
+    return dx, dy
+
+
+
+
 def nonregularized_derivative(x, y, data, shape, order):
 
     """
@@ -119,22 +195,31 @@ def nonregularized_derivative(x, y, data, shape, order):
 
     nx, ny = shape
 
-    # Fills the matriz edges 
-    padded, padx, pady = pad_data(data, shape)
+    key = content_key('nonregularized_derivative', data, shape, x.min(), x.max(), y.min(), y.max(), order)
+    cached = default_cache.get(key)
+    if cached is not None:
+        return cached
 
-    # Wavenumbers in x- and y-directions
-    kx, ky = fft_wavenumbers(x, y, shape, padded.shape)  
+    # Fourier transform of the data with the matriz edges filled
+    spectrum, padx, pady = data_spectrum(data, shape)
+
+    # Derivative operators of the grid geometry (see "operators.py")
+    dx, dy = grid_spacing(x, y, shape)
+    gamma_x = default_bank.derivative(spectrum.shape, dx, dy, 'x', order)
+    gamma_y = default_bank.derivative(spectrum.shape, dx, dy, 'y', order)
+    gamma_z = default_bank.derivative(spectrum.shape, dx, dy, 'z', order)
 
     # Calculates the derivatives in the Fourier domain
-    derivx_fft = np.fft.fft2(padded) * ((kx * 1j) ** order)
-    derivy_fft = np.fft.fft2(padded) * ((ky * 1j) ** order)
-    derivz_fft = np.fft.fft2(padded) * (np.sqrt(kx ** 2 + ky ** 2) ** order)
+    derivx_fft = spectrum * gamma_x
+    derivy_fft = spectrum * gamma_y
+    derivz_fft = spectrum * gamma_z
 
     # np.real: returns the real part of the complex argument
     # np.fft.ifft2: calculates the two-dimensional inverse discrete Fourier transform
-    derivx_pad = np.real(np.fft.ifft2(derivx_fft))
-    derivy_pad = np.real(np.fft.ifft2(derivy_fft))
-    derivz_pad = np.real(np.fft.ifft2(derivz_fft))
+    with stage('filtering.ifft', derivx_fft, derivy_fft, derivz_fft):
+        derivx_pad = np.real(np.fft.ifft2(derivx_fft))
+        derivy_pad = np.real(np.fft.ifft2(derivy_fft))
+        derivz_pad = np.real(np.fft.ifft2(derivz_fft))
 
     # Removes the padding in derivative
     derivx = derivx_pad[padx: padx + nx, pady: pady + ny]
@@ -146,7 +231,7 @@ def nonregularized_derivative(x, y, data, shape, order):
     dy = np.ravel(derivy)
     dz = np.ravel(derivz)
 
-    return dx, dy, dz
+    return default_cache.put(key, (dx, dy, dz))
 
 
 
@@ -175,28 +260,31 @@ def regularized_derivative(x, y, data, shape, alpha):
     
     nx, ny = shape
 
-    # Fills the matriz edges 
-    padded, padx, pady = pad_data(data, shape)
-    
-    # Wavenumbers in x-, y- and z-directions
-    kx, ky = fft_wavenumbers(x, y, shape, padded.shape)  
-    kz = np.sqrt(kx ** 2 + ky ** 2)
+    key = content_key('regularized_derivative', data, shape, x.min(), x.max(), y.min(), y.max(), alpha)
+    cached = default_cache.get(key)
+    if cached is not None:
+        return cached
 
-    # Derivative operator
-    gamma_y = ((1j) * ky) / (1 + alpha * (ky ** 2))
-    gamma_x = ((1j) * kx) / (1 + alpha * (kx ** 2))
-    gamma_z = kz / (1 + alpha * (kz ** 2))
+    # Fourier transform of the data with the matriz edges filled
+    spectrum, padx, pady = data_spectrum(data, shape)
+    
+    # Derivative operator of the grid geometry (see "operators.py")
+    dx, dy = grid_spacing(x, y, shape)
+    gamma_y = default_bank.derivative(spectrum.shape, dx, dy, 'y', 1, alpha)
+    gamma_x = default_bank.derivative(spectrum.shape, dx, dy, 'x', 1, alpha)
+    gamma_z = default_bank.derivative(spectrum.shape, dx, dy, 'z', 1, alpha)
 
     # Calculates the derivatives in the Fourier domain
-    derivx_fft = np.fft.fft2(padded) * gamma_x
-    derivy_fft = np.fft.fft2(padded) * gamma_y 
-    derivz_fft = np.fft.fft2(padded) * gamma_z 
+    derivx_fft = spectrum * gamma_x
+    derivy_fft = spectrum * gamma_y 
+    derivz_fft = spectrum * gamma_z 
 
     # np.real: returns the real part of the complex argument
     # np.fft.ifft2: calculates the two-dimensional inverse discrete Fourier transform
-    derivx_pad = np.real(np.fft.ifft2(derivx_fft))
-    derivy_pad = np.real(np.fft.ifft2(derivy_fft))
-    derivz_pad = np.real(np.fft.ifft2(derivz_fft))
+    with stage('filtering.ifft', derivx_fft, derivy_fft, derivz_fft):
+        derivx_pad = np.real(np.fft.ifft2(derivx_fft))
+        derivy_pad = np.real(np.fft.ifft2(derivy_fft))
+        derivz_pad = np.real(np.fft.ifft2(derivz_fft))
 
     # Removes the padding in derivative
     derivx = derivx_pad[padx: padx + nx, pady: pady + ny]
@@ -208,12 +296,138 @@ def regularized_derivative(x, y, data, shape, alpha):
     dx = np.ravel(derivx)
     dz = np.ravel(derivz)
 
-    return dx, dy, dz
+    return default_cache.put(key, (dx, dy, dz))
+
+
+
+
+def regularized_derivatives(x, y, data, shape, alpha, orders=(1,), directions=('x', 'y', 'z')):
+
+    """
+    Computes the regularized directional derivatives of any order in the Fourier domain in a single pass: the Fourier 
+    transform of the data is computed once and shared by all the requested directions and orders. The regularized 
+    operator D / (1 + alpha * |D| ** 2) of the non-regularized operator D (see "derivative_operator") reduces to 
+    equation 3 of the paper for the first-order derivatives.
+
+    Parameters:
+
+    * x, y: 1D-array
+        coordinates mesh in x- and y-directions
+    * data: 1D-array
+        input data set
+    * shape: tuple = (nx, ny)
+        data points number in each direction 
+    * alpha: float
+        regularization parameter - None for non-regularized derivatives
+    * orders: tuple
+        derivative orders
+    * directions: tuple
+        derivative directions - 'x', 'y' and/or 'z'
+
+    Returns:
+
+    * derivatives: dictionary
+        1D-array of the derivative for each (direction, order)
+    """
+
+    nx, ny = shape
+
+    # Fourier transform of the data with the matriz edges filled
+    spectrum, padx, pady = data_spectrum(data, shape)
+    dx, dy = grid_spacing(x, y, shape)
+
+    derivatives = {}
+
+    for order in orders:
+        for direction in directions:
+
+            # Derivative operator of the grid geometry (see "operators.py")
+            gamma = default_bank.derivative(spectrum.shape, dx, dy, direction, order, alpha)
+
+            # Calculates the derivative in the space domain and removes the padding
+            with stage('filtering.ifft', spectrum):
+                deriv_pad = np.real(np.fft.ifft2(spectrum * gamma))
+            derivatives[direction, order] = np.ravel(deriv_pad[padx: padx + nx, pady: pady + ny])
+
+    return derivatives
+
+
+
+
+def low_memory_derivative(x, y, data, shape, alpha=None, order=1, out=None, block=256):
+
+    """
+    Computes the directional derivatives (regularized or not, see "regularized_derivatives") with a low peak memory: 
+    the derivatives are computed one after another into the output arrays, the operators are built and applied in 
+    blocks of rows of the spectrum, and the inverse Fourier transforms are computed in place in a single work array. 
+    Nothing is kept in the shared cache. The peak memory is about the spectrum and one work spectrum (5 times the 
+    padded grid), against 18 times the padded grid for "regularized_derivative" (see "derivative_memory" in 
+    "benchmark.py").
+
+    Parameters:
+
+    * x, y: 1D-array
+        coordinates mesh in x- and y-directions
+    * data: 1D-array
+        input data set
+    * shape: tuple = (nx, ny)
+        data points number in each direction 
+    * alpha: float
+        regularization parameter - None for non-regularized derivatives
+    * order: integer
+        derivative order
+    * out: list of 1D-array
+        output arrays of the x-, y- and z-derivatives - None allocates them
+    * block: integer
+        rows of the spectrum multiplied by the operator at a time
+
+    Returns:
 
+    * dx, dy, dz: 1D-array
+        derivatives in x-, y- and z-directions
+    """
+
+    nx, ny = shape
+
+    if out is None:
+        out = [np.empty(nx * ny) for direction in ('x', 'y', 'z')]
+
+    # Fourier transform of the data with the matriz edges filled
+    padded, padx, pady = pad_data(data, shape)
+    spectrum = padded.astype(complex)
+    del padded
+    try:
+        np.fft.fft(spectrum, axis=1, out=spectrum)
+        np.fft.fft(spectrum, axis=0, out=spectrum)
+    except TypeError:
+        spectrum = np.fft.fft2(spectrum)
 
+    dx, dy = grid_spacing(x, y, shape)
+    kx, ky = default_bank.wavenumbers(spectrum.shape, dx, dy)
+    work = np.empty_like(spectrum)
 
+    for direction, deriv in zip(('x', 'y', 'z'), out):
 
-def s_function_derivative(x, y, data, shape, alpha):
+        # Multiplies the spectrum by the operator in blocks of rows
+        for r0 in range(0, spectrum.shape[0], block):
+            r1 = min(r0 + block, spectrum.shape[0])
+            gamma = derivative_operator(kx[r0:r1], ky, direction, order, alpha)
+            np.multiply(spectrum[r0:r1], gamma, out=work[r0:r1])
+
+        # Inverse Fourier transform in place (one axis at a time, as "np.fft.ifft2") and removal of the padding
+        try:
+            np.fft.ifft(work, axis=1, out=work)
+            np.fft.ifft(work, axis=0, out=work)
+        except TypeError:
+            work[...] = np.fft.ifft2(work)
+        np.copyto(deriv.reshape(shape), work.real[padx: padx + nx, pady: pady + ny])
+
+    return tuple(out)
+
+
+
+
+def s_function_derivative(x, y, data, shape, alpha, order=1):
 
     """
     Computes the normalized Euclidean norm of the directional derivatives to different regularization parameter values using equations 
@@ -229,6 +443,8 @@ def s_function_derivative(x, y, data, shape, alpha):
         data points number in each direction 
     * alpha: 1D-array
         trial regularization parameters
+    * order: integer
+        derivative order (see "regularized_derivatives")
 
     Returns:
 
@@ -236,35 +452,25 @@ def s_function_derivative(x, y, data, shape, alpha):
         normalized Euclidean norm of the x-, y- and z-derivatives to different regularization parameter values
     """
 
+    key = content_key('s_function_derivative', data, shape, x.min(), x.max(), y.min(), y.max(), np.asarray(alpha), order)
+    cached = default_cache.get(key)
+    if cached is not None:
+        return cached
+
     norm_sol_dx = []
     norm_sol_dy = []
     norm_sol_dz = []
 
     for i in range(len(alpha)):
 
-        dx, dy, dz = regularized_derivative(x, y, data, shape, alpha[i])
-
-        soma_x = 0
-        soma_y = 0
-        soma_z = 0
-
-        for i in range(len(dx)):
-
-            elem_dx = dx[i] ** 2
-            elem_dy = dy[i] ** 2
-            elem_dz = dz[i] ** 2
-
-            soma_x = soma_x + elem_dx
-            soma_y = soma_y + elem_dy
-            soma_z = soma_z + elem_dz
+        with stage('filtering.s_function.derivatives', data):
+            derivatives = regularized_derivatives(x, y, data, shape, alpha[i], orders=(order,))
 
-        norm_dx = np.sqrt(soma_x)
-        norm_dy = np.sqrt(soma_y)
-        norm_dz = np.sqrt(soma_z)
-
-        norm_sol_dx.append(norm_dx)
-        norm_sol_dy.append(norm_dy)
-        norm_sol_dz.append(norm_dz)
+        with stage('filtering.s_function.norm', derivatives['x', order], derivatives['y', order],
+                   derivatives['z', order]):
+            norm_sol_dx.append(np.linalg.norm(derivatives['x', order]))
+            norm_sol_dy.append(np.linalg.norm(derivatives['y', order]))
+            norm_sol_dz.append(np.linalg.norm(derivatives['z', order]))
 
     norm_sol_dx = np.ravel(norm_sol_dx)
     norm_sol_dy = np.ravel(norm_sol_dy)
@@ -274,7 +480,7 @@ def s_function_derivative(x, y, data, shape, alpha):
     norm_sol_dy = norm_sol_dy/max(norm_sol_dy)
     norm_sol_dz = norm_sol_dz/max(norm_sol_dz)
 
-    return norm_sol_dx, norm_sol_dy, norm_sol_dz
+    return default_cache.put(key, (norm_sol_dx, norm_sol_dy, norm_sol_dz))
 
 
 
@@ -318,7 +524,8 @@ def regularization_parameter(norm_sol, alpha_test, upper_limit, inferior_limit,
     alpha = np.array(alpha).reshape(-1,1)
 
     # Fits a linear regression model
-    linreg = LinearRegression().fit(alpha, norm)
+    with stage('filtering.regularization_parameter', alpha):
+        linreg = LinearRegression().fit(alpha, norm)
 
     # calculates the angular and linear coefficients for the linear regression
     a = linreg.coef_
@@ -354,10 +561,251 @@ def asa_tdr(dx, dy, dz):
         tilt derivative
     """
 
-    horiz_deriv = np.sqrt(dx ** 2 + dy ** 2)
+    asa, tdr = edge_attributes(dx, dy, dz, ('asa', 'tdr'))
 
-    tdr = np.arctan2(dz, horiz_deriv)
+    return asa, tdr
 
-    asa = np.sqrt(dx ** 2 + dy ** 2 + dz ** 2)
 
-    return asa, tdr
+
+
+def edge_attributes(dx, dy, dz, attributes=('asa', 'tdr', 'thd', 'theta', 'thdr'), shape=None, spacing=None, out=None,
+                    block=2 ** 16):
+
+    """
+    Computes edge attributes of the directional first-order derivatives in a single pass over dx, dy and dz: analytical 
+    signal amplitude (equation 4 of the paper), tilt derivative (equation 5 of the paper), total horizontal derivative, 
+    theta map (arccos of the total horizontal derivative over the analytical signal amplitude) and total horizontal 
+    derivative of the tilt derivative. The attributes are computed in blocks of points written straight into the 
+    output arrays, so only two block-sized buffers are allocated.
+
+    Parameters:
+
+    * dx, dy, dz: 1D-array
+        x-, y- and z-derivatives
+    * attributes: tuple
+        attributes to compute - 'asa', 'tdr', 'thd', 'theta' and/or 'thdr'
+    * shape: tuple = (nx, ny)
+        data points number in each direction - required by 'thdr'
+    * spacing: tuple = (dx, dy)
+        grid spacing in x- and y-directions (see "grid_spacing") - required by 'thdr'
+    * out: list of 1D-array
+        output arrays of the attributes - None allocates them
+    * block: integer
+        number of points computed together (whole rows for 'thdr')
+
+    Returns:
+
+    * attributes: tuple of 1D-array
+        attributes in the requested order
+    """
+
+    dx = np.ravel(dx)
+    dy = np.ravel(dy)
+    dz = np.ravel(dz)
+    n = dx.size
+
+    for name in attributes:
+        if name not in ('asa', 'tdr', 'thd', 'theta', 'thdr'):
+            raise ValueError("unknown attribute '%s'" % name)
+    if 'thdr' in attributes and (shape is None or spacing is None):
+        raise ValueError("the attribute 'thdr' requires the grid shape and spacing")
+
+    if out is None:
+        out = [np.empty(n) for name in attributes]
+    results = dict(zip(attributes, out))
+
+    # The tilt derivative and the analytical signal amplitude are kept when other attributes depend on them
+    if 'thdr' in results and 'tdr' not in results:
+        results['tdr'] = np.empty(n)
+    asa_block = 'theta' in results and 'asa' not in results
+
+    size = min(block, n)
+    horiz = np.empty(size)
+    work = np.empty(size)
+
+    for start in range(0, n, size):
+        stop = min(start + size, n)
+        m = stop - start
+        h = horiz[:m]
+        w = work[:m]
+
+        # Total horizontal derivative
+        np.multiply(dx[start:stop], dx[start:stop], out=h)
+        np.multiply(dy[start:stop], dy[start:stop], out=w)
+        np.add(h, w, out=h)
+
+        if 'asa' in results or asa_block:
+            asa = w if asa_block else results['asa'][start:stop]
+            np.multiply(dz[start:stop], dz[start:stop], out=w)
+            np.add(h, w, out=asa)
+            np.sqrt(asa, out=asa)
+
+        np.sqrt(h, out=h)
+
+        if 'thd' in results:
+            results['thd'][start:stop] = h
+        if 'tdr' in results:
+            np.arctan2(dz[start:stop], h, out=results['tdr'][start:stop])
+        if 'theta' in results:
+            theta = results['theta'][start:stop]
+            asa = w if asa_block else results['asa'][start:stop]
+            theta.fill(1.0)
+            np.divide(h, asa, out=theta, where=asa > 0)
+            np.clip(theta, -1.0, 1.0, out=theta)
+            np.arccos(theta, out=theta)
+
+    if 'thdr' in results:
+        # Central differences of the tilt derivative in row blocks with one halo row on each side
+        nx, ny = shape
+        tdr = results['tdr'].reshape(shape)
+        thdr = results['thdr'].reshape(shape)
+        rows = max(1, size // ny)
+        for r0 in range(0, nx, rows):
+            r1 = min(r0 + rows, nx)
+            a = max(r0 - 1, 0)
+            b = min(r1 + 1, nx)
+            gx, gy = np.gradient(tdr[a:b], spacing[0], spacing[1])
+            np.hypot(gx[r0 - a: r1 - a], gy[r0 - a: r1 - a], out=thdr[r0:r1])
+
+    return tuple(results[name] for name in attributes)
+
+
+
+
+class FilterChain(object):
+
+    """
+    Chain of filters in the Fourier domain (derivatives, upward continuation, reduction to the pole and band-pass). 
+    The operators of all filters are multiplied into one transfer function, so the chain is applied with a single 
+    forward and a single inverse Fourier transform instead of one pair per filter.
+
+    Example: regularized vertical derivative of the reduced-to-the-pole anomaly continued 100 m upward
+
+        chain = FilterChain().reduction_to_pole(45, -5).upward_continuation(100).derivative('z', alpha=1e3)
+        dz_rtp = chain.apply(x, y, tfa, shape)
+    """
+
+    def __init__(self, filters=None):
+
+        self.filters = list(filters or [])
+
+    def _add(self, operator):
+
+        return FilterChain(self.filters + [operator])
+
+    def derivative(self, direction, order=1, alpha=None):
+
+        """
+        Adds a directional derivative - regularized when alpha is given (see "derivative_operator").
+        """
+
+        return self._add(lambda kx, ky: derivative_operator(kx, ky, direction, order, alpha))
+
+    def upward_continuation(self, height):
+
+        """
+        Adds the upward continuation to a height (m) above the observation surface - negative for downward.
+        """
+
+        return self._add(lambda kx, ky: np.exp(-np.sqrt(kx ** 2 + ky ** 2) * height))
+
+    def reduction_to_pole(self, inc, dec, sinc=None, sdec=None):
+
+        """
+        Adds the reduction to the pole for the geomagnetic inclination and declination (degrees) and the source 
+        magnetization inclination and declination (degrees - induced magnetization when not given).
+        """
+
+        sinc = inc if sinc is None else sinc
+        sdec = dec if sdec is None else sdec
+
+        def operator(kx, ky):
+            kz = np.sqrt(kx ** 2 + ky ** 2)
+            kz[kz == 0] = np.inf
+            theta = []
+            for i, d in ((inc, dec), (sinc, sdec)):
+                i, d = np.radians(i), np.radians(d)
+                theta.append(np.sin(i) + 1j * np.cos(i) * (kx * np.cos(d) + ky * np.sin(d)) / kz)
+            return 1 / (theta[0] * theta[1])
+
+        return self._add(operator)
+
+    def bandpass(self, long_wavelength=None, short_wavelength=None, order=4):
+
+        """
+        Adds a Butterworth band-pass filter that keeps the wavelengths (m) between the short and long cut-off 
+        wavelengths - a cut-off that is not given is not applied.
+        """
+
+        def operator(kx, ky):
+            k = np.sqrt(kx ** 2 + ky ** 2)
+            response = np.ones_like(k)
+            if long_wavelength is not None:
+                with np.errstate(divide='ignore'):
+                    response /= 1 + ((2 * np.pi / long_wavelength) / k) ** (2 * order)
+            if short_wavelength is not None:
+                response /= 1 + (k / (2 * np.pi / short_wavelength)) ** (2 * order)
+            return response
+
+        return self._add(operator)
+
+    def transfer_function(self, kx, ky):
+
+        """
+        Multiplies the operators of all filters into one transfer function.
+        """
+
+        transfer = np.ones(np.broadcast(kx, ky).shape, dtype=complex)
+        for operator in self.filters:
+            transfer *= operator(kx, ky)
+
+        return transfer
+
+    def apply(self, x, y, data, shape):
+
+        """
+        Applies the chain to gridded data (see "apply_filter_chains").
+        """
+
+        return apply_filter_chains(x, y, data, shape, [self])[0]
+
+
+
+
+def apply_filter_chains(x, y, data, shape, chains):
+
+    """
+    Applies filter chains to the same data. The Fourier transform of the padded data is computed once for all chains 
+    (see "data_spectrum") and each output takes one inverse transform.
+
+    Parameters:
+
+    * x, y: 1D-array
+        coordinates mesh in x- and y-directions
+    * data: 1D-array
+        input data set
+    * shape: tuple = (nx, ny)
+        data points number in each direction 
+    * chains: list
+        filter chains (see "FilterChain")
+
+    Returns:
+
+    * outputs: list of 1D-array
+        filtered data of each chain
+    """
+
+    nx, ny = shape
+
+    # Fourier transform of the data with the matriz edges filled
+    spectrum, padx, pady = data_spectrum(data, shape)
+
+    # Wavenumbers in x- and y-directions as broadcastable vectors (see "operators.py")
+    kx, ky = default_bank.wavenumbers(spectrum.shape, *grid_spacing(x, y, shape))
+
+    outputs = []
+    for chain in chains:
+        filtered = np.real(np.fft.ifft2(spectrum * chain.transfer_function(kx, ky)))
+        outputs.append(np.ravel(filtered[padx: padx + nx, pady: pady + ny]))
+
+    return outputs
@@ -0,0 +1,531 @@
+"""
+Synthetic forward modelling
+
+A Python module that computes the total-field anomaly of collections of dipoles, horizontal line sources and
+rectangular prisms on grids of any size, to build test and benchmark data with known source depths. The fields are
+computed for all the sources at once over chunks of grid points, so the memory used is bounded by the chunk size, and
+the chunks of a regular grid (see "GridGeometry" in "geometry.py") are computed by a pool of threads without storing
+the coordinate meshes. As in the input data of "synthetic_data.py", x points north, y points east and z points down,
+so the observations above the ground have negative z and the sources have positive depths. When numba is installed,
+the fields are computed by a compiled parallel loop over the grid points instead of the array-based functions.
+
+Sources (one row per source; the last two columns are optional and default to an induced magnetization):
+
+- dipoles: x, y, z (m), moment (A.m2), inclination, declination (degrees)
+- lines: x, y, z (m) of a point of the line, strike (degrees from x towards y), moment per unit length (A.m),
+         inclination, declination (degrees) - infinite horizontal lines
+- prisms: x1, x2, y1, y2, z1, z2 (m), magnetization (A/m), inclination, declination (degrees)
+
+Usage:
+
+    geometry = GridGeometry((0, 0), (10, 10), (10000, 10000), height=-100)
+    sources = random_sources(geometry.area, dipoles=20, lines=5, prisms=10, seed=0)
+    tfa = add_noise(anomaly_grid(geometry, **sources), 1.0, seed=1)
+
+Based on Fatiando a Terra package (https://www.fatiando.org/) for the prism kernels (Bhattacharyya, 1964).
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# Geomagnetic inclination and declination (degrees) of "synthetic_data.py"
+INC, DEC = 45, -5
+
+# Magnetic constant over 4 pi (H/m) and conversion from tesla to nanotesla
+CM = 1e-7
+T2NT = 1e9
+
+
+
+
+def direction_cosines(inc, dec):
+
+    """
+    Computes the unit vector of a direction given by its inclination and declination.
+
+    Parameters:
+
+    * inc, dec: float or 1D-array
+        inclination and declination (degrees)
+
+    Returns:
+
+    * fx, fy, fz: float or 1D-array
+        components in x-, y- and z-directions
+    """
+
+    inc = np.radians(inc)
+    dec = np.radians(dec)
+
+    return np.cos(inc) * np.cos(dec), np.cos(inc) * np.sin(dec), np.sin(inc)
+
+
+
+
+def source_tables(dipoles=None, lines=None, prisms=None, inc=INC, dec=DEC):
+
+    """
+    Converts the sources to tables of geometry and magnetization components used by the field functions.
+
+    Parameters:
+
+    * dipoles, lines, prisms: 2D-array
+        sources, one row per source (see the module documentation) - None for no source of the type
+    * inc, dec: float
+        geomagnetic inclination and declination (degrees) - direction of the induced magnetization
+
+    Returns:
+
+    * dipoles: 2D-array
+        x, y, z, mx, my, mz (A.m2)
+    * lines: 2D-array
+        x, y, z, ux, uy (unit vector along the line), mx, my, mz (A.m, component perpendicular to the line)
+    * prisms: 2D-array
+        x1, x2, y1, y2, z1, z2, mx, my, mz (A/m)
+    """
+
+    def magnetization(sources, column):
+        intensity = sources[:, column]
+        if sources.shape[1] > column + 2:
+            mx, my, mz = direction_cosines(sources[:, column + 1], sources[:, column + 2])
+        else:
+            mx, my, mz = direction_cosines(inc, dec)
+        return intensity * mx, intensity * my, intensity * mz
+
+    def table(sources, columns):
+        if sources is None or len(sources) == 0:
+            return np.empty((0, columns))
+        return np.atleast_2d(np.asarray(sources, dtype=float))
+
+    dipoles = table(dipoles, 4)
+    lines = table(lines, 5)
+    prisms = table(prisms, 7)
+
+    dipole_table = np.column_stack((dipoles[:, :3],) + magnetization(dipoles, 3))
+
+    ux, uy = np.cos(np.radians(lines[:, 3])), np.sin(np.radians(lines[:, 3]))
+    mx, my, mz = magnetization(lines, 4)
+    # Only the component perpendicular to the line produces a field
+    m_along = mx * ux + my * uy
+    line_table = np.column_stack([lines[:, 0], lines[:, 1], lines[:, 2], ux, uy, mx - m_along * ux,
+                                  my - m_along * uy, mz])
+
+    prism_table = np.column_stack((prisms[:, :6],) + magnetization(prisms, 6))
+
+    return dipole_table, line_table, prism_table
+
+
+
+
+def _dipoles_field(x, y, z, dipoles):
+
+    """
+    Magnetic induction (nT) of point dipoles at the observation points - arrays of shape (points, dipoles).
+    """
+
+    mx, my, mz = dipoles[:, 3], dipoles[:, 4], dipoles[:, 5]
+    rx = x[:, None] - dipoles[:, 0]
+    ry = y[:, None] - dipoles[:, 1]
+    rz = z[:, None] - dipoles[:, 2]
+    r2 = rx ** 2 + ry ** 2 + rz ** 2
+    r5 = r2 ** 2.5
+    dot = 3 * (mx * rx + my * ry + mz * rz)
+
+    bx = (dot * rx - mx * r2) / r5
+    by = (dot * ry - my * r2) / r5
+    bz = (dot * rz - mz * r2) / r5
+
+    return CM * T2NT * bx, CM * T2NT * by, CM * T2NT * bz
+
+
+
+
+def _lines_field(x, y, z, lines):
+
+    """
+    Magnetic induction (nT) of infinite horizontal lines of dipoles at the observation points - arrays of shape
+    (points, lines).
+    """
+
+    ux, uy = lines[:, 3], lines[:, 4]
+    mx, my, mz = lines[:, 5], lines[:, 6], lines[:, 7]
+
+    # Distance perpendicular to the line
+    rx = x[:, None] - lines[:, 0]
+    ry = y[:, None] - lines[:, 1]
+    rz = z[:, None] - lines[:, 2]
+    r_along = rx * ux + ry * uy
+    rx = rx - r_along * ux
+    ry = ry - r_along * uy
+    r2 = rx ** 2 + ry ** 2 + rz ** 2
+    r4 = r2 ** 2
+    dot = 2 * (mx * rx + my * ry + mz * rz)
+
+    bx = (dot * rx - mx * r2) / r4
+    by = (dot * ry - my * r2) / r4
+    bz = (dot * rz - mz * r2) / r4
+
+    return 2 * CM * T2NT * bx, 2 * CM * T2NT * by, 2 * CM * T2NT * bz
+
+
+
+
+def _safe_log(value):
+
+    """
+    Natural logarithm that returns 0 where the argument is 0.
+    """
+
+    result = np.zeros_like(value)
+    np.log(value, out=result, where=value != 0)
+
+    return result
+
+
+
+
+def _prisms_field(x, y, z, prisms):
+
+    """
+    Magnetic induction (nT) of uniformly magnetized rectangular prisms at the observation points - arrays of shape
+    (points, prisms).
+    """
+
+    mx, my, mz = prisms[:, 6], prisms[:, 7], prisms[:, 8]
+    xs = [prisms[:, 1] - x[:, None], prisms[:, 0] - x[:, None]]
+    ys = [prisms[:, 3] - y[:, None], prisms[:, 2] - y[:, None]]
+    zs = [prisms[:, 5] - z[:, None], prisms[:, 4] - z[:, None]]
+
+    vxx = vxy = vxz = vyy = vyz = vzz = 0
+    for k in range(2):
+        for j in range(2):
+            for i in range(2):
+                sign = (-1.0) ** (i + j + k)
+                r = np.sqrt(xs[i] ** 2 + ys[j] ** 2 + zs[k] ** 2)
+                vxx = vxx - sign * np.arctan2(zs[k] * ys[j], xs[i] * r)
+                vxy = vxy + sign * _safe_log(zs[k] + r)
+                vxz = vxz + sign * _safe_log(ys[j] + r)
+                vyy = vyy - sign * np.arctan2(zs[k] * xs[i], ys[j] * r)
+                vyz = vyz + sign * _safe_log(xs[i] + r)
+                vzz = vzz - sign * np.arctan2(xs[i] * ys[j], zs[k] * r)
+
+    bx = vxx * mx + vxy * my + vxz * mz
+    by = vxy * mx + vyy * my + vyz * mz
+    bz = vxz * mx + vyz * my + vzz * mz
+
+    return CM * T2NT * bx, CM * T2NT * by, CM * T2NT * bz
+
+
+
+
+if numba is not None:
+
+    @numba.njit(cache=True)
+    def _point_tfa(x, y, z, fx, fy, fz, dipoles, lines, prisms):
+
+        """
+        Total-field anomaly (nT) of all the sources at one observation point.
+        """
+
+        bx = by = bz = 0.
+        for s in range(dipoles.shape[0]):
+            rx = x - dipoles[s, 0]
+            ry = y - dipoles[s, 1]
+            rz = z - dipoles[s, 2]
+            mx = dipoles[s, 3]
+            my = dipoles[s, 4]
+            mz = dipoles[s, 5]
+            r2 = rx*rx + ry*ry + rz*rz
+            r5 = r2*r2*np.sqrt(r2)
+            dot = 3*(mx*rx + my*ry + mz*rz)
+            bx += (dot*rx - mx*r2)/r5
+            by += (dot*ry - my*r2)/r5
+            bz += (dot*rz - mz*r2)/r5
+        for s in range(lines.shape[0]):
+            ux = lines[s, 3]
+            uy = lines[s, 4]
+            mx = lines[s, 5]
+            my = lines[s, 6]
+            mz = lines[s, 7]
+            rx = x - lines[s, 0]
+            ry = y - lines[s, 1]
+            rz = z - lines[s, 2]
+            r_along = rx*ux + ry*uy
+            rx -= r_along*ux
+            ry -= r_along*uy
+            r2 = rx*rx + ry*ry + rz*rz
+            dot = 2*(mx*rx + my*ry + mz*rz)
+            bx += 2*(dot*rx - mx*r2)/(r2*r2)
+            by += 2*(dot*ry - my*r2)/(r2*r2)
+            bz += 2*(dot*rz - mz*r2)/(r2*r2)
+        for s in range(prisms.shape[0]):
+            vxx = vxy = vxz = vyy = vyz = vzz = 0.
+            for k in range(2):
+                zk = prisms[s, 5 - k] - z
+                for j in range(2):
+                    yj = prisms[s, 3 - j] - y
+                    for i in range(2):
+                        xi = prisms[s, 1 - i] - x
+                        sign = 1. if (i + j + k) % 2 == 0 else -1.
+                        r = np.sqrt(xi*xi + yj*yj + zk*zk)
+                        vxx -= sign*np.arctan2(zk*yj, xi*r)
+                        vyy -= sign*np.arctan2(zk*xi, yj*r)
+                        vzz -= sign*np.arctan2(xi*yj, zk*r)
+                        if zk + r != 0:
+                            vxy += sign*np.log(zk + r)
+                        if yj + r != 0:
+                            vxz += sign*np.log(yj + r)
+                        if xi + r != 0:
+                            vyz += sign*np.log(xi + r)
+            mx = prisms[s, 6]
+            my = prisms[s, 7]
+            mz = prisms[s, 8]
+            bx += vxx*mx + vxy*my + vxz*mz
+            by += vxy*mx + vyy*my + vyz*mz
+            bz += vxz*mx + vyz*my + vzz*mz
+        return CM*T2NT*(fx*bx + fy*by + fz*bz)
+
+    @numba.njit(parallel=True, cache=True)
+    def _points_tfa_jit(x, y, z, fx, fy, fz, dipoles, lines, prisms, tfa):
+
+        """
+        Compiled total-field anomaly at scattered points: one parallel loop over the points.
+        """
+
+        for p in numba.prange(x.shape[0]):
+            tfa[p] = _point_tfa(x[p], y[p], z[p], fx, fy, fz, dipoles, lines, prisms)
+
+    @numba.njit(parallel=True, cache=True)
+    def _grid_tfa_jit(xaxis, yaxis, z, fx, fy, fz, dipoles, lines, prisms, tfa):
+
+        """
+        Compiled total-field anomaly on a regular grid: one parallel loop over the rows, with the coordinates read
+        from the grid axes.
+        """
+
+        for i in numba.prange(xaxis.shape[0]):
+            for j in range(yaxis.shape[0]):
+                tfa[i, j] = _point_tfa(xaxis[i], yaxis[j], z[i, j], fx, fy, fz, dipoles, lines, prisms)
+
+
+
+
+def total_field_anomaly(x, y, z, inc=INC, dec=DEC, dipoles=None, lines=None, prisms=None, chunk=2 ** 20,
+                        backend='auto'):
+
+    """
+    Computes the total-field anomaly of the sources at scattered observation points.
+
+    Parameters:
+
+    * x, y, z: 1D-array
+        coordinates of the observation points (z positive down) - z can be a constant
+    * inc, dec: float
+        geomagnetic inclination and declination (degrees)
+    * dipoles, lines, prisms: 2D-array
+        sources, one row per source (see the module documentation) - None for no source of the type
+    * chunk: integer
+        largest number of (point, source) pairs computed at a time by the 'numpy' backend
+    * backend: string
+        'numpy' - array-based chunks of points,
+        'jit' - compiled parallel loop (requires numba),
+        'auto' - 'jit' if numba is installed, otherwise 'numpy'
+
+    Returns:
+
+    * tfa: 1D-array
+        total-field anomaly (nT)
+    """
+
+    x = np.ravel(x)
+    y = np.ravel(y)
+    z = np.ravel(z) if np.ndim(z) else np.full(x.shape, float(z))
+
+    tables = source_tables(dipoles, lines, prisms, inc, dec)
+    fx, fy, fz = direction_cosines(inc, dec)
+    backend = _backend(backend)
+
+    if backend == 'jit':
+        tfa = np.empty(x.size)
+        _points_tfa_jit(np.asarray(x, dtype=float), np.asarray(y, dtype=float), np.asarray(z, dtype=float),
+                        fx, fy, fz, tables[0], tables[1], tables[2], tfa)
+        return tfa
+
+    tfa = np.zeros(x.size)
+
+    for table, field in zip(tables, (_dipoles_field, _lines_field, _prisms_field)):
+        if len(table) == 0:
+            continue
+        step = max(1, chunk // len(table))
+        for start in range(0, x.size, step):
+            stop = min(start + step, x.size)
+            bx, by, bz = field(x[start:stop], y[start:stop], z[start:stop], table)
+            tfa[start:stop] += np.sum(fx * bx + fy * by + fz * bz, axis=1)
+
+    return tfa
+
+
+
+
+def anomaly_grid(geometry, inc=INC, dec=DEC, dipoles=None, lines=None, prisms=None, chunk=2 ** 20, workers=None,
+                 backend='auto'):
+
+    """
+    Computes the total-field anomaly of the sources on a regular grid. The coordinates of the grid points are read
+    from the grid axes: the compiled backend runs a parallel loop over the rows and the array-based backend computes
+    blocks of rows in a pool of threads.
+
+    Parameters:
+
+    * geometry: GridGeometry
+        origin, spacing, shape and height of the grid
+    * inc, dec: float
+        geomagnetic inclination and declination (degrees)
+    * dipoles, lines, prisms: 2D-array
+        sources (see "total_field_anomaly")
+    * chunk: integer
+        largest number of (point, source) pairs computed at a time by the 'numpy' backend
+    * workers: integer
+        number of threads of the 'numpy' backend - None uses the number of processors
+    * backend: string
+        'numpy', 'jit' or 'auto' (see "total_field_anomaly")
+
+    Returns:
+
+    * tfa: 1D-array
+        total-field anomaly (nT) in the order of the input data (x varies along the rows)
+    """
+
+    nx, ny = geometry.shape
+    xaxis = geometry.x
+    yaxis = geometry.y
+    tfa = np.empty((nx, ny))
+
+    if _backend(backend) == 'jit':
+        tables = source_tables(dipoles, lines, prisms, inc, dec)
+        fx, fy, fz = direction_cosines(inc, dec)
+        _grid_tfa_jit(xaxis, yaxis, geometry.coordinates()[2], fx, fy, fz, tables[0], tables[1], tables[2], tfa)
+        return tfa.ravel()
+
+    sources = sum(len(s) for s in (dipoles, lines, prisms) if s is not None)
+    rows = max(1, chunk // max(sources, 1) // ny)
+
+    def block(r0):
+        r1 = min(r0 + rows, nx)
+        x = np.repeat(xaxis[r0:r1], ny)
+        y = np.tile(yaxis, r1 - r0)
+        if np.ndim(geometry.height):
+            z = np.ravel(geometry.height[r0:r1])
+        else:
+            z = geometry.height
+        tfa[r0:r1] = total_field_anomaly(x, y, z, inc, dec, dipoles, lines, prisms, chunk,
+                                         'numpy').reshape(r1 - r0, ny)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(block, range(0, nx, rows)))
+
+    return tfa.ravel()
+
+
+
+
+def _backend(backend):
+
+    """
+    Resolves the 'auto' backend and checks that the compiled backend is available.
+    """
+
+    if backend == 'auto':
+        return 'numpy' if numba is None else 'jit'
+    if backend == 'jit' and numba is None:
+        raise ImportError("the 'jit' backend requires numba")
+    if backend not in ('numpy', 'jit'):
+        raise ValueError("unknown backend '%s'" % backend)
+
+    return backend
+
+
+
+
+def add_noise(data, percent, seed=None):
+
+    """
+    Adds pseudorandom Gaussian noise with a standard deviation equal to a percentage of the largest absolute value of
+    the data.
+
+    Parameters:
+
+    * data: 1D-array
+        noise-free data
+    * percent: float
+        standard deviation of the noise (% of the largest absolute value)
+    * seed: integer
+        seed of the random generator - the same seed gives the same noise
+
+    Returns:
+
+    * noisy: 1D-array
+        data with noise
+    """
+
+    rng = np.random.RandomState(seed)
+    sigma = percent / 100.0 * np.max(np.abs(data))
+
+    return data + rng.normal(0.0, sigma, np.shape(data))
+
+
+
+
+def random_sources(area, dipoles=0, lines=0, prisms=0, depths=(100, 1000), seed=None):
+
+    """
+    Draws sources at random positions inside an area, with induced magnetization.
+
+    Parameters:
+
+    * area: tuple = (x1, x2, y1, y2)
+        mesh boundaries
+    * dipoles, lines, prisms: integer
+        number of sources of each type
+    * depths: tuple
+        smallest and largest depth of the sources (top of the prisms) (m)
+    * seed: integer
+        seed of the random generator
+
+    Returns:
+
+    * sources: dictionary
+        'dipoles', 'lines' and 'prisms' arrays (see the module documentation)
+    """
+
+    rng = np.random.RandomState(seed)
+    x1, x2, y1, y2 = area
+    size = min(x2 - x1, y2 - y1)
+
+    def positions(n):
+        return rng.uniform(x1, x2, n), rng.uniform(y1, y2, n), rng.uniform(depths[0], depths[1], n)
+
+    x, y, z = positions(dipoles)
+    dipole_sources = np.column_stack([x, y, z, rng.uniform(1e6, 1e7, dipoles) * (z / depths[0]) ** 3])
+
+    x, y, z = positions(lines)
+    line_sources = np.column_stack([x, y, z, rng.uniform(0, 180, lines),
+                                    rng.uniform(1e4, 1e5, lines) * (z / depths[0]) ** 2])
+
+    x, y, z = positions(prisms)
+    half = rng.uniform(0.01, 0.05, (prisms, 2)) * size
+    prism_sources = np.column_stack([x - half[:, 0], x + half[:, 0], y - half[:, 1], y + half[:, 1], z,
+                                     z + rng.uniform(0.2, 1.0, prisms) * (depths[1] - depths[0]),
+                                     rng.uniform(1.0, 10.0, prisms)])
+
+    return {'dipoles': dipole_sources, 'lines': line_sources, 'prisms': prism_sources}
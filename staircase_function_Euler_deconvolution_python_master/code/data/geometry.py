@@ -0,0 +1,146 @@
+"""
+Grid geometry
+
+A Python module with a compact descriptor of a regular grid (origin, spacing, shape and observation height) that
+replaces the full x-, y- and z-coordinate arrays in "filtering.py" and "euler.py". The coordinate axes are 1D-arrays
+and the coordinate grids are broadcast views of them, so the coordinates of a moving data window are read from its
+indexes and no coordinate mesh is stored in memory.
+
+Usage:
+
+    geometry = GridGeometry((0, 0), (100, 100), (200, 200), height=-100)
+    dx, dy, dz = regularized_derivative(geometry.x, geometry.y, tfa, geometry.shape, alpha)
+    estimates = euler_estimates_geometry(tfa, geometry, SI, winsize)
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import numpy as np
+
+
+
+
+class GridGeometry(object):
+
+    """
+    Regular grid described by its origin, spacing, shape and observation height. As in the input data, the
+    x-coordinate varies along the rows (first axis) and the y-coordinate along the columns (second axis).
+
+    Parameters:
+
+    * origin: tuple = (x0, y0)
+        coordinates of the first data point
+    * spacing: tuple = (dx, dy)
+        grid spacing in x- and y-directions
+    * shape: tuple = (nx, ny)
+        data points number in each direction
+    * height: float or 2D-array
+        z-coordinate of the observations - constant or gridded
+    """
+
+    __slots__ = ('origin', 'spacing', 'shape', 'height')
+
+    def __init__(self, origin, spacing, shape, height=0.0):
+
+        self.origin = (float(origin[0]), float(origin[1]))
+        self.spacing = (float(spacing[0]), float(spacing[1]))
+        self.shape = (int(shape[0]), int(shape[1]))
+        if np.ndim(height) == 0:
+            self.height = float(height)
+        else:
+            self.height = np.asarray(height, dtype=float).reshape(self.shape)
+
+    @classmethod
+    def from_area(cls, area, shape, height=0.0):
+
+        """
+        Builds the descriptor from the mesh boundaries.
+
+        Parameters:
+
+        * area: tuple = (x1, x2, y1, y2)
+            mesh boundaries
+        * shape: tuple = (nx, ny)
+            data points number in each direction
+        * height: float or 2D-array
+            z-coordinate of the observations
+        """
+
+        nx, ny = shape
+        spacing = ((area[1] - area[0]) / (nx - 1), (area[3] - area[2]) / (ny - 1))
+
+        return cls((area[0], area[2]), spacing, shape, height)
+
+    @classmethod
+    def from_coordinates(cls, x, y, z, shape):
+
+        """
+        Builds the descriptor from coordinate arrays, keeping the height as a constant when it does not vary.
+
+        Parameters:
+
+        * x, y, z: 1D-array
+            coordinates mesh in x-, y- and z-directions
+        * shape: tuple = (nx, ny)
+            data points number in each direction
+        """
+
+        height = z[0] if np.all(z == z[0]) else np.reshape(z, shape)
+
+        return cls.from_area((x.min(), x.max(), y.min(), y.max()), shape, height)
+
+    @property
+    def area(self):
+
+        """
+        Mesh boundaries (x1, x2, y1, y2).
+        """
+
+        return (self.origin[0], self.origin[0] + (self.shape[0] - 1) * self.spacing[0],
+                self.origin[1], self.origin[1] + (self.shape[1] - 1) * self.spacing[1])
+
+    @property
+    def x(self):
+
+        """
+        Coordinate axis in x-direction (1D-array of nx points).
+        """
+
+        return self.origin[0] + self.spacing[0] * np.arange(self.shape[0])
+
+    @property
+    def y(self):
+
+        """
+        Coordinate axis in y-direction (1D-array of ny points).
+        """
+
+        return self.origin[1] + self.spacing[1] * np.arange(self.shape[1])
+
+    def coordinates(self):
+
+        """
+        Returns the coordinate grids as read-only broadcast views of the axes (no memory is used by the meshes).
+
+        Returns:
+
+        * xi, yi, zi: 2D-array
+            grid of coordinates in x-, y- and z-directions
+        """
+
+        xi = np.broadcast_to(self.x[:, None], self.shape)
+        yi = np.broadcast_to(self.y[None, :], self.shape)
+        zi = np.broadcast_to(self.height, self.shape)
+
+        return xi, yi, zi
+
+    def key(self):
+
+        """
+        Returns the items that identify the geometry in a cache key (see "content_key" in "cache.py").
+        """
+
+        height = self.height if np.ndim(self.height) else float(self.height)
+
+        return ('geometry', self.origin, self.spacing, self.shape, height)
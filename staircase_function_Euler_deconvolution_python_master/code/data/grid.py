@@ -0,0 +1,253 @@
+"""
+Grid object
+
+A Python module with a class that holds a gridded data set with its geometry (coordinates, shape and area) and computes
+the derived products of "filtering.py" and "euler.py" (derivatives, analytical signal amplitude, tilt derivative,
+S-function and Euler solution stores) only when they are first requested. Each product is kept in the object, so it is
+computed at most once per session; assigning new data, or calling "invalidate", discards the stored products.
+
+Usage:
+
+    grid = Grid(x, y, tfa, shape, z, area)
+    dx, dy, dz = grid.derivatives(alpha=10**alpha_grid)
+    asa, tdr = grid.attributes(alpha=10**alpha_grid)
+    norm_sol_dx, norm_sol_dy, norm_sol_dz = grid.s_function(alpha_test)
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import numpy as np
+from cache import content_key
+from filtering import asa_tdr, grid_spacing, nonregularized_derivative, regularized_derivatives, s_function_derivative
+from euler import euler_estimates, euler_windows
+
+
+
+
+class Grid(object):
+
+    """
+    Gridded data set with lazily computed and memoized derived products.
+
+    Parameters:
+
+    * x, y: 1D-array
+        coordinates mesh in x- and y-directions
+    * data: 1D-array
+        input data set
+    * shape: tuple = (nx, ny)
+        data points number in each direction
+    * z: 1D-array
+        coordinates mesh in z-direction - required only by the Euler deconvolution
+    * area: tuple = (x1, x2, y1, y2)
+        mesh boundaries - None takes the limits of the coordinates
+    """
+
+    __slots__ = ('x', 'y', 'z', 'shape', 'area', '_data', '_memo')
+
+    def __init__(self, x, y, data, shape, z=None, area=None):
+
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.z = None if z is None else np.asarray(z)
+        self.shape = tuple(shape)
+        if area is None:
+            area = (self.x.min(), self.x.max(), self.y.min(), self.y.max())
+        self.area = tuple(area)
+        self._data = np.ravel(data)
+        self._memo = {}
+
+    @property
+    def data(self):
+
+        """
+        Input data set (1D-array). Assigning new data discards all the stored products.
+        """
+
+        return self._data
+
+    @data.setter
+    def data(self, data):
+
+        self._data = np.ravel(data)
+        self._memo.clear()
+
+    def invalidate(self, *names):
+
+        """
+        Discards stored products.
+
+        Parameters:
+
+        * names: strings
+            products to discard - 'spacing', 'derivatives', 'attributes', 's_function' or 'euler' - all of them when
+            no name is given
+        """
+
+        if not names:
+            self._memo.clear()
+            return
+
+        for key in [key for key in self._memo if key[0] in names]:
+            del self._memo[key]
+
+    def _memoized(self, key, function, *args, **kwargs):
+
+        """
+        Returns the stored product or computes and stores it.
+        """
+
+        if key not in self._memo:
+            self._memo[key] = function(*args, **kwargs)
+
+        return self._memo[key]
+
+    @property
+    def matrix(self):
+
+        """
+        Input data set as a 2D-array with the grid shape.
+        """
+
+        return self._data.reshape(self.shape)
+
+    @property
+    def spacing(self):
+
+        """
+        Grid spacing (dx, dy) in x- and y-directions.
+        """
+
+        return self._memoized(('spacing',), grid_spacing, self.x, self.y, self.shape)
+
+    def derivatives(self, alpha=None, order=1):
+
+        """
+        Returns the directional derivatives.
+
+        Parameters:
+
+        * alpha: float
+            regularization parameter - None for the non-regularized derivatives
+        * order: integer
+            derivative order
+
+        Returns:
+
+        * dx, dy, dz: 1D-array
+            derivatives in x-, y- and z-directions
+        """
+
+        key = ('derivatives', alpha, order)
+
+        if key not in self._memo:
+            if alpha is None:
+                self._memo[key] = nonregularized_derivative(self.x, self.y, self._data, self.shape, order)
+            else:
+                derivatives = regularized_derivatives(self.x, self.y, self._data, self.shape, alpha, orders=(order,))
+                self._memo[key] = tuple(derivatives[direction, order] for direction in ('x', 'y', 'z'))
+
+        return self._memo[key]
+
+    def attributes(self, alpha=None):
+
+        """
+        Returns the analytical signal amplitude and tilt derivative (see "asa_tdr").
+
+        Parameters:
+
+        * alpha: float
+            regularization parameter - None for the non-regularized derivatives
+
+        Returns:
+
+        * asa: 1D-array
+            analytical signal amplitude
+        * tdr: 1D-array
+            tilt derivative
+        """
+
+        return self._memoized(('attributes', alpha), lambda: asa_tdr(*self.derivatives(alpha)))
+
+    @property
+    def asa(self):
+
+        """
+        Non-regularized analytical signal amplitude.
+        """
+
+        return self.attributes()[0]
+
+    @property
+    def tdr(self):
+
+        """
+        Non-regularized tilt derivative.
+        """
+
+        return self.attributes()[1]
+
+    def s_function(self, alpha_test, order=1):
+
+        """
+        Returns the S-function of the directional derivatives (see "s_function_derivative").
+
+        Parameters:
+
+        * alpha_test: 1D-array
+            trial regularization parameters
+        * order: integer
+            derivative order
+
+        Returns:
+
+        * norm_sol_dx, norm_sol_dy, norm_sol_dz: 1D-array
+            normalized Euclidean norm of the x-, y- and z-derivatives
+        """
+
+        alpha_test = np.asarray(alpha_test)
+        key = ('s_function', content_key(alpha_test), order)
+
+        return self._memoized(key, s_function_derivative, self.x, self.y, self._data, self.shape, alpha_test, order)
+
+    def euler(self, SI, windowSize, alpha=None, backend='numpy'):
+
+        """
+        Returns the Euler solution store (see "euler_estimates" in "euler.py"), computed from the stored derivatives
+        (see "derivatives"). A percentage of the solutions is kept by "select_solutions" in "euler.py".
+
+        Parameters:
+
+        * SI: integer
+            structural index - 0, 1, 2 or 3
+        * windowSize: integer
+            size of the moving data window
+        * alpha: float
+            regularization parameter - None for the non-regularized derivatives
+        * backend: string
+            window solver - 'numpy', 'jit' or 'auto'
+
+        Returns:
+
+        * estx, esty, estz, estb, stdzmat: 2D-array
+            estimates at each window center
+        """
+
+        if self.z is None:
+            raise ValueError('the Euler deconvolution requires the z-coordinates of the grid')
+
+        key = ('euler', SI, windowSize, alpha, backend)
+
+        if key not in self._memo:
+            if np.isnan(self._data).any():
+                # The gaps are filled before the derivatives are computed (see "euler_estimates")
+                self._memo[key] = euler_estimates(self._data, self.x, self.y, self.z, self.shape, self.area, SI,
+                                                  windowSize, alpha, backend)
+            else:
+                dx, dy, dz = (derivative.reshape(self.shape) for derivative in self.derivatives(alpha))
+                self._memo[key] = euler_windows(self.matrix, dx, dy, dz, self.x.reshape(self.shape),
+                                                self.y.reshape(self.shape), self.z.reshape(self.shape), SI, windowSize,
+                                                backend)
+
+        return self._memo[key]
@@ -0,0 +1,741 @@
+"""
+Job service
+
+A Python program that keeps a pool of worker processes running and processes the jobs of many survey blocks without
+starting a new interpreter for each one. The grids are loaded once: their values and coordinates are copied into
+shared memory blocks (see "parallel_figures.py") that the workers read in place, and the jobs only refer to them by
+name. The wavenumbers and the first-order vertical derivative operator of each grid geometry are also kept in shared
+memory and placed in the operator bank of the workers (see "operators.py"), which derive the regularized operators
+from them and keep them for the next jobs.
+
+Jobs:
+
+- "derivatives": first-order derivatives of "deriv" or "regularized_deriv" in "euler.py" (alpha=None or a value);
+- "euler_deconv": solutions of "euler_deconv" or "euler_deconv_regularized" in "euler.py" (SI, windowSize, filt and
+  alpha);
+- "s_function": normalized norms of the derivatives of "s_function_derivative" in "filtering.py" (alpha_test, order),
+  with the grid spacing of the limits of the coordinates, as in "filtering.py".
+
+The waiting jobs of grids of the same shape and mesh boundaries and with the same regularization parameters are sent
+together to a worker, which computes the Fourier transforms of their grids with one transform of the stack (see
+"batch_derivatives" in "montecarlo.py"), so many small jobs run close to the speed of the computations. A job of a
+grid with gaps (NaN) uses the grid filled by "fill_gaps" in "euler.py", and its Euler solutions use only the windows
+without gaps.
+
+The workers are new interpreters (the "spawn" start method), which import the main module of the program that starts
+the service: as in any program that uses "multiprocessing" this way, the service must be started under
+"if __name__ == '__main__':".
+
+Usage (in a program):
+
+    if __name__ == '__main__':
+        with JobService(workers=4) as service:
+            service.load_grid('block1', tfa, x, y, z, shape, area)
+            job = service.submit('euler_deconv', 'block1', SI=1, windowSize=6, filt=0.035, alpha=1e5)
+            solutions = service.result(job)
+
+Usage (service and local clients):
+
+    python job_service.py authkey
+    python job_service.py serve --workers 4 --address 127.0.0.1:50000
+
+    service = connect(('127.0.0.1', 50000))
+    service.load_grid('block1', tfa, x, y, z, shape, area)
+    norms = service.result(service.submit('s_function', 'block1', alpha_test=alpha_test))
+
+The service accepts connections with the authentication key only. As the requests are Python objects (pickle), a
+client with the key can run any code in the service, so the key is random and private to the user: "authkey" creates
+it in the file "~/.euler_jobs_authkey", readable only by the user, and the service and the clients read it from the
+environment variable EULER_JOBS_AUTHKEY or from this file (see "read_authkey"). The service does not start without a
+key, and it listens on a loopback address only, unless "allow_remote" is set.
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import argparse
+import ipaddress
+import itertools
+import multiprocessing
+import os
+import secrets
+import signal
+import socket
+import stat
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.managers import BaseManager
+
+import numpy as np
+from cache import content_key
+from euler import euler_windows, fill_gaps, select_solutions
+from montecarlo import batch_derivatives, batch_spectrum
+from operators import default_bank
+from parallel_figures import SharedArrays, attach_arrays, release_arrays
+
+
+ADDRESS = ('127.0.0.1', 50000)
+
+# Environment variable and file of the authentication key (see "read_authkey")
+AUTHKEY_VARIABLE = 'EULER_JOBS_AUTHKEY'
+AUTHKEY_FILE = os.path.join(os.path.expanduser('~'), '.euler_jobs_authkey')
+
+# Required parameters and default values of the optional parameters of each job type
+JOB_TYPES = {
+    'derivatives': ((), {'alpha': None}),
+    'euler_deconv': (('SI', 'windowSize', 'filt'), {'alpha': None}),
+    's_function': (('alpha_test',), {'order': 1}),
+}
+
+# Operators of the geometries placed in the operator bank of a worker (see "_place_operators")
+_placed = {'blocks': {}, 'geometries': set()}
+
+
+
+
+def grid_geometry(shape, area):
+
+    """
+    Returns the padded shape and the grid spacing of a grid, as computed by "batch_derivatives" in "montecarlo.py".
+    """
+
+    nx, ny = shape
+    n_points = int(2 ** (np.ceil(np.log(max(nx, ny)) / np.log(2))))
+    xa, xb, ya, yb = area
+
+    return (n_points, n_points), (xb - xa) / (nx - 1), (yb - ya) / (ny - 1)
+
+
+
+
+def _place_operators(operators):
+
+    """
+    Places the wavenumbers and the vertical derivative operator of a geometry, read from shared memory, in the
+    operator bank of the worker. The blocks stay attached for the next jobs.
+    """
+
+    padshape, dx, dy = operators['geometry']
+    if operators['geometry'] in _placed['geometries']:
+        return
+    kx, ky, kz = attach_arrays(operators['arrays'], _placed['blocks'])
+    default_bank.cache.put(content_key('wavenumbers', padshape, float(dx), float(dy)), (kx, ky), shared=True)
+    default_bank.cache.put(content_key('derivative', padshape, float(dx), float(dy), 'z', 1, None), kz, shared=True)
+    _placed['geometries'].add(operators['geometry'])
+
+
+
+
+def _s_functions(batch, area, alpha_test, order):
+
+    """
+    Normalized norms of the derivatives of a stack of grids for the trial regularization parameters (see
+    "s_function_derivative" in "filtering.py"), with one Fourier transform of the stack for all the parameters.
+    """
+
+    n, nx, ny = batch.shape
+    spectra, padx, pady = batch_spectrum(batch)
+    padshape, dx, dy = grid_geometry((nx, ny), area)
+    norms = np.zeros((3, n, len(alpha_test)))
+
+    for i, alpha in enumerate(alpha_test):
+        for d, direction in enumerate(('x', 'y', 'z')):
+            gamma = default_bank.derivative(padshape, dx, dy, direction, order, alpha)
+            derivative = np.real(np.fft.ifft2(spectra * gamma))
+            for k in range(n):
+                norms[d, k, i] = np.linalg.norm(np.ravel(derivative[k, padx:padx + nx, pady:pady + ny]))
+
+    return [tuple(norm / max(norm) for norm in norms[:, k]) for k in range(n)]
+
+
+
+
+def _run_batch(key, operators, jobs, backend):
+
+    """
+    Runs a batch of jobs of the same type, geometry and regularization parameters in a worker.
+
+    Returns:
+
+    * outcomes: list of tuples = (True, result) or (False, exception)
+        one for each job
+    """
+
+    blocks = {}
+    _place_operators(operators)
+    area = key[2]
+    outcomes = []
+
+    try:
+        grids = [attach_arrays(arrays, blocks) for arrays, params in jobs]
+        batch = np.stack([grid['data'] for grid in grids])
+
+        if key[0] == 's_function':
+            outcomes = [(True, norms) for norms in _s_functions(batch, area, key[3], key[4])]
+        else:
+            derivx, derivy, derivz = batch_derivatives(batch, area, key[3])
+            for k, (grid, (arrays, params)) in enumerate(zip(grids, jobs)):
+                try:
+                    if params['type'] == 'derivatives':
+                        outcomes.append((True, (derivx[k], derivy[k], derivz[k])))
+                    else:
+                        estimates = euler_windows(grid['data'], derivx[k], derivy[k], derivz[k], grid['xi'],
+                                                  grid['yi'], grid['zi'], params['SI'], params['windowSize'],
+                                                  backend, grid['mask'])
+                        outcomes.append((True, select_solutions(*(estimates + (params['windowSize'],
+                                                                               params['filt'])))))
+                except Exception as error:
+                    outcomes.append((False, error))
+    finally:
+        # the arrays that read the blocks are deleted before the blocks are closed
+        grids = grid = batch = None
+        release_arrays(blocks)
+
+    return outcomes
+
+
+
+
+class JobService(object):
+
+    """
+    Queue of jobs processed by a pool of worker processes kept running.
+
+    Parameters:
+
+    * workers: integer
+        number of processes - None for the number of processors
+    * max_batch: integer
+        largest number of jobs sent together to a worker
+    * backend: string
+        window solver of the Euler deconvolution - 'numpy', 'jit' or 'auto' (see "solve_windows" in "euler.py")
+    """
+
+    def __init__(self, workers=None, max_batch=16, backend='numpy'):
+
+        self.workers = workers or multiprocessing.cpu_count()
+        self.max_batch = max_batch
+        self.backend = backend
+        self._grids = {}
+        self._operators = {}
+        self._jobs = {}
+        self._pending = []
+        self._running = 0
+        self._ids = itertools.count(1)
+        self._counts = {'submitted': 0, 'completed': 0, 'failed': 0, 'batches': 0}
+        self._condition = threading.Condition()
+        self._pool = None
+        self._dispatcher = None
+        self._closed = False
+
+    def __enter__(self):
+
+        return self.start()
+
+    def __exit__(self, *exc):
+
+        self.close()
+
+        return False
+
+    def start(self):
+
+        """
+        Starts the worker processes and the thread that sends the batches to them.
+        """
+
+        if self._pool is None:
+            # new interpreters - a process that forks after the parallel Euler solver ran (TBB threads of numba)
+            # hangs at exit
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            # the workers are started and import the modules now, not with the first batch
+            for future in [self._pool.submit(os.getpid) for worker in range(self.workers)]:
+                future.result()
+            self._dispatcher = threading.Thread(target=self._dispatch, name='job-dispatcher')
+            self._dispatcher.daemon = True
+            self._dispatcher.start()
+
+        return self
+
+    def close(self):
+
+        """
+        Waits for the running batches, cancels the waiting jobs, stops the workers and removes the shared memory.
+        """
+
+        with self._condition:
+            self._closed = True
+            for job in self._pending:
+                self._jobs[job]['future'].set_exception(RuntimeError('the job service is closed'))
+            self._pending = []
+            self._condition.notify_all()
+        if self._pool is not None:
+            self._dispatcher.join()
+            self._pool.shutdown(wait=True)
+        for grid in self._grids.values():
+            grid['shared'].__exit__()
+        for operators in self._operators.values():
+            operators['shared'].__exit__()
+        self._grids.clear()
+        self._operators.clear()
+
+    def load_grid(self, name, data, xi, yi, zi, shape, area=None):
+
+        """
+        Copies a grid into shared memory.
+
+        Parameters:
+
+        * name: string
+            name of the grid in the jobs
+        * data: 1D- or 2D-array
+            input data set - gaps as NaN
+        * xi, yi, zi: 1D- or 2D-array
+            coordinates in x-, y- and z-directions
+        * shape: tuple = (nx, ny)
+            data points number in each direction
+        * area: tuple = (x1, x2, y1, y2)
+            mesh boundaries - None for the limits of the coordinates
+
+        Returns:
+
+        * name: string
+            name of the grid
+        """
+
+        shape = tuple(int(n) for n in shape)
+        data = np.asarray(data, dtype=float).reshape(shape)
+        xi, yi, zi = (np.asarray(coordinate, dtype=float).reshape(shape) for coordinate in (xi, yi, zi))
+        if area is None:
+            area = (xi.min(), xi.max(), yi.min(), yi.max())
+        area = tuple(float(limit) for limit in area)
+        limits = (float(xi.min()), float(xi.max()), float(yi.min()), float(yi.max()))
+        mask = None
+        if np.isnan(data).any():
+            data, mask = fill_gaps(data)
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('the job service is closed')
+            if name in self._grids:
+                raise ValueError("a grid named '%s' is already loaded" % name)
+            shared = SharedArrays()
+            arrays = shared.describe({'data': data, 'mask': mask, 'xi': xi, 'yi': yi, 'zi': zi})
+            # geometries of the derivatives of "euler.py" (mesh boundaries) and "filtering.py" (coordinates)
+            for boundaries in (area, limits):
+                geometry = grid_geometry(shape, boundaries)
+                if geometry not in self._operators:
+                    padshape, dx, dy = geometry
+                    kx, ky = default_bank.wavenumbers(padshape, dx, dy)
+                    kz = default_bank.derivative(padshape, dx, dy, 'z')
+                    operators = SharedArrays()
+                    self._operators[geometry] = {'shared': operators, 'geometry': geometry,
+                                                 'arrays': operators.describe((kx, ky, kz))}
+            self._grids[name] = {'shared': shared, 'arrays': arrays, 'shape': shape, 'area': area, 'limits': limits}
+
+        return name
+
+    def unload_grid(self, name):
+
+        """
+        Removes a grid from shared memory (the operators of its geometry are kept for the next grids).
+        """
+
+        with self._condition:
+            self._grid(name)
+            if any(record['grid'] == name for record in self._jobs.values() if not record['future'].done()):
+                raise ValueError("the grid '%s' has jobs waiting or running" % name)
+            self._grids.pop(name)['shared'].__exit__()
+
+    def grids(self):
+
+        """
+        Returns the names of the loaded grids.
+        """
+
+        with self._condition:
+            return sorted(self._grids)
+
+    def _grid(self, name):
+
+        if name not in self._grids:
+            raise KeyError("no grid named '%s' is loaded" % name)
+
+        return self._grids[name]
+
+    def submit(self, job_type, grid, **params):
+
+        """
+        Adds a job to the queue.
+
+        Parameters:
+
+        * job_type: string
+            'derivatives', 'euler_deconv' or 's_function'
+        * grid: string
+            name of a loaded grid
+        * params: keyword arguments
+            parameters of the job type - SI, windowSize, filt and alpha of 'euler_deconv', alpha of 'derivatives',
+            alpha_test and order of 's_function'
+
+        Returns:
+
+        * job: integer
+            job number (see "status" and "result")
+        """
+
+        if job_type not in JOB_TYPES:
+            raise ValueError("unknown job type '%s' - %s" % (job_type, ', '.join(sorted(JOB_TYPES))))
+        required, defaults = JOB_TYPES[job_type]
+        unknown = set(params) - set(required) - set(defaults)
+        missing = [name for name in required if params.get(name) is None]
+        if unknown or missing:
+            raise TypeError("job '%s': unknown parameters %s, missing parameters %s" %
+                            (job_type, sorted(unknown), missing))
+        params = dict(defaults, **params)
+        params['type'] = job_type
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('the job service is closed')
+            record = self._grid(grid)
+            if job_type == 's_function':
+                alpha_test = tuple(float(alpha) for alpha in np.ravel(params['alpha_test']))
+                key = ('s_function', record['shape'], record['limits'], alpha_test, params['order'])
+                params['alpha_test'] = alpha_test
+            else:
+                alpha = params['alpha']
+                key = ('fft', record['shape'], record['area'], None if alpha is None else float(alpha))
+            job = next(self._ids)
+            self._jobs[job] = {'grid': grid, 'params': params, 'key': key, 'future': Future()}
+            self._pending.append(job)
+            self._counts['submitted'] += 1
+            self._condition.notify_all()
+
+        return job
+
+    def status(self, job):
+
+        """
+        Returns the state of a job - 'waiting', 'running', 'done' or 'failed'.
+        """
+
+        with self._condition:
+            record = self._jobs[job]
+            future = record['future']
+            if not future.done():
+                return 'waiting' if job in self._pending else 'running'
+
+            return 'failed' if future.exception() is not None else 'done'
+
+    def result(self, job, timeout=None):
+
+        """
+        Waits for a job and returns its result - the job is then removed from the service.
+
+        Parameters:
+
+        * job: integer
+            job number
+        * timeout: float
+            longest wait (s) - None waits until the job is done
+
+        Returns:
+
+        * result: tuple or 2D-array
+            dx, dy, dz (2D-arrays) of "derivatives", the solutions (x, y, depth, base level) of "euler_deconv" or the
+            norms of the x-, y- and z-derivatives (1D-arrays) of "s_function"
+        """
+
+        with self._condition:
+            if job not in self._jobs:
+                raise KeyError('no job %s' % job)
+            future = self._jobs[job]['future']
+        try:
+            return future.result(timeout)
+        finally:
+            if future.done():
+                with self._condition:
+                    self._jobs.pop(job, None)
+
+    def info(self):
+
+        """
+        Returns the number of workers, grids and jobs (waiting, running, completed, failed), the number of batches
+        and the mean number of jobs of a batch.
+        """
+
+        with self._condition:
+            info = dict(self._counts)
+            info.update({'workers': self.workers, 'grids': len(self._grids), 'geometries': len(self._operators),
+                         'waiting': len(self._pending), 'running_batches': self._running})
+            finished = info['completed'] + info['failed']
+            info['jobs_per_batch'] = finished / float(info['batches']) if info['batches'] else 0.0
+
+        return info
+
+    def _next_batch(self):
+
+        """
+        Removes from the queue the oldest job and the next waiting jobs of the same batch key.
+        """
+
+        key = self._jobs[self._pending[0]]['key']
+        batch = [job for job in self._pending if self._jobs[job]['key'] == key][:self.max_batch]
+        chosen = set(batch)
+        self._pending = [job for job in self._pending if job not in chosen]
+
+        return key, batch
+
+    def _dispatch(self):
+
+        """
+        Sends the batches to the workers while fewer batches than workers are running, so the jobs that arrive during
+        the computations are grouped.
+        """
+
+        while True:
+            with self._condition:
+                while not self._closed and (not self._pending or self._running >= self.workers):
+                    self._condition.wait()
+                if self._closed:
+                    return
+                key, batch = self._next_batch()
+                grids = [self._grids[self._jobs[job]['grid']] for job in batch]
+                jobs = [(grid['arrays'], self._jobs[job]['params']) for grid, job in zip(grids, batch)]
+                operators = self._operators[grid_geometry(key[1], key[2])]
+                self._running += 1
+                self._counts['batches'] += 1
+
+            future = self._pool.submit(_run_batch, key, {'geometry': operators['geometry'],
+                                                         'arrays': operators['arrays']}, jobs, self.backend)
+            future.add_done_callback(lambda future, batch=batch: self._finished(batch, future))
+
+    def _finished(self, batch, future):
+
+        """
+        Stores the results of a batch.
+        """
+
+        error = future.exception()
+        outcomes = [(False, error)] * len(batch) if error is not None else future.result()
+
+        with self._condition:
+            for job, (success, value) in zip(batch, outcomes):
+                if success:
+                    self._jobs[job]['future'].set_result(value)
+                    self._counts['completed'] += 1
+                else:
+                    self._jobs[job]['future'].set_exception(value)
+                    self._counts['failed'] += 1
+            self._running -= 1
+            self._condition.notify_all()
+
+
+
+
+class _ServiceManager(BaseManager):
+
+    """
+    Manager that shares a job service with the local clients.
+    """
+
+
+
+
+def create_authkey(path=AUTHKEY_FILE):
+
+    """
+    Creates a random authentication key in a file readable only by the user.
+
+    Parameters:
+
+    * path: string
+        key file - an existing file is not replaced
+
+    Returns:
+
+    * authkey: bytes
+        authentication key
+    """
+
+    authkey = secrets.token_bytes(32).hex().encode()
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, stat.S_IRUSR | stat.S_IWUSR)
+    with os.fdopen(descriptor, 'wb') as key_file:
+        key_file.write(authkey + b'\n')
+
+    return authkey
+
+
+
+
+def read_authkey(path=AUTHKEY_FILE):
+
+    """
+    Reads the authentication key from the environment variable EULER_JOBS_AUTHKEY or, when it is not set, from the key
+    file (see "create_authkey"). The key file must not be readable by other users.
+
+    Parameters:
+
+    * path: string
+        key file
+
+    Returns:
+
+    * authkey: bytes
+        authentication key
+    """
+
+    authkey = os.environ.get(AUTHKEY_VARIABLE, '').strip().encode()
+    if authkey:
+        return authkey
+
+    if not os.path.isfile(path):
+        raise ValueError('no authentication key: set $%s or create the key file %s with "python job_service.py '
+                         'authkey"' % (AUTHKEY_VARIABLE, path))
+    if os.name == 'posix' and os.stat(path).st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise ValueError('the key file %s is readable by other users (chmod 600)' % path)
+    with open(path, 'rb') as key_file:
+        authkey = key_file.read().strip()
+    if not authkey:
+        raise ValueError('the key file %s is empty' % path)
+
+    return authkey
+
+
+
+
+def _is_loopback(host):
+
+    """
+    Checks that a host name or address is a loopback address.
+    """
+
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+
+
+def serve(address=ADDRESS, authkey=None, allow_remote=False, **options):
+
+    """
+    Runs a job service that accepts local clients (see "connect") until the process is interrupted or terminated.
+
+    Parameters:
+
+    * address: tuple = (host, port)
+        address of the service - a loopback address unless "allow_remote" is True
+    * authkey: bytes
+        authentication key of the clients - None reads it with "read_authkey"
+    * allow_remote: boolean
+        True accepts an address reachable from other computers (the clients can run any code in the service)
+    * options: keyword arguments
+        workers, max_batch and backend of "JobService"
+    """
+
+    if authkey is None:
+        authkey = read_authkey()
+    if not authkey:
+        raise ValueError('the job service requires an authentication key')
+    if not allow_remote and not _is_loopback(address[0]):
+        raise ValueError('the address %s is not a loopback address (see "allow_remote")' % address[0])
+
+    service = JobService(**options).start()
+    _ServiceManager.register('service', callable=lambda: service)
+    server = _ServiceManager(address, authkey).get_server()
+    if threading.current_thread() is threading.main_thread():
+        # a terminated service also stops its workers and removes the shared memory
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        server.serve_forever()
+    finally:
+        service.close()
+
+
+
+
+def connect(address=ADDRESS, authkey=None):
+
+    """
+    Connects to a job service started by "serve".
+
+    Parameters:
+
+    * address: tuple = (host, port)
+        address of the service
+    * authkey: bytes
+        authentication key of the service - None reads it with "read_authkey"
+
+    Returns:
+
+    * service: proxy
+        object with the methods of "JobService" - load_grid, unload_grid, grids, submit, status, result and info
+    """
+
+    _ServiceManager.register('service')
+    manager = _ServiceManager(address, read_authkey() if authkey is None else authkey)
+    manager.connect()
+
+    return manager.service()
+
+
+
+
+def _address(text):
+
+    host, port = text.rsplit(':', 1)
+
+    return host, int(port)
+
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Service of derivative, S-function and Euler deconvolution jobs')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    serve_parser = commands.add_parser('serve', help='runs the service')
+    serve_parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    serve_parser.add_argument('--max-batch', type=int, default=16, help='largest number of jobs of a batch')
+    serve_parser.add_argument('--backend', default='numpy', help="window solver - 'numpy', 'jit' or 'auto'")
+    serve_parser.add_argument('--allow-remote', action='store_true',
+                              help='accepts an address that is not a loopback address')
+
+    info_parser = commands.add_parser('info', help='prints the counters of a running service')
+
+    authkey_parser = commands.add_parser('authkey', help='creates a random authentication key for the user')
+
+    for command_parser in (serve_parser, info_parser, authkey_parser):
+        command_parser.add_argument('--authkey-file', default=AUTHKEY_FILE,
+                                    help='key file, used when $%s is not set' % AUTHKEY_VARIABLE)
+    for command_parser in (serve_parser, info_parser):
+        command_parser.add_argument('--address', type=_address, default=ADDRESS, help='host:port of the service')
+
+    arguments = parser.parse_args()
+
+    try:
+        if arguments.command == 'authkey':
+            authkey = create_authkey(arguments.authkey_file)
+        else:
+            authkey = read_authkey(arguments.authkey_file)
+    except (OSError, ValueError) as error:
+        sys.exit('job_service.py: %s' % error)
+
+    if arguments.command == 'authkey':
+        print('authentication key written to %s' % arguments.authkey_file)
+    elif arguments.command == 'serve':
+        if not arguments.allow_remote and not _is_loopback(arguments.address[0]):
+            sys.exit('job_service.py: %s is not a loopback address (use --allow-remote)' % arguments.address[0])
+        print('job service on %s:%d' % arguments.address)
+        serve(arguments.address, authkey, arguments.allow_remote, workers=arguments.workers,
+              max_batch=arguments.max_batch, backend=arguments.backend)
+    else:
+        for name, value in sorted(connect(arguments.address, authkey).info().items()):
+            print('%s: %s' % (name, value))
@@ -0,0 +1,328 @@
+"""
+Monte Carlo depth uncertainty
+
+A Python module that measures the stability of the Euler depth estimates under noise. Pseudorandom noise realisations
+of a noise-free grid are processed in batches: the derivatives of a batch are computed with one stacked Fourier
+transform, the moving data windows of each realisation are solved by the window solver of "euler.py" and the
+solutions kept by the percentage "filt" are accumulated at their window centers. The batches are distributed over a
+pool of processes and only the per-location statistics of the depths (count, mean, standard deviation, minimum and
+maximum) are returned, not the solutions of each realisation. The processes are started with "spawn", so a script
+that calls "depth_statistics" with more than one process needs a main guard.
+
+Realisation "k" adds the noise of "add_noise" in "forward.py" with the seed "seed + k", so its solutions are those of
+"euler_deconv_regularized" on that noisy grid, and the results do not depend on the number of processes.
+
+Usage:
+
+    stats = depth_statistics(true_tfa, x, y, z, shape, area, SI, winsize, filt, alpha=10**alpha_euler083,
+                             percent=1.0, realisations=200, seed=0)
+    unstable = stats['std'] > 10.0
+
+    python montecarlo.py input/nonoise_synthetic_data.dat --percent 1 --realisations 200 --alpha 1e5
+                         --output results/montecarlo_depths.txt
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from euler import solve_windows, window_corners
+from forward import add_noise
+from operators import default_bank
+from profiling import stage
+
+
+# Grid and parameters shared by the realisations of a process (see "_init_worker")
+_shared = {}
+
+
+
+
+def batch_spectrum(batch):
+
+    """
+    Computes the Fourier transforms of a stack of grids padded as in "deriv" in "euler.py" (edge values, up to the next
+    power of two) with one transform of the stack.
+
+    Parameters:
+
+    * batch: 3D-array
+        grids stacked along the first axis - shape (n, nx, ny)
+
+    Returns:
+
+    * spectra: 3D-array
+        Fourier transform of each padded grid
+    * padx, pady: integer
+        number of points padded before the grids in x- and y-directions
+    """
+
+    n, nx, ny = batch.shape
+    n_points = int(2 ** (np.ceil(np.log(max(nx, ny)) / np.log(2))))
+    padx = (n_points - nx) // 2
+    pady = (n_points - ny) // 2
+
+    with stage('montecarlo.pad', batch):
+        padded = np.pad(batch, ((0, 0), (padx, padx), (pady, pady)), 'edge')
+    with stage('montecarlo.fft', padded):
+        spectra = np.fft.fft2(padded)
+
+    return spectra, padx, pady
+
+
+
+
+def batch_derivatives(batch, area, alpha=None):
+
+    """
+    Computes the first-order derivatives of a stack of grids with one Fourier transform of the stack. The padding and
+    operators are those of "deriv" and "regularized_deriv" in "euler.py".
+
+    Parameters:
+
+    * batch: 3D-array
+        grids stacked along the first axis - shape (n, nx, ny)
+    * area: tuple = (x1, x2, y1, y2)
+        mesh boundaries
+    * alpha: float
+        regularization parameter - None for the non-regularized derivatives
+
+    Returns:
+
+    * dx, dy, dz: 3D-array
+        derivatives in x-, y- and z-directions of each grid
+    """
+
+    n, nx, ny = batch.shape
+    spectra, padx, pady = batch_spectrum(batch)
+
+    xa, xb, ya, yb = area
+    dx = (xb - xa) / (nx - 1)
+    dy = (yb - ya) / (ny - 1)
+
+    derivatives = []
+    for direction in ('x', 'y', 'z'):
+        gamma = default_bank.derivative(spectra.shape[1:], dx, dy, direction, 1, alpha)
+        with stage('montecarlo.ifft', spectra):
+            derivative = np.real(np.fft.ifft2(spectra * gamma))
+        derivatives.append(np.ascontiguousarray(derivative[:, padx:padx + nx, pady:pady + ny]))
+
+    return tuple(derivatives)
+
+
+
+
+def _empty_statistics(n):
+
+    """
+    Accumulators of the depths of "n" windows: count, mean, sum of squared deviations, minimum and maximum.
+    """
+
+    return [np.zeros(n, dtype=np.int64), np.zeros(n), np.zeros(n), np.full(n, np.inf), np.full(n, -np.inf)]
+
+
+
+
+def _merge_statistics(total, part):
+
+    """
+    Adds the accumulators "part" to "total" (pairwise update of the mean and the sum of squared deviations).
+    """
+
+    count, mean, m2, low, high = total
+    part_count, part_mean, part_m2, part_low, part_high = part
+
+    merged = count + part_count
+    weight = np.divide(part_count, merged, out=np.zeros(len(merged)), where=merged > 0)
+    delta = part_mean - mean
+    mean += delta * weight
+    m2 += part_m2 + delta ** 2 * count * weight
+    count[:] = merged
+    np.minimum(low, part_low, out=low)
+    np.maximum(high, part_high, out=high)
+
+    return total
+
+
+
+
+def _realisations(seeds):
+
+    """
+    Solves the realisations of the given seeds in batches and returns the accumulators of the selected depths.
+    """
+
+    grid = _shared
+    data, xi, yi, zi = grid['data'], grid['xi'], grid['yi'], grid['zi']
+    rows, cols = grid['rows'], grid['cols']
+    keep = int(len(rows) * grid['filt'])
+    statistics = _empty_statistics(len(rows))
+    count, mean, m2, low, high = statistics
+
+    for start in range(0, len(seeds), grid['batch']):
+        batch_seeds = seeds[start:start + grid['batch']]
+        batch = np.stack([add_noise(data, grid['percent'], seed) for seed in batch_seeds])
+        derivx, derivy, derivz = batch_derivatives(batch, grid['area'], grid['alpha'])
+
+        for k in range(len(batch_seeds)):
+            p, stdz = solve_windows(batch[k], derivx[k], derivy[k], derivz[k], xi, yi, zi, grid['SI'],
+                                    grid['windowSize'], rows, cols, grid['backend'])
+            # solutions kept by "select_solutions" (higher standard deviation of the z derivative)
+            with stage('montecarlo.select', stdz):
+                selected = np.argsort(-stdz, kind='stable')[:keep]
+            depth = p[selected, 2]
+            count[selected] += 1
+            delta = depth - mean[selected]
+            mean[selected] += delta / count[selected]
+            m2[selected] += delta * (depth - mean[selected])
+            low[selected] = np.minimum(low[selected], depth)
+            high[selected] = np.maximum(high[selected], depth)
+
+    return statistics
+
+
+
+
+def _init_worker(grid):
+
+    """
+    Stores the grid and the parameters in a process of the pool.
+    """
+
+    _shared.clear()
+    _shared.update(grid)
+
+
+
+
+def depth_statistics(data, xi, yi, zi, shape, area, SI, windowSize, filt, alpha=None, percent=1.0, realisations=100,
+                     seed=0, batch=8, workers=None, backend='numpy'):
+
+    """
+    Euler deconvolution of noise realisations of a grid - returns the statistics of the depths estimated at each
+    window center over the realisations in which the solution is kept.
+
+    Parameters:
+
+    * data: 1D-array
+        noise-free input data set - without gaps
+    * xi, yi, zi: 1D-array
+        coordinates mesh in x-, y- and z-directions
+    * shape: tuple = (nx, ny)
+        data points number in each direction
+    * area: tuple = (x1, x2, y1, y2)
+        mesh boundaries
+    * SI: integer
+        structural index - 0, 1, 2 or 3
+    * windowSize: integer
+        size of the moving data window
+    * filt: float
+        percentage of the solutions kept in each realisation (see "select_solutions" in "euler.py")
+    * alpha: float
+        regularization parameter - None for the non-regularized derivatives
+    * percent: float
+        standard deviation of the noise (% of the largest absolute value of the data, see "add_noise")
+    * realisations: integer
+        number of noise realisations
+    * seed: integer
+        seed of the first realisation - realisation k uses seed + k
+    * batch: integer
+        number of realisations transformed together - the memory used grows with it
+    * workers: integer
+        number of processes - None uses the number of processors, 1 runs in the current process
+    * backend: string
+        window solver - 'numpy', 'jit' or 'auto' (see "solve_windows" in "euler.py")
+
+    Returns:
+
+    * statistics: dictionary
+        'count' - number of realisations in which the solution of the window is kept,
+        'mean', 'std', 'min', 'max' - depth statistics of the kept solutions (NaN where no solution is kept),
+        all 2D-arrays of the grid shape indexed by the window centers, and 'realisations'
+    """
+
+    data = np.reshape(data, shape)
+    if np.isnan(data).any():
+        raise ValueError('the Monte Carlo realisations require a grid without gaps')
+
+    rows, cols = window_corners(shape, windowSize)
+    # "select_solutions" discards the centers within half a window of the border (the last row and column of
+    # centers of an even window)
+    delta = windowSize // 2
+    inside = (rows + 2 * delta < shape[0]) & (cols + 2 * delta < shape[1])
+    rows, cols = rows[inside], cols[inside]
+    grid = {'data': data, 'xi': np.reshape(xi, shape), 'yi': np.reshape(yi, shape), 'zi': np.reshape(zi, shape),
+            'area': tuple(area), 'SI': SI, 'windowSize': windowSize, 'filt': filt, 'alpha': alpha,
+            'percent': percent, 'batch': batch, 'backend': backend, 'rows': rows, 'cols': cols}
+
+    seeds = [seed + k for k in range(realisations)]
+    blocks = [seeds[start:start + batch] for start in range(0, realisations, batch)]
+    statistics = _empty_statistics(len(rows))
+
+    if workers == 1:
+        _init_worker(grid)
+        for block in blocks:
+            _merge_statistics(statistics, _realisations(block))
+    else:
+        # the blocks are merged in their order, so the result does not depend on the number of processes; the
+        # workers are spawned, as a process forked after numba started its TBB threads hangs
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(grid,)) as pool:
+            for part in pool.map(_realisations, blocks):
+                _merge_statistics(statistics, part)
+
+    count, mean, m2, low, high = statistics
+    kept = count > 0
+    std = np.full(len(count), np.nan)
+    std[count > 1] = np.sqrt(m2[count > 1] / (count[count > 1] - 1))
+
+    centers = (rows + windowSize // 2, cols + windowSize // 2)
+    result = {'realisations': realisations}
+    for name, values in (('count', count), ('mean', np.where(kept, mean, np.nan)), ('std', std),
+                         ('min', np.where(kept, low, np.nan)), ('max', np.where(kept, high, np.nan))):
+        grid_values = np.zeros(shape, dtype=count.dtype) if name == 'count' else np.full(shape, np.nan)
+        grid_values[centers] = values
+        result[name] = grid_values
+
+    return result
+
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Depth statistics of the Euler solutions over noise realisations')
+    parser.add_argument('input', help='noise-free data file - columns x, y, z and total-field anomaly')
+    parser.add_argument('--shape', type=int, nargs=2, default=(200, 200), help='data points number (nx, ny)')
+    parser.add_argument('--SI', type=int, default=1, help='structural index')
+    parser.add_argument('--winsize', type=int, default=6, help='moving data window size')
+    parser.add_argument('--filt', type=float, default=0.035, help='percentage of the solutions kept')
+    parser.add_argument('--alpha', type=float, default=None, help='regularization parameter (none: non-regularized)')
+    parser.add_argument('--percent', type=float, default=1.0, help='noise standard deviation (%% of the amplitude)')
+    parser.add_argument('--realisations', type=int, default=100, help='number of noise realisations')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first realisation')
+    parser.add_argument('--batch', type=int, default=8, help='realisations transformed together')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes')
+    parser.add_argument('--backend', choices=['auto', 'numpy', 'jit'], default='numpy', help='window solver')
+    parser.add_argument('--output', default=os.path.join('results', 'montecarlo_depths.txt'),
+                        help='text file of the statistics at the window centers with kept solutions')
+    arguments = parser.parse_args()
+
+    columns = np.loadtxt(arguments.input)
+    x, y, z, tfa = columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3]
+    area = (x.min(), x.max(), y.min(), y.max())
+    stats = depth_statistics(tfa, x, y, z, arguments.shape, area, arguments.SI, arguments.winsize, arguments.filt,
+                             arguments.alpha, arguments.percent, arguments.realisations, arguments.seed,
+                             arguments.batch, arguments.workers, arguments.backend)
+
+    kept = stats['count'] > 0
+    table = np.column_stack([x.reshape(arguments.shape)[kept], y.reshape(arguments.shape)[kept],
+                             stats['count'][kept], stats['mean'][kept], stats['std'][kept], stats['min'][kept],
+                             stats['max'][kept]])
+    np.savetxt(arguments.output, table, delimiter='\t', header='x\ty\tcount\tmean\tstd\tmin\tmax')
+    print('%d realisations, %d window centers with kept solutions' % (stats['realisations'], len(table)))
@@ -0,0 +1,140 @@
+"""
+Operator bank
+
+A Python module that builds the wavenumbers and derivative operators in the Fourier domain once for each grid geometry
+and keeps them for the next calls of "filtering.py" and "euler.py". The operators are addressed by the padded shape,
+the grid spacing, the regularization parameter and the derivative order. The wavenumbers and the x- and y-derivative
+operators are stored as broadcastable column and row vectors instead of full 2D meshes; only the operators that
+depend on both wavenumbers (z-direction) are stored as 2D-arrays.
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import numpy as np
+from cache import GridCache, content_key
+
+
+
+
+def derivative_operator(kx, ky, direction, order=1, alpha=None):
+
+    """
+    Computes the directional derivative operator in the Fourier domain. The regularized operator is the Tikhonov form
+    D / (1 + alpha * |D| ** 2) of the non-regularized operator D, which reduces to equation 3 of the paper for the
+    first-order derivatives.
+
+    Parameters:
+
+    * kx, ky: 2D-array
+        wavenumbers in x- and y-directions (full meshes or broadcastable vectors)
+    * direction: string
+        'x', 'y' or 'z'
+    * order: integer
+        derivative order
+    * alpha: float
+        regularization parameter - None for the non-regularized operator
+
+    Returns:
+
+    * gamma: 2D-array
+        derivative operator
+    """
+
+    if direction == 'x':
+        gamma = (kx * 1j) ** order
+    elif direction == 'y':
+        gamma = (ky * 1j) ** order
+    elif direction == 'z':
+        gamma = np.sqrt(kx ** 2 + ky ** 2) ** order
+    else:
+        raise ValueError("direction must be 'x', 'y' or 'z'")
+
+    if alpha is not None:
+        gamma = gamma / (1 + alpha * np.abs(gamma) ** 2)
+
+    return gamma
+
+
+
+
+class OperatorBank(object):
+
+    """
+    Operators in the Fourier domain kept by grid geometry.
+
+    Parameters:
+
+    * max_bytes: integer
+        byte budget of the stored operators
+    """
+
+    def __init__(self, max_bytes=2 ** 28):
+
+        self.cache = GridCache(max_bytes)
+
+    def wavenumbers(self, padshape, dx, dy):
+
+        """
+        Returns the wavenumbers as a column vector (x-direction) and a row vector (y-direction).
+
+        Parameters:
+
+        * padshape: tuple = (nx, ny)
+            data points number in each direction after padding
+        * dx, dy: float
+            grid spacing in x- and y-directions
+
+        Returns:
+
+        * kx, ky: 2D-array
+            wavenumbers with shapes (nx, 1) and (1, ny)
+        """
+
+        key = content_key('wavenumbers', tuple(padshape), float(dx), float(dy))
+        k = self.cache.get(key, shared=True)
+
+        if k is None:
+            kx = 2 * np.pi * np.fft.fftfreq(padshape[0], dx)
+            ky = 2 * np.pi * np.fft.fftfreq(padshape[1], dy)
+            k = self.cache.put(key, (kx.reshape(-1, 1), ky.reshape(1, -1)), shared=True)
+
+        return k
+
+    def derivative(self, padshape, dx, dy, direction, order=1, alpha=None):
+
+        """
+        Returns the derivative operator (see "derivative_operator") - a column vector for the x-direction, a row vector
+        for the y-direction and a 2D-array for the z-direction.
+        """
+
+        key = content_key('derivative', tuple(padshape), float(dx), float(dy), direction, order, alpha)
+        gamma = self.cache.get(key, shared=True)
+
+        if gamma is None:
+            kx, ky = self.wavenumbers(padshape, dx, dy)
+            if direction == 'z' and (order != 1 or alpha is not None):
+                # Builds the regularized or higher-order operator from the stored first-order one
+                kz = self.derivative(padshape, dx, dy, 'z')
+                gamma = kz ** order
+                if alpha is not None:
+                    gamma = gamma / (1 + alpha * gamma ** 2)
+            else:
+                gamma = derivative_operator(kx, ky, direction, order, alpha)
+            gamma = self.cache.put(key, gamma, shared=True)
+
+        return gamma
+
+    def info(self):
+
+        """
+        Returns the hit and miss counters, the number of operators and the bytes in use.
+        """
+
+        return self.cache.info()
+
+
+
+
+# Operators shared by "filtering.py" and "euler.py"
+default_bank = OperatorBank()
@@ -0,0 +1,246 @@
+"""
+Headless parallel figures
+
+A Python module that renders independent figures (e.g. "plot_figure1" to "plot_figure4" in "plot_figure.py") at the
+same time in a pool of processes with a non-interactive Matplotlib backend, so the figures are made on computers
+without a display. The input arrays are copied once into shared memory blocks and the workers read them in place:
+only the names, shapes and data types of the blocks are sent to the workers. The figure functions are called
+unchanged, so the figures are the same as those made one after another.
+
+The workers are started with "spawn" (a process forked after the parallel Euler solver of "euler.py" has started
+the TBB threads of numba hangs at exit), so they import the main module again: the calling script must run its
+computations and "render_figures" under a main guard, and the figure functions must be defined in a module.
+
+Usage:
+
+    render_figures([(plot_figure1, (x, y, tfa, asa, reg_asa, tdr, reg_tdr, true_asa, reg2_asa)),
+                    (plot_figure2, (alpha_test, norm_sol_dx, norm_sol_dy, norm_sol_dz, alpha_vector), {'dpi': 300})])
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# Non-interactive Matplotlib backend of the workers
+BACKEND = 'Agg'
+
+
+
+
+class _SharedArray(object):
+
+    """
+    Description of an array stored in a shared memory block - sent to the workers instead of the array.
+    """
+
+    __slots__ = ('name', 'shape', 'dtype')
+
+    def __init__(self, name, shape, dtype):
+
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    def __getstate__(self):
+
+        return (self.name, self.shape, self.dtype)
+
+    def __setstate__(self, state):
+
+        self.name, self.shape, self.dtype = state
+
+
+
+
+class SharedArrays(object):
+
+    """
+    Copies the arrays of figure arguments into shared memory blocks (each distinct array once) and removes the
+    blocks when the context ends.
+
+    Usage:
+
+        with SharedArrays() as shared:
+            described = shared.describe(args)
+    """
+
+    def __init__(self):
+
+        self.blocks = {}
+        self._arrays = {}
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc):
+
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks.clear()
+        self._arrays.clear()
+
+        return False
+
+    def describe(self, value):
+
+        """
+        Replaces the arrays of a value (an array, or lists, tuples and dictionaries of arrays) by their descriptions.
+        Arrays of objects and empty arrays are kept as they are.
+        """
+
+        if isinstance(value, np.ndarray):
+            if value.dtype.hasobject or value.size == 0:
+                return value
+            key = id(value)
+            if key not in self._arrays:
+                block = shared_memory.SharedMemory(create=True, size=value.nbytes)
+                np.ndarray(value.shape, value.dtype, buffer=block.buf)[...] = value
+                self.blocks[key] = block
+                # the array is kept so its id is not reused while the blocks exist
+                self._arrays[key] = (value, _SharedArray(block.name, value.shape, value.dtype.str))
+            return self._arrays[key][1]
+        if isinstance(value, (list, tuple)):
+            return type(value)(self.describe(item) for item in value)
+        if isinstance(value, dict):
+            return dict((key, self.describe(item)) for key, item in value.items())
+
+        return value
+
+
+
+
+def attach_arrays(value, blocks):
+
+    """
+    Replaces the descriptions of a value (see "SharedArrays.describe") by read-only arrays that read the shared memory
+    blocks in place.
+
+    Parameters:
+
+    * value: description, or lists, tuples and dictionaries of descriptions
+        value received by a process
+    * blocks: dictionary
+        shared memory blocks attached by the process, by name - the new blocks are added (see "release_arrays")
+
+    Returns:
+
+    * value: arrays, or lists, tuples and dictionaries of arrays
+        the value with the arrays
+    """
+
+    if isinstance(value, _SharedArray):
+        if value.name not in blocks:
+            blocks[value.name] = shared_memory.SharedMemory(name=value.name)
+        array = np.ndarray(value.shape, np.dtype(value.dtype), buffer=blocks[value.name].buf)
+        array.flags.writeable = False
+        return array
+    if isinstance(value, (list, tuple)):
+        return type(value)(attach_arrays(item, blocks) for item in value)
+    if isinstance(value, dict):
+        return dict((key, attach_arrays(item, blocks)) for key, item in value.items())
+
+    return value
+
+
+
+
+def release_arrays(blocks):
+
+    """
+    Closes the shared memory blocks attached by "attach_arrays" (the arrays that read them must be deleted before).
+    """
+
+    for block in blocks.values():
+        try:
+            block.close()
+        except BufferError:
+            # an array still refers to the block - it is released when the process exits
+            pass
+    blocks.clear()
+
+
+
+
+def _init_worker(backend):
+
+    """
+    Selects the non-interactive backend in a worker before any figure is made.
+    """
+
+    import matplotlib
+    matplotlib.use(backend, force=True)
+
+
+
+
+def _render(function, args, kwargs):
+
+    """
+    Calls a figure function with the arrays read from shared memory and returns its wall time (s).
+    """
+
+    blocks = {}
+    start = time.time()
+    function(*attach_arrays(args, blocks), **attach_arrays(kwargs, blocks))
+    elapsed = time.time() - start
+    release_arrays(blocks)
+
+    return elapsed
+
+
+
+
+def render_figures(jobs, workers=None, backend=BACKEND):
+
+    """
+    Renders figures in a pool of processes with a non-interactive backend.
+
+    Parameters:
+
+    * jobs: list of tuples = [(function, args), (function, args, kwargs), ...]
+        figure functions (defined at the top level of a module) and their arguments
+    * workers: integer
+        number of processes - None uses the number of figures or of processors, whichever is smaller,
+        1 renders in the current process (the Matplotlib backend is restored afterwards)
+    * backend: string
+        non-interactive Matplotlib backend - 'Agg', 'pdf', 'svg' ...
+
+    Returns:
+
+    * times: list of floats
+        wall time of each figure (s)
+    """
+
+    jobs = [(job[0], tuple(job[1]), dict(job[2]) if len(job) > 2 else {}) for job in jobs]
+    if workers is None:
+        workers = min(len(jobs), multiprocessing.cpu_count())
+
+    if workers <= 1:
+        import matplotlib.pyplot as plt
+        previous = plt.get_backend()
+        plt.switch_backend(backend)
+        try:
+            times = []
+            for function, args, kwargs in jobs:
+                start = time.time()
+                function(*args, **kwargs)
+                times.append(time.time() - start)
+        finally:
+            plt.switch_backend(previous)
+        return times
+
+    with SharedArrays() as shared:
+        described = [(function, shared.describe(args), shared.describe(kwargs)) for function, args, kwargs in jobs]
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(backend,)) as pool:
+            futures = [pool.submit(_render, function, args, kwargs) for function, args, kwargs in described]
+            return [future.result() for future in futures]
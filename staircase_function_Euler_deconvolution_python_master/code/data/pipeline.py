@@ -0,0 +1,295 @@
+"""
+Pipeline runner
+
+A Python program that runs a processing pipeline described in a configuration file (JSON) as a graph of stages. Each
+stage calls a function of "filtering.py", "euler.py" or NumPy with arguments that can refer to the outputs of other
+stages, so the stages that do not depend on each other run at the same time in a pool of workers. The wall time of
+each stage is written to a timings file.
+
+Configuration:
+
+    {"stages": [{"name": "norms", "function": "filtering.s_function_derivative",
+                 "args": ["$x", "$y", "$tfa", "$shape", "$alpha_test"]},
+                {"name": "alpha_x", "function": "filtering.regularization_parameter",
+                 "args": ["$norms.0", "$alpha_test", 0.6, 0.4, 0.5]}]}
+
+- "$name" refers to the output of the stage "name" and "$name.0" to the first item of that output;
+- "args" is a list and "kwargs" a dictionary of arguments, lists are resolved recursively;
+- "value" can replace "function" to define a constant stage.
+
+Usage:
+
+    python pipeline.py pipeline_synthetic.json --workers 4 --timings results/timings.json
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import argparse
+import importlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+
+
+def load_config(path):
+
+    """
+    Reads a pipeline configuration file and checks the stage graph.
+
+    Parameters:
+
+    * path: string
+        JSON configuration file
+
+    Returns:
+
+    * config: dictionary
+        configuration with the list of stages
+    """
+
+    with open(path) as config_file:
+        config = json.load(config_file)
+
+    names = [stage['name'] for stage in config['stages']]
+    if len(set(names)) != len(names):
+        raise ValueError('stage names must be unique')
+
+    for stage in config['stages']:
+        missing = dependencies(stage) - set(names)
+        if missing:
+            raise ValueError("stage '%s' refers to unknown stages: %s" % (stage['name'], ', '.join(sorted(missing))))
+
+    return config
+
+
+
+
+def _references(value):
+
+    """
+    Yields the stage references ("$name" or "$name.index") in an argument.
+    """
+
+    if isinstance(value, str) and value.startswith('$'):
+        yield value[1:].split('.')
+    elif isinstance(value, list):
+        for item in value:
+            for reference in _references(item):
+                yield reference
+    elif isinstance(value, dict):
+        for item in value.values():
+            for reference in _references(item):
+                yield reference
+
+
+
+
+def dependencies(stage):
+
+    """
+    Returns the names of the stages whose outputs a stage uses.
+    """
+
+    arguments = [stage.get('args', []), stage.get('kwargs', {})]
+    return set(reference[0] for reference in _references(arguments))
+
+
+
+
+def resolve(value, results):
+
+    """
+    Replaces the stage references in an argument by the stage outputs.
+    """
+
+    if isinstance(value, str) and value.startswith('$'):
+        reference = value[1:].split('.')
+        output = results[reference[0]]
+        for index in reference[1:]:
+            output = output[int(index)]
+        return output
+    if isinstance(value, list):
+        return [resolve(item, results) for item in value]
+    if isinstance(value, dict):
+        return dict((key, resolve(item, results)) for key, item in value.items())
+    return value
+
+
+
+
+def resolve_function(name):
+
+    """
+    Imports a function given as "module.function".
+    """
+
+    module, function = name.rsplit('.', 1)
+    return getattr(importlib.import_module(module), function)
+
+
+
+
+def _run_stage(function_name, args, kwargs):
+
+    """
+    Runs a stage in a worker and returns its output with the start and end times.
+    """
+
+    start = time.time()
+    output = resolve_function(function_name)(*args, **kwargs)
+    end = time.time()
+
+    return output, start, end, os.getpid(), threading.current_thread().name
+
+
+
+
+def critical_path(config, durations):
+
+    """
+    Computes the longest chain of dependent stages.
+
+    Parameters:
+
+    * config: dictionary
+        pipeline configuration
+    * durations: dictionary
+        wall time of each stage (s)
+
+    Returns:
+
+    * length: float
+        sum of the wall times along the critical path (s)
+    * path: list
+        stage names along the critical path
+    """
+
+    stages = dict((stage['name'], stage) for stage in config['stages'])
+    finish = {}
+
+    def longest(name):
+        if name not in finish:
+            chains = [longest(parent) for parent in dependencies(stages[name])]
+            length, path = max(chains, key=lambda chain: chain[0]) if chains else (0.0, [])
+            finish[name] = (length + durations.get(name, 0.0), path + [name])
+        return finish[name]
+
+    return max((longest(name) for name in stages), key=lambda chain: chain[0])
+
+
+
+
+def run_pipeline(config, workers=None, executor='process', timings=None):
+
+    """
+    Runs the stages of a pipeline as soon as the stages they depend on are finished.
+
+    Parameters:
+
+    * config: dictionary
+        pipeline configuration (see "load_config")
+    * workers: integer
+        number of workers - None uses the number of processors
+    * executor: string
+        'process' - pool of processes, 'thread' - pool of threads
+    * timings: string
+        JSON file where the wall time of each stage is written - None does not write it
+
+    Returns:
+
+    * results: dictionary
+        output of each stage
+    * report: dictionary
+        start, end and duration of each stage, total wall time and critical path
+    """
+
+    pool_class = {'process': ProcessPoolExecutor, 'thread': ThreadPoolExecutor}[executor]
+
+    priority = None
+    if executor == 'thread' and numba is not None:
+        # The compiled Euler kernel is launched from several threads at once; the TBB layer of numba hangs at exit
+        # in this case, so OpenMP is preferred when available (the priority is read when the first parallel function
+        # runs). The setting is process-wide, so the priority of the caller is restored at the end
+        priority = numba.config.THREADING_LAYER_PRIORITY
+        numba.config.THREADING_LAYER_PRIORITY = ['omp', 'tbb', 'workqueue']
+
+    stages = dict((stage['name'], stage) for stage in config['stages'])
+    waiting = dict((name, dependencies(stage)) for name, stage in stages.items())
+    results = {}
+    report = {'stages': {}}
+    running = {}
+    origin = time.time()
+
+    try:
+        with pool_class(max_workers=workers) as pool:
+            while waiting or running:
+                # Submits the stages whose dependencies are finished
+                constants = False
+                for name in [name for name, needs in waiting.items() if not needs - set(results)]:
+                    stage = stages.pop(name)
+                    del waiting[name]
+                    if 'value' in stage:
+                        results[name] = stage['value']
+                        report['stages'][name] = {'start': 0.0, 'end': 0.0, 'duration': 0.0}
+                        constants = True
+                        continue
+                    args = resolve(stage.get('args', []), results)
+                    kwargs = resolve(stage.get('kwargs', {}), results)
+                    running[pool.submit(_run_stage, stage['function'], args, kwargs)] = name
+
+                if not running:
+                    if waiting and not constants:
+                        raise ValueError('the stage graph has a cycle: %s' % ', '.join(sorted(waiting)))
+                    continue
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    output, start, end, pid, thread = future.result()
+                    results[name] = output
+                    report['stages'][name] = {'start': start - origin, 'end': end - origin, 'duration': end - start,
+                                              'pid': pid, 'thread': thread}
+    finally:
+        if priority is not None:
+            numba.config.THREADING_LAYER_PRIORITY = priority
+
+    durations = dict((name, stage['duration']) for name, stage in report['stages'].items())
+    report['wall_time'] = time.time() - origin
+    report['sum_of_stages'] = sum(durations.values())
+    report['critical_path'], report['critical_stages'] = critical_path(config, durations)
+
+    if timings is not None:
+        with open(timings, 'w') as timings_file:
+            json.dump(report, timings_file, indent=2)
+
+    return results, report
+
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Runs a pipeline of stages described in a JSON file.')
+    parser.add_argument('config', help='pipeline configuration file')
+    parser.add_argument('--workers', type=int, default=None, help='number of workers')
+    parser.add_argument('--executor', choices=['process', 'thread'], default='process', help='pool of workers')
+    parser.add_argument('--timings', default=None, help='JSON file for the stage timings')
+    arguments = parser.parse_args()
+
+    _, summary = run_pipeline(load_config(arguments.config), arguments.workers, arguments.executor,
+                              arguments.timings)
+
+    for stage_name, stage_time in sorted(summary['stages'].items(), key=lambda item: item[1]['start']):
+        print('%-24s %8.2f s' % (stage_name, stage_time['duration']))
+    print('wall time %.2f s, sum of stages %.2f s, critical path %.2f s'
+          % (summary['wall_time'], summary['sum_of_stages'], summary['critical_path']))
@@ -6,6 +6,11 @@ histograms, and map of the solutions Euler.
 
 This code plots the figures 1, 2, 3, and 4 of the synthetic data in the folder 'figures'.
 
+The maps of gridded data are drawn from the grid itself (filled contours of the structured grid, or an image with the
+same color levels when render='image') instead of a triangulation of the scattered points, and the grid is arranged
+once for all the panels of a figure. Data that are not on a regular grid are triangulated once per figure. For grids
+larger than the output resolution, max_points='auto' (or a number of points) draws a decimated preview.
+
 This code is released from the paper: "Variable regularization degrees in processing aeromagnetic data with first-order derivatives to 
 improve geological mapping and automatic depth estimates".
 
@@ -16,15 +21,165 @@ email: janaina.melo@usp.br (J.A. Melo); carlos.mendonca@iag.usp.br (C.A. Mendon
 """
 
 
+import os
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.colors import BoundaryNorm
 from matplotlib.lines import Line2D
+from matplotlib.ticker import MaxNLocator
+from matplotlib.tri import Triangulation
+
+
+
+def regular_grid(x, y):
+
+    """
+    Finds the regular grid of scattered coordinates.
+
+    Parameters:
+
+    * x, y: 1D-array
+        coordinates of the points
+
+    Returns:
+
+    * grid: tuple = (order, xaxis, yaxis) or None
+        indexes that arrange the values of the points in a 2D-array of shape (nx, ny) - None when the points are
+        already in this order - and the coordinate axes; None when the points are not on a grid
+    """
+
+    xaxis = np.unique(x)
+    yaxis = np.unique(y)
+    if len(xaxis) * len(yaxis) != len(x) or len(xaxis) < 2 or len(yaxis) < 2:
+        return None
+
+    flat = np.searchsorted(xaxis, x) * len(yaxis) + np.searchsorted(yaxis, y)
+    if np.array_equal(flat, np.arange(len(flat))):
+        return None, xaxis, yaxis
+    order = np.argsort(flat, kind='stable')
+    if not np.array_equal(flat[order], np.arange(len(flat))):
+        # repeated points
+        return None
+
+    return order, xaxis, yaxis
+
+
+
+def contour_levels(values, levels, extend='neither'):
+
+    """
+    Returns the color levels of a filled map - the levels chosen by "contourf" when a number of levels is given.
+    """
+
+    if np.ndim(levels) > 0:
+        return np.asarray(levels)
+
+    zmin, zmax = np.nanmin(values), np.nanmax(values)
+    lev = MaxNLocator(levels + 1, min_n_ticks=1).tick_values(zmin, zmax)
+    # trim the levels outside the values, as "contourf"
+    under = np.nonzero(lev < zmin)[0]
+    i0 = under[-1] if len(under) else 0
+    over = np.nonzero(lev > zmax)[0]
+    i1 = over[0] + 1 if len(over) else len(lev)
+    if extend in ('min', 'both'):
+        i0 += 1
+    if extend in ('max', 'both'):
+        i1 -= 1
+    if i1 - i0 < 3:
+        i0, i1 = 0, len(lev)
+
+    return lev[i0:i1]
+
+
+
+class MapRenderer(object):
+
+    """
+    Draws filled maps of values at the points (x, y), with y on the horizontal axis and x on the vertical axis (km).
+
+    Parameters:
+
+    * x, y: 1D-array
+        coordinates of the points (m)
+    * render: string
+        'contour' - filled contours of the structured grid,
+        'image' - image of the grid with the color levels of the contours (the fastest)
+    * max_points: integer or string
+        largest number of points drawn along each axis - the grid is decimated above it,
+        'auto' - the output resolution of the axes, None - all the points
+    * dpi: float
+        resolution of the saved figure - used by max_points='auto'
+    """
+
+    def __init__(self, x, y, render='contour', max_points=None, dpi=600):
+
+        if render not in ('contour', 'image'):
+            raise ValueError("unknown render '%s'" % render)
+        self.render = render
+        self.max_points = max_points
+        self.dpi = dpi
+        self.grid = regular_grid(x, y)
+        if self.grid is None:
+            # scattered points: one triangulation for all the maps
+            self.triangulation = Triangulation(y/1000, x/1000)
+
+    def _step(self, ax, shape):
+
+        if self.max_points is None:
+            return 1
+        if self.max_points == 'auto':
+            width, height = ax.figure.get_size_inches()
+            box = ax.get_position()
+            limit = (box.height*height*self.dpi, box.width*width*self.dpi)
+        else:
+            limit = (self.max_points, self.max_points)
+
+        return max(1, int(np.ceil(max(shape[0]/limit[0], shape[1]/limit[1]))))
+
+    def filled(self, ax, values, levels, cmap):
+
+        """
+        Draws a filled map and returns the object used by the color bar.
+
+        Parameters:
+
+        * ax: Axes
+            axes of the map
+        * values: 1D-array
+            values at the points
+        * levels: integer or 1D-array
+            number of color levels or the levels
+        * cmap: string
+            color map
+        """
+
+        if self.grid is None:
+            return ax.tricontourf(self.triangulation, values, levels, cmap=cmap)
+
+        order, xaxis, yaxis = self.grid
+        grid = (values if order is None else values[order]).reshape(len(xaxis), len(yaxis))
+        step = self._step(ax, grid.shape)
+        xs, ys, grid = xaxis[::step]/1000, yaxis[::step]/1000, grid[::step, ::step]
+
+        if self.render == 'contour':
+            return ax.contourf(ys, xs, grid, levels, cmap=cmap)
+
+        levels = contour_levels(grid, levels)
+        colormap = plt.get_cmap(cmap)
+        dx = (xs[-1] - xs[0])/(len(xs) - 1)
+        dy = (ys[-1] - ys[0])/(len(ys) - 1)
 
+        return ax.imshow(grid, origin='lower', aspect='auto', interpolation='nearest', cmap=colormap,
+                         norm=BoundaryNorm(levels, colormap.N),
+                         extent=(ys[0] - dy/2, ys[-1] + dy/2, xs[0] - dx/2, xs[-1] + dx/2))
 
 
-def plot_figure1(x, y, tfa, asa, reg_asa, tilt, reg_tilt, true_asa, reg2_asa):
+
+def plot_figure1(x, y, tfa, asa, reg_asa, tilt, reg_tilt, true_asa, reg2_asa, render='contour', max_points=None,
+                 dpi=600):
 
     fig, ax = plt.subplots(nrows=3, ncols=2, figsize=(7, 10))
+    maps = MapRenderer(x, y, render, max_points, dpi)
 
     true_asa = true_asa * 1000
     asa = asa * 1000
@@ -44,11 +199,11 @@ def plot_figure1(x, y, tfa, asa, reg_asa, tilt, reg_tilt, true_asa, reg2_asa):
     v3 = np.linspace(min(reg_tilt), max(reg_tilt), 15, endpoint=True)
     v3_ = np.linspace(min(reg_tilt), max(reg_tilt), 5, endpoint=True)
 
-    tmp1 = ax[0][0].tricontourf(y/1000, x/1000, tfa, 30, cmap='gist_ncar')
-    tmp2 = ax[1][0].tricontourf(y/1000, x/1000, asa, 30, cmap='gist_ncar', levels=v2)
-    tmp3 = ax[1][1].tricontourf(y/1000, x/1000, reg_asa, 30, cmap='gist_ncar', levels=v2)
-    tmp4 = ax[2][0].tricontourf(y/1000, x/1000, tilt, 30, cmap='gist_ncar', levels=v3)
-    tmp5 = ax[2][1].tricontourf(y/1000, x/1000, reg_tilt, 30, cmap='gist_ncar', levels=v3)
+    tmp1 = maps.filled(ax[0][0], tfa, 30, 'gist_ncar')
+    tmp2 = maps.filled(ax[1][0], asa, v2, 'gist_ncar')
+    tmp3 = maps.filled(ax[1][1], reg_asa, v2, 'gist_ncar')
+    tmp4 = maps.filled(ax[2][0], tilt, v3, 'gist_ncar')
+    tmp5 = maps.filled(ax[2][1], reg_tilt, v3, 'gist_ncar')
 
 
     plt.colorbar(tmp1, ax=ax[0][0], fraction=0.030, aspect=20, spacing='uniform', format='%.f', orientation='vertical',
@@ -121,14 +276,14 @@ def plot_figure1(x, y, tfa, asa, reg_asa, tilt, reg_tilt, true_asa, reg2_asa):
     plt.subplots_adjust(wspace=0.6, hspace=0.5)
     ax[0][1].legend(edgecolor='black',loc='upper right', fontsize=7)
 
-    plt.savefig('figures\FIG1.png', bbox_inches='tight', dpi=600)
+    plt.savefig(os.path.join('figures', 'FIG1.png'), bbox_inches='tight', dpi=dpi)
     plt.close('all')
 
     return
 
 
 
-def plot_figure2(alpha, norm_sol_dx, norm_sol_dy, norm_sol_dz, alpha_vector):
+def plot_figure2(alpha, norm_sol_dx, norm_sol_dy, norm_sol_dz, alpha_vector, dpi=600):
 
     fig, ax = plt.subplots(figsize=(4, 3))
 
@@ -164,14 +319,15 @@ def plot_figure2(alpha, norm_sol_dx, norm_sol_dy, norm_sol_dz, alpha_vector):
     ax.tick_params(axis='both', which='major', labelsize=6)
     ax.legend(loc='lower left', fontsize=5, edgecolor='black')
 
-    plt.savefig('figures\FIG2.png', bbox_inches='tight', dpi=600)
+    plt.savefig(os.path.join('figures', 'FIG2.png'), bbox_inches='tight', dpi=dpi)
     plt.close('all')
 
     return
 
 
 
-def plot_figure3(x, y, tfa2, x2range, y2range, reg_x2range, reg_y2range, sol_depth2):
+def plot_figure3(x, y, tfa2, x2range, y2range, reg_x2range, reg_y2range, sol_depth2, render='contour',
+                 max_points=None, dpi=600):
 
     fig = plt.figure(figsize=(6, 10))
     ax1 = plt.subplot2grid((3, 2), (0, 0))
@@ -179,8 +335,10 @@ def plot_figure3(x, y, tfa2, x2range, y2range, reg_x2range, reg_y2range, sol_dep
     ax3 = plt.subplot2grid((3, 2), (1, 0), colspan=2)
     ax4 = plt.subplot2grid((3, 2), (2, 0), colspan=2)
 
-    ax1.tricontourf(y/1000, x/1000, tfa2, 5, cmap='gist_gray')
-    ax2.tricontourf(y/1000, x/1000, tfa2, 5, cmap='gist_gray')
+    maps = MapRenderer(x, y, render, max_points, dpi)
+    levels = contour_levels(tfa2, 5)
+    maps.filled(ax1, tfa2, levels, 'gist_gray')
+    maps.filled(ax2, tfa2, levels, 'gist_gray')
 
     ax1.scatter(y2range[2]/1000, x2range[2]/1000, s=6, marker='o', c='yellow')
     ax1.scatter(y2range[0]/1000, x2range[0]/1000, s=6, marker='o', c='blue')
@@ -257,14 +415,15 @@ def plot_figure3(x, y, tfa2, x2range, y2range, reg_x2range, reg_y2range, sol_dep
 
     plt.subplots_adjust(hspace=0.36, wspace=0.32)
 
-    plt.savefig('figures\FIG3.png', bbox_inches='tight', dpi=600)
+    plt.savefig(os.path.join('figures', 'FIG3.png'), bbox_inches='tight', dpi=dpi)
     plt.close('all')
 
     return
 
 
 
-def plot_figure4(x, y, tfa, xrange, yrange, reg_xrange, reg_yrange, sol_depth):
+def plot_figure4(x, y, tfa, xrange, yrange, reg_xrange, reg_yrange, sol_depth, render='contour', max_points=None,
+                 dpi=600):
 
     fig = plt.figure(figsize=(6, 10))
     ax1 = plt.subplot2grid((3, 2), (0, 0))
@@ -272,8 +431,10 @@ def plot_figure4(x, y, tfa, xrange, yrange, reg_xrange, reg_yrange, sol_depth):
     ax3 = plt.subplot2grid((3, 2), (1, 0), colspan=2)
     ax4 = plt.subplot2grid((3, 2), (2, 0), colspan=2)
 
-    ax1.tricontourf(y/1000, x/1000, tfa, 5, cmap='gist_gray')
-    ax2.tricontourf(y/1000, x/1000, tfa, 5, cmap='gist_gray')
+    maps = MapRenderer(x, y, render, max_points, dpi)
+    levels = contour_levels(tfa, 5)
+    maps.filled(ax1, tfa, levels, 'gist_gray')
+    maps.filled(ax2, tfa, levels, 'gist_gray')
 
     ax1.scatter(yrange[2]/1000, xrange[2]/1000, s=6, marker='o', c='yellow')
     ax1.scatter(yrange[0]/1000, xrange[0]/1000, s=6, marker='o', c='blue')
@@ -350,7 +511,7 @@ def plot_figure4(x, y, tfa, xrange, yrange, reg_xrange, reg_yrange, sol_depth):
 
     plt.subplots_adjust(hspace=0.36, wspace=0.32)
 
-    plt.savefig('figures\FIG4.png', bbox_inches='tight', dpi=600)
+    plt.savefig(os.path.join('figures', 'FIG4.png'), bbox_inches='tight', dpi=dpi)
     plt.close('all')
 
     return
@@ -0,0 +1,300 @@
+"""
+Stage profiling
+
+A Python module that records the wall time, number of calls, size of the arrays processed and peak memory of the
+internal stages of "filtering.py" and "euler.py" (padding, Fourier transforms, window solver, sorting, norms). The
+profiler is disabled by default: each stage then costs one function call that returns a shared empty context. The
+records can be written as a JSON summary or in the Chrome trace format (chrome://tracing, Perfetto).
+
+The peak memory is traced by "tracemalloc", which counts the allocations of the whole process. It is only recorded for
+the stages run in the main thread, and it includes the allocations made meanwhile by other threads.
+
+Usage:
+
+    import profiling
+    profiling.enable(memory=True)
+    euler_sol = euler_deconv(tfa, x, y, z, shape, area, SI, winsize, filt)
+    profiling.profiler.write_json('results/profile.json')
+    profiling.profiler.write_trace('results/profile_trace.json')
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+
+
+
+class _NullStage(object):
+
+    """
+    Context of a stage when the profiler is disabled.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+
+
+_NULL_STAGE = _NullStage()
+
+
+
+
+class _Stage(object):
+
+    """
+    Context of a stage when the profiler is enabled.
+    """
+
+    __slots__ = ('profiler', 'name', 'nbytes', 'start', 'memory')
+
+    def __init__(self, profiler, name, nbytes):
+
+        self.profiler = profiler
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+
+        # tracemalloc has a single peak for the whole process: a stage of another thread would reset the peak of
+        # the stages open in the main thread, so the memory is only traced in the main thread
+        if (self.profiler.memory and tracemalloc.is_tracing()
+                and threading.current_thread() is threading.main_thread()):
+            stack = self.profiler._stack()
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # The peak reached so far by the enclosing stage is kept before it is reset
+                stack[-1][1] = max(stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            # [memory at the start, highest peak of the nested stages]
+            self.memory = [current, current]
+            stack.append(self.memory)
+        else:
+            self.memory = None
+        self.start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, *exc):
+
+        end = time.perf_counter()
+        peak = 0
+
+        if self.memory is not None:
+            stack = self.profiler._stack()
+            stack.pop()
+            absolute = max(tracemalloc.get_traced_memory()[1], self.memory[1])
+            peak = absolute - self.memory[0]
+            if stack:
+                stack[-1][1] = max(stack[-1][1], absolute)
+
+        self.profiler._record(self.name, self.start, end, self.nbytes, peak)
+
+        return False
+
+
+
+
+class Profiler(object):
+
+    """
+    Records of the stages of a run.
+
+    Parameters:
+
+    * enabled: boolean
+        True records the stages
+    * memory: boolean
+        True also records the peak memory of each stage (traced with "tracemalloc", which slows the run down) -
+        only the stages run in the main thread are traced, the peak of the others is 0
+    """
+
+    def __init__(self, enabled=False, memory=False):
+
+        self.enabled = enabled
+        self.memory = memory
+        self.tracing = False
+        self.events = []
+        self.origin = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def stage(self, name, *arrays):
+
+        """
+        Returns the context that records a stage.
+
+        Parameters:
+
+        * name: string
+            stage name - prefixed by the module, e.g. 'euler.window_solver'
+        * arrays: arrays
+            inputs of the stage - their size in bytes is recorded
+
+        Usage:
+
+            with profiler.stage('filtering.fft', padded):
+                spectrum = np.fft.fft2(padded)
+        """
+
+        if not self.enabled:
+            return _NULL_STAGE
+
+        return _Stage(self, name, sum(getattr(array, 'nbytes', 0) for array in arrays))
+
+    def _stack(self):
+
+        """
+        Memory records of the open stages of the current thread.
+        """
+
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        return stack
+
+    def _record(self, name, start, end, nbytes, peak):
+
+        with self._lock:
+            self.events.append({'name': name, 'start': start - self.origin, 'duration': end - start,
+                                'nbytes': nbytes, 'peak': peak, 'pid': os.getpid(),
+                                'thread': threading.current_thread().ident})
+
+    def reset(self):
+
+        """
+        Removes all records.
+        """
+
+        with self._lock:
+            self.events = []
+            self.origin = time.perf_counter()
+
+    def summary(self):
+
+        """
+        Returns the records grouped by stage.
+
+        Returns:
+
+        * summary: dictionary
+            for each stage: number of calls, total, mean and maximum wall time (s), bytes of the inputs and maximum
+            peak memory (bytes)
+        """
+
+        summary = {}
+
+        with self._lock:
+            for event in self.events:
+                stage = summary.setdefault(event['name'], {'calls': 0, 'total': 0.0, 'max': 0.0, 'nbytes': 0,
+                                                           'peak': 0})
+                stage['calls'] += 1
+                stage['total'] += event['duration']
+                stage['max'] = max(stage['max'], event['duration'])
+                stage['nbytes'] += event['nbytes']
+                stage['peak'] = max(stage['peak'], event['peak'])
+
+        for stage in summary.values():
+            stage['mean'] = stage['total'] / stage['calls']
+
+        return summary
+
+    def write_json(self, path):
+
+        """
+        Writes the summary and the records of the stages in a JSON file.
+        """
+
+        with open(path, 'w') as output:
+            json.dump({'summary': self.summary(), 'events': self.events}, output, indent=2)
+
+    def write_trace(self, path):
+
+        """
+        Writes the records in the Chrome trace format (complete events, times in microseconds).
+        """
+
+        trace = [{'name': event['name'], 'cat': event['name'].split('.')[0], 'ph': 'X',
+                  'ts': event['start'] * 1e6, 'dur': event['duration'] * 1e6, 'pid': event['pid'],
+                  'tid': event['thread'], 'args': {'nbytes': event['nbytes'], 'peak': event['peak']}}
+                 for event in self.events]
+
+        with open(path, 'w') as output:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, output)
+
+    def print_summary(self):
+
+        """
+        Prints the summary sorted by total wall time.
+        """
+
+        print('%-36s %8s %10s %10s %12s' % ('stage', 'calls', 'total (s)', 'mean (ms)', 'peak (MB)'))
+        for name, stage in sorted(self.summary().items(), key=lambda item: -item[1]['total']):
+            print('%-36s %8d %10.3f %10.3f %12.1f' % (name, stage['calls'], stage['total'], 1e3 * stage['mean'],
+                                                      stage['peak'] / 2.0 ** 20))
+
+
+
+
+# Profiler used by "filtering.py" and "euler.py"
+profiler = Profiler()
+
+
+
+
+def enable(memory=False):
+
+    """
+    Enables the shared profiler and removes its previous records.
+
+    Parameters:
+
+    * memory: boolean
+        True also records the peak memory of each stage (starts "tracemalloc")
+    """
+
+    profiler.reset()
+    profiler.memory = memory
+    if memory and not tracemalloc.is_tracing():
+        # The tracing started here is stopped by "disable"
+        tracemalloc.start()
+        profiler.tracing = True
+    profiler.enabled = True
+
+
+
+
+def disable():
+
+    """
+    Disables the shared profiler, keeping its records.
+    """
+
+    profiler.enabled = False
+    if profiler.tracing:
+        tracemalloc.stop()
+        profiler.tracing = False
+
+
+
+
+def stage(name, *arrays):
+
+    """
+    Returns the context that records a stage in the shared profiler (see "Profiler.stage").
+    """
+
+    return profiler.stage(name, *arrays)
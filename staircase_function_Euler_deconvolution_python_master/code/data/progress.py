@@ -0,0 +1,139 @@
+"""
+Progress of the Euler window solver
+
+A Python module with a monitor that reports the progress of the moving data windows solved by "euler.py" (windows
+done, windows per second and estimated time to finish) and lets another thread cancel a run. The solver processes
+the windows in chunks and checks the monitor only between chunks, so the monitor does not slow the window loop. A
+cancelled run returns the estimates of the windows solved before the cancellation.
+
+Usage:
+
+    monitor = WindowMonitor(print_progress, interval=10.0)
+    estimates = euler_estimates(tfa, x, y, z, shape, area, SI, winsize, monitor=monitor)
+
+    # from another thread (e.g. a signal handler or a user interface)
+    monitor.cancel()
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import threading
+import time
+
+
+
+
+class WindowMonitor(object):
+
+    """
+    Progress report and cancellation of a window solver run.
+
+    Parameters:
+
+    * callback: function
+        called with the status (see "status") at most once per interval and at the end of the run - None only
+        allows the cancellation
+    * interval: float
+        minimum time between two reports (s)
+    * chunk: integer
+        number of windows solved between two checks of the monitor
+    """
+
+    def __init__(self, callback=None, interval=1.0, chunk=65536):
+
+        self.callback = callback
+        self.interval = interval
+        self.chunk = chunk
+        self.total = 0
+        self.done = 0
+        self._event = threading.Event()
+        self._start = self._last = time.time()
+
+    def cancel(self):
+
+        """
+        Requests the run to stop after the chunk of windows being solved.
+        """
+
+        self._event.set()
+
+    @property
+    def cancelled(self):
+
+        """
+        True when the cancellation was requested.
+        """
+
+        return self._event.is_set()
+
+    def start(self, total):
+
+        """
+        Starts the report of a run of "total" windows.
+        """
+
+        self.total = total
+        self.done = 0
+        self._start = self._last = time.time()
+
+    def update(self, done):
+
+        """
+        Records the windows solved and calls the callback when the interval has elapsed. Returns False when the run
+        must stop.
+        """
+
+        self.done = done
+        if self.callback is not None:
+            now = time.time()
+            if now - self._last >= self.interval:
+                self._last = now
+                self.callback(self.status())
+
+        return not self.cancelled
+
+    def finish(self):
+
+        """
+        Calls the callback with the final status of the run.
+        """
+
+        if self.callback is not None:
+            self.callback(self.status(finished=True))
+
+    def status(self, finished=False):
+
+        """
+        Returns the progress of the run.
+
+        Returns:
+
+        * status: dictionary
+            windows done and total, elapsed time (s), windows per second, estimated time to finish (s), and the
+            cancelled and finished flags
+        """
+
+        elapsed = time.time() - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else float('inf')
+
+        return {'done': self.done, 'total': self.total, 'elapsed': elapsed, 'rate': rate, 'eta': eta,
+                'cancelled': self.cancelled, 'finished': finished}
+
+
+
+
+def print_progress(status):
+
+    """
+    Callback that prints the progress of a run.
+    """
+
+    if status['finished']:
+        print('%d of %d windows in %.1f s%s' % (status['done'], status['total'], status['elapsed'],
+                                                ' (cancelled)' if status['cancelled'] else ''))
+    else:
+        print('%d of %d windows (%.1f%%), %.0f windows/s, %.0f s left'
+              % (status['done'], status['total'], 100.0 * status['done'] / max(status['total'], 1),
+                 status['rate'], status['eta']))
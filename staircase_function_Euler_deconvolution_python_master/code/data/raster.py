@@ -0,0 +1,291 @@
+"""
+Tiled raster files
+
+A Python module that writes derived grids (regularized derivatives, analytical signal amplitude, tilt derivative) in a
+single local file of compressed square tiles, with overview levels of reduced resolution (each level averages blocks
+of 2 x 2 points of the previous one, ignoring the gaps). A viewer or a later stage reads a window of a grid at a zoom
+level and only the tiles that overlap the window are read from the file and decoded.
+
+File layout: the tiles compressed with zlib, one after the other, followed by a JSON index (grid shape, area, tile
+size, data type, bands, levels and the offset and size of each tile) and a trailer of 16 bytes with the position of
+the index. As in the input data, the first axis of the grids is the x-direction.
+
+Usage:
+
+    write_raster('results/attributes.tiles', {'asa': asa.reshape(shape), 'tdr': tdr.reshape(shape)}, area)
+    raster = Raster('results/attributes.tiles')
+    preview = raster.read('asa', level=2)
+    window = raster.read('tdr', rows=(1000, 1512), cols=(2000, 2512))
+
+    write_grid_products('results/reg_attributes.tiles', grid, alpha=10**alpha_grid)
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+
+MAGIC = b'EDTILES1'
+TRAILER = struct.Struct('<8sQ')
+
+
+
+
+def overview(grid):
+
+    """
+    Halves the resolution of a grid by averaging blocks of 2 x 2 points (the gaps, NaN, are ignored; the last row or
+    column of a grid of odd size is averaged alone).
+
+    Parameters:
+
+    * grid: 2D-array
+        grid to reduce
+
+    Returns:
+
+    * reduced: 2D-array
+        grid with half the number of points (rounded up) in each direction
+    """
+
+    nx, ny = grid.shape
+    padded = np.full((nx + nx % 2, ny + ny % 2), np.nan)
+    padded[:nx, :ny] = grid
+    blocks = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2)
+    valid = np.isfinite(blocks)
+    count = valid.sum(axis=(1, 3))
+    total = np.where(valid, blocks, 0.0).sum(axis=(1, 3))
+
+    return np.divide(total, count, out=np.full(count.shape, np.nan), where=count > 0)
+
+
+
+
+def write_raster(path, bands, area=None, tile=256, levels=None, dtype=None, compression=6, metadata=None):
+
+    """
+    Writes grids of the same shape in a tiled raster file with overviews.
+
+    Parameters:
+
+    * path: string
+        output file
+    * bands: dictionary or 2D-array
+        grids by name - a single grid is written with the name 'data'
+    * area: tuple = (x1, x2, y1, y2)
+        mesh boundaries - recorded for the viewers
+    * tile: integer
+        number of points of the side of the square tiles
+    * levels: integer
+        number of overview levels - None reduces the grid until it fits in one tile
+    * dtype: string or numpy dtype
+        data type of the stored values - None keeps the type of the grids ('float32' halves the file size)
+    * compression: integer
+        zlib compression level - 0 to 9
+    * metadata: dictionary
+        other information recorded in the index (e.g. the regularization parameter)
+    """
+
+    if not isinstance(bands, dict):
+        bands = {'data': bands}
+    grids = dict((name, np.asarray(grid)) for name, grid in bands.items())
+    shapes = set(grid.shape for grid in grids.values())
+    if len(shapes) != 1 or len(next(iter(shapes))) != 2:
+        raise ValueError('the bands must be 2D-arrays of the same shape')
+    shape = shapes.pop()
+    dtype = np.dtype(dtype or np.result_type(*grids.values())).newbyteorder('<')
+    if levels is None:
+        levels = int(max(0, np.ceil(np.log2(max(shape) / float(tile)))))
+
+    index = {}
+    offset = 0
+    with open(path, 'wb') as output:
+        for name, grid in grids.items():
+            index[name] = []
+            level_grid = grid.astype(float)
+            for level in range(levels + 1):
+                if level > 0:
+                    level_grid = overview(level_grid)
+                tiles = []
+                for r0 in range(0, level_grid.shape[0], tile):
+                    for c0 in range(0, level_grid.shape[1], tile):
+                        block = np.ascontiguousarray(level_grid[r0:r0 + tile, c0:c0 + tile], dtype=dtype)
+                        data = zlib.compress(block.tobytes(), compression)
+                        output.write(data)
+                        tiles.append([offset, len(data)])
+                        offset += len(data)
+                index[name].append({'shape': list(level_grid.shape), 'tiles': tiles})
+
+        header = {'format': 'tiled-raster', 'version': 1, 'shape': list(shape), 'tile': tile, 'dtype': dtype.str,
+                  'area': None if area is None else [float(limit) for limit in area], 'levels': levels,
+                  'bands': list(grids), 'metadata': metadata or {}, 'index': index}
+        output.write(json.dumps(header).encode('utf-8'))
+        output.write(TRAILER.pack(MAGIC, offset))
+
+
+
+
+class Raster(object):
+
+    """
+    Reader of a tiled raster file (see "write_raster").
+
+    Parameters:
+
+    * path: string
+        raster file
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        with open(path, 'rb') as source:
+            source.seek(-TRAILER.size, os.SEEK_END)
+            end = source.tell()
+            magic, offset = TRAILER.unpack(source.read(TRAILER.size))
+            if magic != MAGIC:
+                raise IOError("'%s' is not a tiled raster file" % path)
+            source.seek(offset)
+            self.header = json.loads(source.read(end - offset).decode('utf-8'))
+        self.dtype = np.dtype(self.header['dtype'])
+        self.tile = self.header['tile']
+
+    @property
+    def bands(self):
+
+        """
+        Names of the grids.
+        """
+
+        return tuple(self.header['bands'])
+
+    @property
+    def levels(self):
+
+        """
+        Number of overview levels (level 0 is the full resolution).
+        """
+
+        return self.header['levels']
+
+    @property
+    def area(self):
+
+        """
+        Mesh boundaries (x1, x2, y1, y2) - None when not recorded.
+        """
+
+        area = self.header['area']
+
+        return None if area is None else tuple(area)
+
+    @property
+    def metadata(self):
+
+        """
+        Information recorded by the writer.
+        """
+
+        return self.header['metadata']
+
+    def shape(self, level=0):
+
+        """
+        Number of points (nx, ny) of a level.
+        """
+
+        return tuple(self.header['index'][self.bands[0]][level]['shape'])
+
+    def level_for(self, shape):
+
+        """
+        Returns the coarsest level with at least the given number of points (nx, ny) - the level to display a grid
+        on a screen area of that size.
+        """
+
+        for level in range(self.levels, -1, -1):
+            nx, ny = self.shape(level)
+            if nx >= shape[0] and ny >= shape[1]:
+                return level
+
+        return 0
+
+    def read(self, band, level=0, rows=None, cols=None):
+
+        """
+        Reads a window of a grid, decoding only the tiles that overlap it.
+
+        Parameters:
+
+        * band: string
+            grid name
+        * level: integer
+            overview level - 0 for the full resolution
+        * rows, cols: tuple = (start, stop)
+            indexes of the window in the level (stop excluded) - None for all the rows or columns
+
+        Returns:
+
+        * window: 2D-array
+            values of the window
+        """
+
+        if band not in self.header['index']:
+            raise KeyError("the raster has no band '%s'" % band)
+        entry = self.header['index'][band][level]
+        nx, ny = entry['shape']
+        r0, r1 = (0, nx) if rows is None else (max(rows[0], 0), min(rows[1], nx))
+        c0, c1 = (0, ny) if cols is None else (max(cols[0], 0), min(cols[1], ny))
+        size = self.tile
+        tiles_per_row = (ny + size - 1) // size
+        window = np.empty((max(r1 - r0, 0), max(c1 - c0, 0)), dtype=self.dtype)
+
+        with open(self.path, 'rb') as source:
+            for tr in range(r0 // size, (r1 + size - 1) // size):
+                for tc in range(c0 // size, (c1 + size - 1) // size):
+                    offset, length = entry['tiles'][tr * tiles_per_row + tc]
+                    source.seek(offset)
+                    shape = (min(size, nx - tr * size), min(size, ny - tc * size))
+                    block = np.frombuffer(zlib.decompress(source.read(length)), dtype=self.dtype).reshape(shape)
+                    # part of the tile inside the window
+                    br0, bc0 = max(r0 - tr * size, 0), max(c0 - tc * size, 0)
+                    br1, bc1 = min(r1 - tr * size, shape[0]), min(c1 - tc * size, shape[1])
+                    window[tr * size + br0 - r0:tr * size + br1 - r0,
+                           tc * size + bc0 - c0:tc * size + bc1 - c0] = block[br0:br1, bc0:bc1]
+
+        return window
+
+
+
+
+def write_grid_products(path, grid, alpha=None, products=('dx', 'dy', 'dz', 'asa', 'tdr'), **options):
+
+    """
+    Writes the derivatives and attributes of a grid (see "Grid" in "grid.py") in a tiled raster file.
+
+    Parameters:
+
+    * path: string
+        output file
+    * grid: Grid
+        gridded data set
+    * alpha: float
+        regularization parameter - None for the non-regularized derivatives
+    * products: list of strings
+        grids written - 'dx', 'dy', 'dz', 'asa' and 'tdr'
+    * options: keyword arguments
+        tile, levels, dtype and compression of "write_raster"
+    """
+
+    dx, dy, dz = grid.derivatives(alpha)
+    asa, tdr = grid.attributes(alpha)
+    available = {'dx': dx, 'dy': dy, 'dz': dz, 'asa': asa, 'tdr': tdr}
+    bands = dict((name, np.reshape(available[name], grid.shape)) for name in products)
+
+    write_raster(path, bands, grid.area, metadata={'alpha': alpha}, **options)
@@ -0,0 +1,398 @@
+"""
+Binary solution store
+
+A Python module that stores Euler solutions in a binary columnar format instead of text files. A store is a folder
+with one file of little-endian 64-bit floats per column (x, y, depth, base level, standard deviation of the z
+derivative and optional columns such as depth uncertainties) and a JSON file with the number of rows, the chunks
+written and the run metadata (SI, window size, alpha, filt). The values are stored without conversion, so they are
+read back exactly, and one column is read by mapping its file in memory without reading the others.
+
+Chunks of solutions are appended under a lock of the operating system on a lock file ("fcntl.flock", or
+"msvcrt.locking" on Windows), so the tiles of a survey can be written by parallel processes. The lock is released by
+the operating system when its process ends, so a writer killed in the middle of an append does not block the next
+ones. The rows are counted in the JSON file only after the columns are written, so a writer that stops in the middle
+of a chunk leaves the store readable and the incomplete rows are removed by the next append.
+
+Usage:
+
+    store = write_solutions('results/reg_euler_solutions_synthetic.sol', solutions, SI=1, window_size=6,
+                            alpha=1e5, filt=0.035)
+    depth = SolutionStore('results/reg_euler_solutions_synthetic.sol').column('depth')
+    store.to_text('results/reg_euler_solutions_synthetic.txt')
+
+    python solution_store.py to-text results/reg_euler_solutions_synthetic.sol results/reg_euler_solutions.txt
+    python solution_store.py from-text results/reg_euler_solutions_synthetic.txt results/reg_euler.sol --SI 1
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+# Columns of the solutions of "select_solutions" in "euler.py" (the last one with "with_stdz=True")
+SOLUTION_COLUMNS = ('x', 'y', 'depth', 'base_level', 'stdz')
+
+# Columns of the text files of "synthetic_data.py"
+TEXT_COLUMNS = ('x', 'y', 'depth', 'base_level')
+
+FORMAT = 'euler-solutions'
+VERSION = 1
+DTYPE = np.dtype('<f8')
+METADATA = 'metadata.json'
+LOCK = 'append.lock'
+
+
+
+
+class SolutionStore(object):
+
+    """
+    Binary columnar store of Euler solutions (see "create_store" to build a new store).
+
+    Parameters:
+
+    * path: string
+        folder of the store
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        if not os.path.isfile(os.path.join(path, METADATA)):
+            raise IOError("'%s' is not a solution store" % path)
+
+    @property
+    def metadata(self):
+
+        """
+        Contents of the JSON file (read again at each access, so rows appended by other processes are seen).
+        """
+
+        with open(os.path.join(self.path, METADATA)) as source:
+            return json.load(source)
+
+    @property
+    def columns(self):
+
+        """
+        Names of the columns.
+        """
+
+        return tuple(self.metadata['columns'])
+
+    @property
+    def rows(self):
+
+        """
+        Number of solutions.
+        """
+
+        return self.metadata['rows']
+
+    @property
+    def run(self):
+
+        """
+        Run metadata (SI, window size, alpha, filt and any other item given to "create_store").
+        """
+
+        return self.metadata['run']
+
+    def _file(self, name):
+
+        return os.path.join(self.path, name + '.f8')
+
+    def column(self, name):
+
+        """
+        Returns one column as a read-only array mapped in memory.
+
+        Parameters:
+
+        * name: string
+            column name
+        """
+
+        if name not in self.columns:
+            raise KeyError("the store has no column '%s'" % name)
+        rows = self.rows
+        if rows == 0:
+            return np.empty(0, dtype=DTYPE)
+
+        return np.memmap(self._file(name), dtype=DTYPE, mode='r', shape=(rows,))
+
+    def read(self, columns=None, start=0, stop=None):
+
+        """
+        Returns columns of a range of rows as a 2D-array.
+
+        Parameters:
+
+        * columns: list of strings
+            column names - None for all the columns
+        * start, stop: integer
+            first row and row after the last one - None reads to the end
+        """
+
+        columns = self.columns if columns is None else columns
+
+        return np.column_stack([np.array(self.column(name)[start:stop]) for name in columns])
+
+    def tile(self, tile):
+
+        """
+        Returns all the columns of the rows appended with a tile name (see "append").
+        """
+
+        chunks = [chunk for chunk in self.metadata['chunks'] if chunk['tile'] == tile]
+
+        return np.concatenate([self.read(start=chunk['start'], stop=chunk['stop']) for chunk in chunks] or
+                              [np.empty((0, len(self.columns)))])
+
+    def append(self, solutions, tile=None, timeout=60.0):
+
+        """
+        Appends a chunk of solutions. The writers of parallel processes are serialized by a lock file.
+
+        Parameters:
+
+        * solutions: 2D-array
+            one row per solution, the columns in the order of the store
+        * tile: string or integer
+            name of the tile of the chunk, recorded with its rows - None for no name
+        * timeout: float
+            longest wait for the lock (s)
+        """
+
+        solutions = np.asarray(solutions, dtype=DTYPE)
+        if solutions.ndim != 2 or solutions.shape[1] != len(self.columns):
+            raise ValueError('the solutions must have %d columns %s' % (len(self.columns), self.columns))
+
+        with _Lock(os.path.join(self.path, LOCK), timeout):
+            metadata = self.metadata
+            rows = metadata['rows']
+            for index, name in enumerate(metadata['columns']):
+                with open(self._file(name), 'r+b') as output:
+                    # removes the rows of an interrupted append
+                    output.truncate(rows * DTYPE.itemsize)
+                    output.seek(0, os.SEEK_END)
+                    output.write(np.ascontiguousarray(solutions[:, index]).tobytes())
+            metadata['rows'] = rows + len(solutions)
+            metadata['chunks'].append({'tile': tile, 'start': rows, 'stop': rows + len(solutions)})
+            _write_metadata(self.path, metadata)
+
+        return self
+
+    def to_text(self, path, columns=TEXT_COLUMNS):
+
+        """
+        Writes columns in the text layout of "synthetic_data.py" (tab-separated, as written by "numpy.savetxt").
+
+        Parameters:
+
+        * path: string
+            text file
+        * columns: list of strings
+            columns written
+        """
+
+        np.savetxt(path, self.read(columns), delimiter="\t")
+
+
+
+
+class _Lock(object):
+
+    """
+    Lock of the operating system on a lock file, shared between processes. The file is kept, and the lock is released
+    when the process that holds it ends, even if it is killed.
+    """
+
+    def __init__(self, path, timeout):
+
+        self.path = path
+        self.timeout = timeout
+        self.descriptor = None
+
+    def __enter__(self):
+
+        self.descriptor = os.open(self.path, os.O_CREAT | os.O_RDWR)
+        start = time.time()
+        while True:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self.descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(self.descriptor, msvcrt.LK_NBLCK, 1)
+                return self
+            except OSError:
+                if time.time() - start > self.timeout:
+                    os.close(self.descriptor)
+                    raise IOError("timeout waiting for the lock '%s'" % self.path)
+                time.sleep(0.01)
+
+    def __exit__(self, *exc):
+
+        if fcntl is not None:
+            fcntl.flock(self.descriptor, fcntl.LOCK_UN)
+        else:
+            os.lseek(self.descriptor, 0, os.SEEK_SET)
+            msvcrt.locking(self.descriptor, msvcrt.LK_UNLCK, 1)
+        os.close(self.descriptor)
+
+        return False
+
+
+
+
+def _write_metadata(path, metadata):
+
+    """
+    Replaces the JSON file in one step, so readers never see a partial file.
+    """
+
+    temporary = os.path.join(path, METADATA + '.tmp')
+    with open(temporary, 'w') as output:
+        json.dump(metadata, output, indent=2)
+    os.replace(temporary, os.path.join(path, METADATA))
+
+
+
+
+def create_store(path, columns=SOLUTION_COLUMNS, overwrite=False, **run):
+
+    """
+    Creates an empty solution store.
+
+    Parameters:
+
+    * path: string
+        folder of the store
+    * columns: list of strings
+        column names - e.g. SOLUTION_COLUMNS + ('depth_std',) for a column of uncertainties
+    * overwrite: boolean
+        True replaces an existing store
+    * run: keyword arguments
+        run metadata - e.g. SI=1, window_size=6, alpha=1e5, filt=0.035
+
+    Returns:
+
+    * store: SolutionStore
+        the new store
+    """
+
+    if os.path.exists(path):
+        if not overwrite:
+            raise IOError("'%s' already exists" % path)
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+    for name in columns:
+        open(os.path.join(path, name + '.f8'), 'wb').close()
+    _write_metadata(path, {'format': FORMAT, 'version': VERSION, 'dtype': DTYPE.str, 'columns': list(columns),
+                           'rows': 0, 'chunks': [], 'run': run})
+
+    return SolutionStore(path)
+
+
+
+
+def write_solutions(path, solutions, columns=None, **run):
+
+    """
+    Writes solutions in a new store, replacing an existing one.
+
+    Parameters:
+
+    * path: string
+        folder of the store
+    * solutions: 2D-array
+        one row per solution
+    * columns: list of strings
+        column names - None takes the first columns of SOLUTION_COLUMNS
+    * run: keyword arguments
+        run metadata (see "create_store")
+
+    Returns:
+
+    * store: SolutionStore
+        the store
+    """
+
+    solutions = np.asarray(solutions)
+    if columns is None:
+        columns = SOLUTION_COLUMNS[:solutions.shape[1]]
+
+    return create_store(path, columns, overwrite=True, **run).append(solutions)
+
+
+
+
+def from_text(text_path, path, columns=TEXT_COLUMNS, **run):
+
+    """
+    Converts a text file of solutions (e.g. "results/euler_solutions_synthetic.txt") to a store.
+
+    Parameters:
+
+    * text_path: string
+        text file - one row per solution
+    * path: string
+        folder of the store
+    * columns: list of strings
+        names of the columns of the text file
+    * run: keyword arguments
+        run metadata (see "create_store")
+
+    Returns:
+
+    * store: SolutionStore
+        the store
+    """
+
+    return write_solutions(path, np.atleast_2d(np.loadtxt(text_path)), columns, **run)
+
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Conversion between solution stores and text files')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    text_parser = commands.add_parser('to-text', help='writes a store in the text layout')
+    text_parser.add_argument('store', help='folder of the store')
+    text_parser.add_argument('text', help='text file')
+    text_parser.add_argument('--columns', nargs='+', default=list(TEXT_COLUMNS), help='columns written')
+
+    store_parser = commands.add_parser('from-text', help='converts a text file to a store')
+    store_parser.add_argument('text', help='text file')
+    store_parser.add_argument('store', help='folder of the store')
+    store_parser.add_argument('--columns', nargs='+', default=list(TEXT_COLUMNS), help='names of the text columns')
+    store_parser.add_argument('--SI', type=int, default=None, help='structural index')
+    store_parser.add_argument('--window-size', type=int, default=None, help='moving data window size')
+    store_parser.add_argument('--alpha', type=float, default=None, help='regularization parameter')
+    store_parser.add_argument('--filt', type=float, default=None, help='percentage of the solutions kept')
+
+    arguments = parser.parse_args()
+
+    if arguments.command == 'to-text':
+        SolutionStore(arguments.store).to_text(arguments.text, arguments.columns)
+    else:
+        store = from_text(arguments.text, arguments.store, arguments.columns, SI=arguments.SI,
+                          window_size=arguments.window_size, alpha=arguments.alpha, filt=arguments.filt)
+        print('%d solutions written to %s' % (store.rows, arguments.store))
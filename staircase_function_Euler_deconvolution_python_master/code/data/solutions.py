@@ -0,0 +1,154 @@
+"""
+Post-processing of Euler solutions
+
+A Python module that classifies the Euler solutions ([x, y, depth, base level], see "select_solutions" in "euler.py")
+into depth ranges and groups nearby solutions into source estimates. Both work on whole columns of the solutions: the
+classification compares the depths with the range limits and the clustering places the solutions in the cells of a
+spatial hash (square cells of the clustering distance), joins the occupied cells that touch each other and computes
+the statistics of each group of cells with weighted counts. The cost grows nearly linearly with the number of
+solutions.
+
+Usage:
+
+    masks = depth_masks(euler_sol[:, 2], [(195, 205), (95, 105)])
+    labels, clusters = cluster_solutions(euler_sol, distance=200.0, min_count=5)
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+
+
+def depth_masks(depth, ranges):
+
+    """
+    Locates the solutions inside each depth range.
+
+    Parameters:
+
+    * depth: 1D-array
+        depths of the solutions
+    * ranges: list of tuples = [(low, high), ...]
+        depth limits of each range - both limits included
+
+    Returns:
+
+    * masks: list of 1D-arrays
+        True for the solutions inside each range
+    """
+
+    depth = np.asarray(depth)
+
+    return [(depth >= low) & (depth <= high) for low, high in ranges]
+
+
+
+
+def classify_depths(depth, ranges):
+
+    """
+    Assigns each solution to the first depth range that contains it.
+
+    Parameters:
+
+    * depth: 1D-array
+        depths of the solutions
+    * ranges: list of tuples = [(low, high), ...]
+        depth limits of each range - both limits included
+
+    Returns:
+
+    * classes: 1D-array
+        index of the range of each solution - -1 when no range contains it
+    """
+
+    classes = np.full(np.shape(depth), -1, dtype=int)
+
+    # the later ranges are written first, so the first range that contains a solution prevails
+    for index, mask in reversed(list(enumerate(depth_masks(depth, ranges)))):
+        classes[mask] = index
+
+    return classes
+
+
+
+
+def cluster_solutions(solutions, distance, min_count=1):
+
+    """
+    Groups the solutions whose horizontal positions are close into source estimates. The solutions are placed in
+    square cells of side "distance" and the cells that share a side or a corner belong to the same cluster, so two
+    solutions closer than "distance" are always in the same cluster.
+
+    Parameters:
+
+    * solutions: 2D-array
+        x, y, depth and base level of each solution (at least the first three columns)
+    * distance: float
+        clustering distance (m)
+    * min_count: integer
+        smallest number of solutions of a cluster - the solutions of smaller clusters are labelled -1
+
+    Returns:
+
+    * labels: 1D-array
+        cluster of each solution (row of "clusters") - -1 for the discarded solutions
+    * clusters: 2D-array
+        x and y of the centroid, mean depth, standard deviation of the depths, shallowest and deepest depth and
+        number of solutions of each cluster, sorted by decreasing number of solutions
+    """
+
+    solutions = np.asarray(solutions)
+    n = len(solutions)
+    if n == 0:
+        return np.empty(0, dtype=int), np.empty((0, 7))
+    x, y, depth = solutions[:, 0], solutions[:, 1], solutions[:, 2]
+
+    # spatial hash: cell indexes of each solution, with one empty cell around the occupied ones
+    ix = np.floor((x - x.min()) / distance).astype(np.int64) + 1
+    iy = np.floor((y - y.min()) / distance).astype(np.int64) + 1
+    ncols = iy.max() + 2
+    cells, cell_of = np.unique(ix * ncols + iy, return_inverse=True)
+    cell_of = cell_of.ravel()
+
+    # join the occupied cells with their neighbours (half of the 8 neighbours, the other half is symmetric)
+    first = []
+    second = []
+    for offset in (1, ncols - 1, ncols, ncols + 1):
+        position = np.searchsorted(cells, cells + offset)
+        position = np.minimum(position, len(cells) - 1)
+        found = cells[position] == cells + offset
+        first.append(np.nonzero(found)[0])
+        second.append(position[found])
+    first = np.concatenate(first)
+    second = np.concatenate(second)
+    adjacency = coo_matrix((np.ones(len(first)), (first, second)), shape=(len(cells), len(cells)))
+    _, cell_cluster = connected_components(adjacency, directed=False)
+
+    # statistics of each cluster
+    labels = cell_cluster[cell_of]
+    count = np.bincount(labels)
+    nclusters = len(count)
+    centroid_x = np.bincount(labels, x, nclusters) / count
+    centroid_y = np.bincount(labels, y, nclusters) / count
+    mean = np.bincount(labels, depth, nclusters) / count
+    spread = np.sqrt(np.bincount(labels, (depth - mean[labels]) ** 2, nclusters) / np.maximum(count - 1, 1))
+    spread[count == 1] = 0.0
+    shallow = np.full(nclusters, np.inf)
+    deep = np.full(nclusters, -np.inf)
+    np.minimum.at(shallow, labels, depth)
+    np.maximum.at(deep, labels, depth)
+
+    # order by size and discard the small clusters
+    order = np.argsort(-count, kind='stable')
+    order = order[count[order] >= min_count]
+    rank = np.full(nclusters, -1, dtype=int)
+    rank[order] = np.arange(len(order))
+    clusters = np.column_stack([centroid_x, centroid_y, mean, spread, shallow, deep, count])[order]
+
+    return rank[labels], clusters
@@ -0,0 +1,249 @@
+"""
+On-disk cache of pipeline stages
+
+A Python module that stores the results of the processing stages of "synthetic_data.py" (S-function, regularization
+parameters, derivative grids and Euler solution stores) in a folder, so a rerun skips every stage whose inputs did not
+change. A stage is addressed by a hash of its name, its input arrays and parameters, and is valid for a version of the
+code: a hash of the module that defines the function and of the modules of its folder that it imports, directly or
+through other modules. Editing "filtering.py", "euler.py" or a module they use ("operators.py", "cache.py" ...)
+invalidates their stages, while editing "plot_figure.py" or "synthetic_data.py" does not. A stage computed again with a
+new version of the code replaces the superseded one. The results are saved as ".npy" files and loaded with
+memory-mapping.
+
+The program is under the conditions terms in the file README.txt.
+"""
+
+
+import ast
+import inspect
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from cache import content_key
+
+
+
+
+def local_imports(path):
+
+    """
+    Finds the source files that a module depends on: the module itself and the modules of its folder that it imports,
+    directly or through other modules of the folder.
+
+    Parameters:
+
+    * path: string
+        source file of the module
+
+    Returns:
+
+    * paths: list of strings
+        source files, sorted
+    """
+
+    folder = os.path.dirname(os.path.abspath(path))
+    paths = set()
+    pending = [os.path.abspath(path)]
+
+    while pending:
+        path = pending.pop()
+        if path in paths:
+            continue
+        paths.add(path)
+        with open(path, 'rb') as source:
+            tree = ast.parse(source.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = os.path.join(folder, name.split('.')[0] + '.py')
+                if os.path.isfile(candidate):
+                    pending.append(candidate)
+
+    return sorted(paths)
+
+
+
+
+def code_version(function):
+
+    """
+    Computes a hash of the source files that a function depends on (see "local_imports"): their names and contents.
+
+    Parameters:
+
+    * function: function
+        stage function
+
+    Returns:
+
+    * version: string
+        hexadecimal digest
+    """
+
+    items = []
+    for path in local_imports(inspect.getsourcefile(function)):
+        with open(path, 'rb') as source:
+            items.extend([os.path.basename(path), np.frombuffer(source.read(), dtype=np.uint8)])
+
+    return content_key(*items)
+
+
+
+
+class StageCache(object):
+
+    """
+    Folder of stage results addressed by the contents of their inputs.
+
+    Parameters:
+
+    * root: string
+        folder where the stages are stored
+    * enabled: boolean
+        False runs every stage without storing the results
+    """
+
+    def __init__(self, root, enabled=True):
+
+        self.root = root
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._versions = {}
+
+    def version(self, function):
+
+        """
+        Returns the code version of a stage function (see "code_version"), computed once per module.
+        """
+
+        module = function.__module__
+        if module not in self._versions:
+            self._versions[module] = code_version(function)
+
+        return self._versions[module]
+
+    def key(self, name, function, *args, **kwargs):
+
+        """
+        Computes the key of a stage from its name, the function and its inputs. The code version is not part of the
+        key: a stage of a superseded version is replaced (see "run").
+        """
+
+        items = [name, function.__module__, function.__name__]
+        for arg in args:
+            items.extend(arg if isinstance(arg, (tuple, list)) else [arg])
+        for item in sorted(kwargs.items()):
+            items.extend(item)
+
+        return content_key(*items)
+
+    def run(self, name, function, *args, **kwargs):
+
+        """
+        Returns the stored result of the stage or runs the function, stores its result and returns it. A result
+        stored by another version of the code is replaced.
+
+        Parameters:
+
+        * name: string
+            stage name
+        * function: function
+            stage function - returns an array, a number or a tuple of them
+        * args, kwargs:
+            arguments of the function
+
+        Returns:
+
+        * result: memory-mapped array, number or tuple of them
+            result of the function
+        """
+
+        if not self.enabled:
+            return function(*args, **kwargs)
+
+        path = os.path.join(self.root, '%s-%s' % (name, self.key(name, function, *args, **kwargs)))
+        version = self.version(function)
+
+        if self.stored_version(path) == version:
+            self.hits += 1
+            return self.load(path)
+
+        self.misses += 1
+        self.save(path, function(*args, **kwargs), version)
+
+        return self.load(path)
+
+    def stored_version(self, path):
+
+        """
+        Returns the code version of a stored stage, or None when the stage is not stored.
+        """
+
+        try:
+            with open(os.path.join(path, 'stage.json')) as meta:
+                return json.load(meta).get('version')
+        except (OSError, ValueError):
+            return None
+
+    def save(self, path, result, version=None):
+
+        """
+        Saves a result in a stage folder, replacing a stage of another code version. The folder is written under a
+        temporary name and renamed when complete.
+        """
+
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+
+        items = result if isinstance(result, tuple) else (result,)
+        temporary = tempfile.mkdtemp(dir=self.root)
+
+        for i, item in enumerate(items):
+            np.save(os.path.join(temporary, '%d.npy' % i), np.asarray(item))
+
+        with open(os.path.join(temporary, 'stage.json'), 'w') as meta:
+            json.dump({'tuple': isinstance(result, tuple), 'items': len(items), 'version': version}, meta)
+
+        if os.path.isdir(path) and self.stored_version(path) != version:
+            # The stage of a superseded code version
+            shutil.rmtree(path, ignore_errors=True)
+
+        try:
+            os.rename(temporary, path)
+        except OSError:
+            # Another run stored the same stage
+            shutil.rmtree(temporary)
+
+    def load(self, path):
+
+        """
+        Loads a result from a stage folder, memory-mapping the arrays.
+        """
+
+        with open(os.path.join(path, 'stage.json')) as meta:
+            meta = json.load(meta)
+
+        items = []
+        for i in range(meta['items']):
+            item = np.load(os.path.join(path, '%d.npy' % i), mmap_mode='r')
+            items.append(item[()] if item.ndim == 0 else item)
+
+        return tuple(items) if meta['tuple'] else items[0]
+
+    def clear(self):
+
+        """
+        Removes all stored stages.
+        """
+
+        if os.path.isdir(self.root):
+            shutil.rmtree(self.root)